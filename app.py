@@ -1,12 +1,104 @@
+import time
+STARTED = time.perf_counter()  # before the imports, for --profile-startup
+
+import argparse
+import logging
 import wx
+from database import repository
+from database.archive import ARCHIVE_AFTER_DAYS, Archiver
+from database.client import RemoteRepository
+from database.instrumentation import SLOW_QUERY_MS, get_stats
+from database.init_db import create_tables
+from database.storage import DEFAULT_PROFILE, STORAGE_PROFILES
+from views.background import get_executor
+from views.change_watcher import ChangeWatcher
+from views.changes import DELETE, notify
 from views.main_window import MainWindow
+from views.startup import StartupProfile
 
 class LibraryApp(wx.App):
+    def __init__(self, profile=None, archive_after_days=ARCHIVE_AFTER_DAYS):
+        self.profile = profile
+        self.archive_after_days = archive_after_days
+        self.archiver = None
+        self.watcher = None
+        super(LibraryApp, self).__init__()
+
     def OnInit(self):
-        frame = MainWindow(None, title="Library Management System")
+        frame = MainWindow(None, title="Library Management System", profile=self.profile)
         frame.Show()
+
+        if self.archive_after_days:
+            # Archived loans drop out of the borrow list
+            self.archiver = Archiver(
+                self.archive_after_days,
+                on_batch=lambda ids: wx.CallAfter(notify, "update_borrow_records", DELETE, ids),
+            )
+            self.archiver.start()
+
+        if not repository.get_repository().remote:
+            # Picks up what other desks sharing library.db change
+            self.watcher = ChangeWatcher(repository.get_repository().pool)
+            self.watcher.start()
         return True
 
+    def OnExit(self):
+        # Stop background work, then checkpoint the WAL and release the pooled connections
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.archiver is not None:
+            self.archiver.stop()
+            self.archiver.join(timeout=5)  # let a running batch commit
+        get_executor().shutdown()
+        repository.get_repository().close()
+        return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Library Management System")
+    parser.add_argument(
+        "--storage-profile",
+        choices=sorted(STORAGE_PROFILES),
+        default=DEFAULT_PROFILE,
+        help="SQLite tuning to use; 'shared' enables WAL for several desks on one database",
+    )
+    parser.add_argument(
+        "--server", metavar="URL",
+        help="use a library server (python -m database.server), e.g. http://127.0.0.1:8765, "
+             "instead of opening library.db",
+    )
+    parser.add_argument(
+        "--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS,
+        help="move loans returned longer ago than this to the archive in the background; 0 disables",
+    )
+    parser.add_argument(
+        "--debug", action="store_true",
+        help="log debug details, such as how many refreshes each action triggers",
+    )
+    parser.add_argument(
+        "--slow-query-ms", type=float, default=SLOW_QUERY_MS,
+        help="log statements slower than this, with their query plan (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="print import time, time to first paint and how long each tab took to build",
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    app = LibraryApp()
+    startup = StartupProfile(STARTED)
+    startup.mark_imported()
+    args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    get_stats().slow_ms = args.slow_query_ms
+
+    if args.server:
+        # The server owns the database, its migrations and the archiving
+        repository.use(RemoteRepository(args.server))
+        archive_after_days = 0
+    else:
+        # Create the schema or upgrade an existing library.db in place
+        create_tables()
+        repository.configure(profile=args.storage_profile)
+        archive_after_days = args.archive_after_days
+    app = LibraryApp(startup if args.profile_startup else None, archive_after_days)
     app.MainLoop()
\ No newline at end of file
@@ -0,0 +1,141 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from database.init_db import create_tables
+from database.timestamps import due_date
+
+WORDS = [
+    "shadow", "river", "garden", "empire", "silent", "winter", "glass", "night", "stone", "crown",
+    "ocean", "secret", "paper", "golden", "broken", "summer", "forest", "letter", "iron", "city",
+    "mirror", "storm", "island", "journey", "house", "fire", "memory", "star", "light", "road",
+    "history", "science", "kitchen", "machine", "music", "theory", "voyage", "harbor", "mountain", "dream",
+]
+FIRST_NAMES = [
+    "Alice", "Omar", "Yuki", "Maria", "John", "Fatima", "Lucas", "Amina", "Chen", "Sofia",
+    "David", "Leila", "Noah", "Hana", "Pierre", "Zara", "Ivan", "Nora", "Samir", "Emma",
+]
+LAST_NAMES = [
+    "Smith", "Haddad", "Tanaka", "Garcia", "Brown", "Benali", "Martin", "Okafor", "Wang", "Rossi",
+    "Miller", "Karimi", "Wilson", "Sato", "Dubois", "Khan", "Petrov", "Larsen", "Nasser", "Jones",
+]
+COLORS = ["#FFB3BA", "#FFDFBA", "#FFFFBA", "#BAFFC9", "#BAE1FF", "#E0BBE4", "#FFFFFF", "#D5E8D4"]
+
+# Every generated date falls in the ten years after this one
+EPOCH = datetime(2015, 1, 1)
+SPAN_DAYS = 3650
+
+
+def generate(path, books=10000, members=2000, borrows=50000, categories=20, open_loans=None,
+             seed=0, batch_size=10000, progress=None):
+    """Create a new database at ``path`` filled with a reproducible synthetic library.
+
+    The schema comes from ``init_db.create_tables``, so the data sits in the
+    same tables, indexes and triggers as the app's. The same sizes and
+    ``seed`` always produce the same rows. Borrows are spread over ten years
+    in id order, and all are returned except the ``open_loans`` most recent
+    ones, each on a different book (5% of the books by default). Those books
+    are marked Not Available.
+    """
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists, generate into a new file")
+    if open_loans is None:
+        open_loans = books // 20
+    open_loans = min(open_loans, books, borrows)
+    rng = random.Random(seed)
+
+    create_tables(path)
+    conn = sqlite3.connect(path)
+    # A throwaway file: trade durability for loading speed
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+
+    def insert(table, query, rows, total):
+        start = time.perf_counter()
+        done = 0
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            with conn:
+                conn.executemany(query, chunk)
+            done += len(chunk)
+            if progress is not None:
+                progress(table, done, total, time.perf_counter() - start)
+
+    insert("BookCategory", "INSERT INTO BookCategory (id, name, color) VALUES (?, ?, ?)", (
+        (i, f"{rng.choice(WORDS).title()} {i}", rng.choice(COLORS))
+        for i in range(1, categories + 1)
+    ), categories)
+
+    insert("Book", "INSERT INTO Book (id, category_id, title, author) VALUES (?, ?, ?, ?)", (
+        (i, rng.randint(1, categories),
+         " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).capitalize(),
+         f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}")
+        for i in range(1, books + 1)
+    ), books)
+
+    def member_rows():
+        for i in range(1, members + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            joined = EPOCH + timedelta(days=rng.randrange(SPAN_DAYS))
+            yield (i, f"{first} {last}", f"{first}.{last}{i}@example.com".lower(),
+                   f"555-{i:07d}", int(joined.timestamp()))
+
+    insert("Member", "INSERT INTO Member (id, name, email, phone, membership_date) VALUES (?, ?, ?, ?, ?)",
+           member_rows(), members)
+
+    def borrow_rows():
+        open_books = rng.sample(range(1, books + 1), open_loans)
+        first_open = borrows - open_loans
+        step = SPAN_DAYS * 86400 / max(borrows, 1)
+        for i in range(borrows):
+            borrowed = EPOCH + timedelta(seconds=int(i * step + rng.random() * step))
+            if i >= first_open:
+                book_id, returned = open_books[i - first_open], None
+            else:
+                book_id = rng.randint(1, books)
+                returned = int((borrowed + timedelta(days=rng.randint(1, 30))).timestamp())
+            yield (i + 1, book_id, rng.randint(1, members), int(borrowed.timestamp()),
+                   due_date(int(borrowed.timestamp())), returned)
+
+    insert("Borrow", "INSERT INTO Borrow (id, book_id, member_id, borrow_date, due_date, return_date) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", borrow_rows(), borrows)
+
+    with conn:
+        conn.execute("""
+            UPDATE Book SET availability = 'Not Available'
+            WHERE id IN (SELECT book_id FROM Borrow WHERE return_date IS NULL)
+        """)
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic library database for benchmarks")
+    parser.add_argument("output", help="Database file to create; it must not exist yet")
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--borrows", type=int, default=50000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--open-loans", type=int, help="Loans not yet returned (default: 5%% of the books)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    def report(table, done, total, seconds):
+        end = "\n" if done == total else ""
+        print(f"\r{table}: {done}/{total} rows ({done / seconds if seconds else 0:.0f} rows/s)", end=end, flush=True)
+
+    generate(
+        args.output, args.books, args.members, args.borrows, args.categories, args.open_loans,
+        args.seed, args.batch_size, progress=report,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+
+from benchmarks.generate import FIRST_NAMES, WORDS
+from database.circulation import checkout, return_loan
+from database.reports import (
+    busiest_members, category_utilisation, monthly_loan_volume, most_borrowed_books, refresh_summaries,
+)
+from database.repository import LibraryRepository, ConnectionPool
+from database.storage import DEFAULT_PROFILE, STORAGE_PROFILES
+from database.timestamps import now, start_of_day
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Workload:
+    """The repository calls behind each view, with the arguments a user would give them.
+
+    Each scenario method runs one call and returns the number of rows it
+    read or wrote. Arguments are drawn from a seeded random generator, so
+    runs against the same database are comparable. The add scenarios keep
+    the ids they created, and the delete scenarios remove exactly those rows.
+    Borrows made by the benchmark are returned and then deleted again. The
+    database therefore ends up with the same rows it started with.
+    """
+
+    def __init__(self, repository, seed=0):
+        self.repository = repository
+        self.random = random.Random(seed)
+        with repository.pool.connection() as conn:
+            self.max_book_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM Book").fetchone()[0]
+            self.max_member_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM Member").fetchone()[0]
+            self.category_ids = [row[0] for row in conn.execute("SELECT id FROM BookCategory")]
+        self.book_count = repository.count_books()
+
+        self.added_books = []
+        self.added_members = []
+        self.added_categories = []
+        self.borrowed = []  # (borrow id, book id) made by the benchmark
+        self.returned = []
+
+    def word(self, length=3):
+        """A title/name prefix that is likely to match, like someone starting to type."""
+        return self.random.choice(WORDS + FIRST_NAMES)[:length]
+
+    # BookView
+
+    def books_count(self):
+        self.repository.count_books()
+        return 1
+
+    def books_first_page(self):
+        return len(self.repository.get_books_page(limit=100))
+
+    def books_next_page(self):
+        # Scrolling: the page after a random, already loaded one
+        after_id = self.random.randint(0, max(self.max_book_id - 100, 0))
+        return len(self.repository.get_books_page(after_id=after_id, limit=100))
+
+    def books_jump_page(self):
+        # Dragging the scroll thumb: a page with nothing loaded before it
+        offset = self.random.randint(0, max(self.book_count - 100, 0))
+        return len(self.repository.get_books_page(offset=offset, limit=100))
+
+    def books_search(self):
+        query = self.repository.make_search_query(self.word())
+        self.repository.count_book_search(query)
+        return len(self.repository.search_books_page(query, limit=100))
+
+    def books_add(self):
+        category_id = self.random.choice(self.category_ids)
+        self.added_books.append(
+            self.repository.add_book("Benchmark book", "Benchmark author", category_id, "Available")
+        )
+        return 1
+
+    def books_update(self):
+        book_id = self.added_books[self.random.randrange(len(self.added_books))]
+        self.repository.update_book(
+            book_id, "Benchmark book, revised", "Benchmark author",
+            self.random.choice(self.category_ids), "Available",
+        )
+        return 1
+
+    def books_delete(self):
+        self.repository.delete_book(self.added_books.pop())
+        return 1
+
+    # MemberView
+
+    def members_load(self):
+        self.repository.count_members()
+        return len(self.repository.get_members_page(limit=100))
+
+    def members_sorted(self):
+        # Clicking the Name header, then scrolling down a page
+        page = self.repository.get_members_page("name", limit=100)
+        return len(page) + len(self.repository.get_members_page("name", after=page[-1], limit=100) if page else [])
+
+    def members_search(self):
+        # Typing an existing member's name or email with a typo: one character dropped
+        rows = self.repository.get_members([self.random.randint(1, max(self.max_member_id, 1))])
+        if not rows:
+            return 0
+        text = self.random.choice(rows[0][1:3])
+        position = self.random.randrange(len(text))
+        return len(self.repository.search_members(text[:position] + text[position + 1:], limit=50))
+
+    def members_add(self):
+        self.added_members.append(
+            self.repository.add_member("Benchmark member", "bench@example.com", "555-0000000", start_of_day())
+        )
+        return 1
+
+    def members_update(self):
+        member_id = self.added_members[self.random.randrange(len(self.added_members))]
+        self.repository.update_member(member_id, "Benchmark member", "bench2@example.com", "555-0000001")
+        return 1
+
+    def members_delete(self):
+        self.repository.delete_member(self.added_members.pop())
+        return 1
+
+    # BorrowView
+
+    def borrows_load(self):
+        self.repository.count_borrow_records()
+        return len(self.repository.get_borrow_records_page(limit=100))
+
+    def borrows_overdue(self):
+        self.repository.count_borrow_records(overdue_at=now())
+        return len(self.repository.get_borrow_records_page("due_date", False, limit=100, overdue_at=now()))
+
+    def borrows_sorted(self):
+        # Clicking the Member Name header, then scrolling down a page
+        page = self.repository.get_borrow_records_page("member", False, limit=100)
+        return len(page) + len(
+            self.repository.get_borrow_records_page("member", False, after=page[-1], limit=100) if page else []
+        )
+
+    def borrows_by_member(self):
+        member_id = self.random.randint(1, self.max_member_id)
+        self.repository.count_borrow_records(member_id=member_id)
+        return len(self.repository.get_borrow_records_page(limit=100, member_id=member_id))
+
+    def lookup_books(self):
+        return len(self.repository.lookup_books(self.word()))
+
+    def lookup_members(self):
+        return len(self.repository.lookup_members(self.word()))
+
+    def borrow(self):
+        book_id = self.available_book()
+        member_id = self.random.randint(1, self.max_member_id)
+        result = checkout(book_id, member_id, now(), self.repository)
+        if not result.ok:
+            return 0
+        self.borrowed.append((result.borrow_id, book_id))
+        return 1
+
+    def available_book(self):
+        with self.repository.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT id FROM Book WHERE id >= ? AND availability = 'Available' ORDER BY id LIMIT 1",
+                (self.random.randint(1, self.max_book_id),),
+            ).fetchone()
+        return row[0] if row else 1
+
+    def return_book(self):
+        if not self.borrowed:
+            return 0  # the borrow scenario found nothing to lend
+        borrow_id, book_id = self.borrowed.pop()
+        return_loan(borrow_id, now(), self.repository)
+        self.returned.append(borrow_id)
+        return 1
+
+    def borrows_delete(self):
+        if not self.returned:
+            return 0
+        self.repository.delete_borrow(self.returned.pop())
+        return 1
+
+    # CategoryView
+
+    def categories_load(self):
+        return len(self.repository.get_categories_with_counts())
+
+    def categories_add(self):
+        self.added_categories.append(self.repository.add_category("Benchmark category", "#FFFFFF"))
+        return 1
+
+    def categories_update(self):
+        category_id = self.added_categories[self.random.randrange(len(self.added_categories))]
+        self.repository.update_category(category_id, "Benchmark category", "#EEEEEE")
+        return 1
+
+    def categories_delete(self):
+        self.repository.delete_category(self.added_categories.pop())
+        return 1
+
+    # ReportsView
+
+    def reports_refresh(self):
+        # The first repeat also folds in any history that was never summarised
+        return refresh_summaries(repository=self.repository)
+
+    def reports_load(self):
+        return sum(len(rows) for rows in (
+            most_borrowed_books(repository=self.repository), busiest_members(repository=self.repository),
+            category_utilisation(self.repository), monthly_loan_volume(repository=self.repository),
+        ))
+
+
+# (view, scenario); run in this order, so rows are added before they are updated and deleted
+SCENARIOS = [
+    ("BookView", "books_count"),
+    ("BookView", "books_first_page"),
+    ("BookView", "books_next_page"),
+    ("BookView", "books_jump_page"),
+    ("BookView", "books_search"),
+    ("BookView", "books_add"),
+    ("BookView", "books_update"),
+    ("BookView", "books_delete"),
+    ("MemberView", "members_load"),
+    ("MemberView", "members_sorted"),
+    ("MemberView", "members_search"),
+    ("MemberView", "members_add"),
+    ("MemberView", "members_update"),
+    ("MemberView", "members_delete"),
+    ("BorrowView", "borrows_load"),
+    ("BorrowView", "borrows_overdue"),
+    ("BorrowView", "borrows_sorted"),
+    ("BorrowView", "borrows_by_member"),
+    ("BorrowView", "lookup_books"),
+    ("BorrowView", "lookup_members"),
+    ("BorrowView", "borrow"),
+    ("BorrowView", "return_book"),
+    ("BorrowView", "borrows_delete"),
+    ("CategoryView", "categories_load"),
+    ("CategoryView", "categories_add"),
+    ("CategoryView", "categories_update"),
+    ("CategoryView", "categories_delete"),
+    ("ReportsView", "reports_refresh"),
+    ("ReportsView", "reports_load"),
+]
+
+
+VIEWS = ["BookView", "MemberView", "BorrowView", "CategoryView", "ReportsView"]
+
+
+def run(path, repeat=20, profile=DEFAULT_PROFILE, seed=0, views=None, progress=None):
+    """Time every scenario ``repeat`` times against the database at ``path``.
+
+    ``views`` limits the run to the scenarios of those views. Returns a dict that can be written out as JSON.
+    """
+    repository = LibraryRepository(ConnectionPool(path, profile=profile))
+    try:
+        workload = Workload(repository, seed)
+        with repository.pool.connection() as conn:
+            sizes = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                     for table in ("Book", "Member", "Borrow", "BookCategory")}
+
+        results = []
+        for view, name in SCENARIOS:
+            if views and view not in views:
+                continue
+            scenario = getattr(workload, name)
+            timings = []
+            rows = 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows += scenario()
+                timings.append(time.perf_counter() - start)
+
+            total = sum(timings)
+            result = {
+                "view": view,
+                "scenario": name,
+                "runs": repeat,
+                "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+                "rows_per_s": round(rows / total, 1) if total else None,
+            }
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    finally:
+        repository.pool.close()
+
+    return {
+        "database": path,
+        "sizes": sizes,
+        "commit": git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "storage_profile": profile,
+        "results": results,
+    }
+
+
+def git_commit():
+    """The commit being measured, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, report):
+    """Yield (view, scenario, baseline p50, new p50, ratio) for scenarios in both reports."""
+    before = {(r["view"], r["scenario"]): r for r in baseline["results"]}
+    for result in report["results"]:
+        old = before.get((result["view"], result["scenario"]))
+        if old is not None:
+            ratio = result["p50_ms"] / old["p50_ms"] if old["p50_ms"] else None
+            yield result["view"], result["scenario"], old["p50_ms"], result["p50_ms"], ratio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the SQL behind every view, without a display")
+    parser.add_argument("database", help="Database to measure, e.g. one made by benchmarks.generate")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file for the results")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--storage-profile", choices=sorted(STORAGE_PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--views", nargs="+", choices=VIEWS, help="Run only the scenarios of these views")
+    parser.add_argument("--baseline", help="Earlier results to compare the p50 times against")
+    args = parser.parse_args()
+
+    def report(result):
+        print(f"{result['view']:<13}{result['scenario']:<18}p50 {result['p50_ms']:9.2f} ms  "
+              f"p95 {result['p95_ms']:9.2f} ms  {result['rows_per_s'] or 0:12.0f} rows/s")
+
+    results = run(args.database, args.repeat, args.storage_profile, args.seed, args.views, progress=report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} ({baseline.get('commit')}):")
+        for view, name, old, new, ratio in compare(baseline, results):
+            change = f"{ratio:6.2f}x" if ratio is not None else "     -"
+            print(f"{view:<13}{name:<18}{old:9.2f} ms -> {new:9.2f} ms  {change}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import sqlite3
+import threading
+import time
+
+from database.repository import DB_PATH, configure, get_repository
+from database.timestamps import now
+
+# Returned loans older than this many days move from Borrow to BorrowArchive
+ARCHIVE_AFTER_DAYS = 365
+
+
+def archive_closed_loans(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=1000, pause=0.05,
+                         on_batch=None, stop=None, repository=None):
+    """Move loans returned more than ``older_than_days`` ago from Borrow to BorrowArchive.
+
+    Rows move in batches of ``batch_size``. Each batch is its own short
+    transaction with a ``pause`` after it, so desks are never kept waiting.
+    ``on_batch(ids)`` is called with the ids moved by each batch. The loop
+    ends early once the ``stop`` event is set. Loans whose book or member
+    no longer exists stay where they are. Returns the number of loans moved.
+    """
+    repository = repository or get_repository()
+    cutoff = now() - older_than_days * 86400
+    moved = 0
+
+    while stop is None or not stop.is_set():
+        with repository.pool.transaction() as conn:
+            ids = [row[0] for row in conn.execute("""
+                SELECT id FROM Borrow
+                WHERE return_date < ?
+                    AND EXISTS (SELECT 1 FROM Book WHERE Book.id = Borrow.book_id)
+                    AND EXISTS (SELECT 1 FROM Member WHERE Member.id = Borrow.member_id)
+                ORDER BY id
+                LIMIT ?
+            """, (cutoff, batch_size))]
+            if not ids:
+                break
+            placeholders = ", ".join("?" * len(ids))
+            conn.execute(f"""
+                INSERT INTO BorrowArchive (id, book_id, member_id, borrow_date, due_date, return_date)
+                SELECT id, book_id, member_id, borrow_date, due_date, return_date FROM Borrow
+                WHERE id IN ({placeholders})
+            """, ids)
+            conn.execute(f"DELETE FROM Borrow WHERE id IN ({placeholders})", ids)
+
+        moved += len(ids)
+        if on_batch is not None:
+            on_batch(ids)
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    return moved
+
+
+class Archiver(threading.Thread):
+    """Background thread that archives old loans ``delay`` seconds after startup, then every ``interval``."""
+
+    def __init__(self, older_than_days=ARCHIVE_AFTER_DAYS, interval=3600, delay=60, on_batch=None):
+        super(Archiver, self).__init__(name="borrow-archiver", daemon=True)
+        self.older_than_days = older_than_days
+        self.interval = interval
+        self.delay = delay  # keeps the first run out of the way of startup
+        self.on_batch = on_batch
+        self._stopped = threading.Event()
+
+    def run(self):
+        wait = self.delay
+        while not self._stopped.wait(wait):
+            try:
+                archive_closed_loans(self.older_than_days, on_batch=self.on_batch, stop=self._stopped)
+            except sqlite3.Error:
+                pass  # e.g. busy for longer than the retries; try again on the next round
+            wait = self.interval
+
+    def stop(self):
+        self._stopped.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old, returned loans to the archive table")
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    def report(ids):
+        nonlocal total
+        total += len(ids)
+        print(f"\r{total} loans archived", end="", flush=True)
+
+    total = 0
+    moved = archive_closed_loans(
+        args.older_than_days, args.batch_size, on_batch=report, repository=configure(args.database)
+    )
+    print(f"\rArchived {moved} loans returned more than {args.older_than_days} days ago")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from database.init_db import create_tables
+from database.migrations import MIGRATIONS
+from database.repository import DB_PATH, get_repository
+
+logger = logging.getLogger(__name__)
+
+# Pages copied per step of the backup API, and the pause after each step.
+# A step holds a read lock on the database for a millisecond or two, so
+# desks never wait noticeably; 256 pages of 4 KiB make a MiB per step.
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.01
+
+# Backups kept in a backup directory; older ones are deleted after each new one
+KEEP_BACKUPS = 7
+
+# A commit by another connection makes the backup API start over. After
+# this many restarts the rest is copied in one step, under one read lock.
+MAX_RESTARTS = 3
+
+# Tables a snapshot must have to be restored
+REQUIRED_TABLES = ("Book", "BookCategory", "Member", "Borrow")
+
+BackupResult = namedtuple("BackupResult", ["path", "size", "pages", "seconds", "restarts"])
+
+
+class BackupError(Exception):
+    """A backup could not be made, or a snapshot is not fit to restore."""
+
+
+class BackupCancelled(BackupError):
+    """Raised when the progress callback asks to stop; no backup is left behind."""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_dir(path=DB_PATH):
+    """Return the default backup directory of the database at ``path``: backups/ next to it."""
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "backups")
+
+
+def _backup_name(path, label=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    return f"{name}-{label}" if label else name
+
+
+def list_backups(directory, path=DB_PATH):
+    """Return the paths of the rotated backups of ``path`` in ``directory``, newest first.
+
+    Copies saved before a restore are labelled and not listed, so rotation
+    never deletes them.
+    """
+    stem = re.escape(os.path.splitext(os.path.basename(path))[0])
+    pattern = re.compile(rf"{stem}-\d{{8}}-\d{{6}}\.db(\.gz)?$")
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) if pattern.match(name)), reverse=True)
+    return [os.path.join(directory, name) for name in names]
+
+
+def rotate_backups(directory, keep=KEEP_BACKUPS, path=DB_PATH):
+    """Delete all but the ``keep`` newest backups of ``path``; returns the deleted paths."""
+    removed = list_backups(directory, path)[keep:]
+    for old in removed:
+        os.remove(old)
+    return removed
+
+
+def copy_database(source, target, pages_per_step=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None):
+    """Copy the open database ``source`` into the connection ``target`` with the online backup API.
+
+    Pages are copied ``pages_per_step`` at a time with a ``pause`` after
+    each step, so other connections keep reading and writing meanwhile.
+    In WAL mode the copy reads one snapshot under a read transaction held
+    throughout, which writers do not wait for. Otherwise a commit by
+    another connection makes SQLite start the copy over: the pauses then
+    stop, and after MAX_RESTARTS the rest is copied in a single step.
+    ``progress(copied, total)`` is called with page counts after each step;
+    returning False cancels. Returns (pages, restarts).
+    """
+    state = {"remaining": None, "restarts": 0, "pause": pause}
+
+    def step(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            state["pause"] = 0  # catch up before the next commit
+            if state["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state["remaining"] = remaining
+        if progress is not None and progress(total - remaining, total) is False:
+            raise BackupCancelled("Backup cancelled")
+        if state["pause"] and remaining:
+            time.sleep(state["pause"])
+
+    pinned = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    if pinned:
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # starts the read transaction
+    try:
+        source.backup(target, pages=pages_per_step, progress=step)
+    except _TooManyRestarts:
+        logger.warning("Backup restarted by other desks' commits %d times; copying the rest in one step",
+                       state["restarts"])
+        source.backup(target)
+    finally:
+        if pinned:
+            source.rollback()
+    pages = source.execute("PRAGMA page_count").fetchone()[0]
+    if progress is not None:
+        progress(pages, pages)
+    return pages, state["restarts"]
+
+
+def check_snapshot(path, full=True):
+    """Raise BackupError unless the database file at ``path`` is intact and this version can open it.
+
+    ``full`` runs PRAGMA integrity_check, which reads every page and index;
+    otherwise the much quicker quick_check skips the index contents.
+    """
+    if not os.path.isfile(path):
+        raise BackupError(f"{path} does not exist")
+    conn = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in conn.execute(
+            "PRAGMA integrity_check" if full else "PRAGMA quick_check"
+        )]
+        if problems != ["ok"]:
+            raise BackupError(f"{path} is damaged: {'; '.join(problems[:5])}")
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [table for table in REQUIRED_TABLES if table not in tables]
+        if missing:
+            raise BackupError(f"{path} is not a library database, it has no {', '.join(missing)} table")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > MIGRATIONS[-1][0]:
+            raise BackupError(
+                f"{path} was made by a newer version of the application (schema {version}, "
+                f"this one knows up to {MIGRATIONS[-1][0]})"
+            )
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path} is not a readable database: {e}")
+    finally:
+        conn.close()
+
+
+def backup_database(directory=None, compress=False, keep=KEEP_BACKUPS, label=None,
+                    pages_per_step=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None, path=None):
+    """Snapshot the live database into ``directory`` without stopping the desks.
+
+    The copy is written to a .part file, checked with quick_check,
+    optionally gzipped, and only then given its final name,
+    ``<db>-YYYYmmdd-HHMMSS.db`` or ``.db.gz``, so a backup that exists is
+    complete. Afterwards all but the ``keep`` newest backups are deleted;
+    a ``label`` marks a copy that rotation leaves alone. See copy_database
+    for the throttling and ``progress``. Returns a BackupResult.
+    """
+    path = path or get_repository().pool.path
+    directory = directory or backup_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, _backup_name(path, label))
+    copy, packed = base + ".db.part", base + ".db.gz.part"
+    final = base + (".db.gz" if compress else ".db")
+
+    start = time.perf_counter()
+    try:
+        source = sqlite3.connect(path, timeout=30.0)
+        target = sqlite3.connect(copy)
+        try:
+            pages, restarts = copy_database(source, target, pages_per_step, pause, progress)
+            # A copy of a WAL database is in WAL mode too; a backup should be one self-contained file
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+            source.close()
+        check_snapshot(copy, full=False)
+
+        if compress:
+            with open(copy, "rb") as src, gzip.open(packed, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(copy)
+            os.replace(packed, final)
+        else:
+            os.replace(copy, final)
+    except BaseException:
+        for leftover in (copy, packed):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    if label is None:
+        for old in rotate_backups(directory, keep, path):
+            logger.info("Deleted old backup %s", old)
+    return BackupResult(final, os.path.getsize(final), pages, time.perf_counter() - start, restarts)
+
+
+def restore_backup(snapshot, directory=None, progress=None, path=None):
+    """Replace the live database with the backup at ``snapshot``, after checking it.
+
+    The snapshot (gunzipped first if needed) must pass a full
+    integrity_check before anything is touched, and the current database is
+    saved as a ``pre-restore`` backup. It is then copied in with the backup
+    API in a single step, so every connection sees either the old database
+    or the restored one, migrated to the current schema and checked again.
+    The TableVersion counters end up above anything the desks have seen,
+    so their change watchers reload every list. Returns the path of the
+    pre-restore copy.
+    """
+    path = path or get_repository().pool.path
+    directory = directory or backup_dir(path)
+    os.makedirs(directory, exist_ok=True)
+
+    unpacked = None
+    if snapshot.endswith(".gz"):
+        unpacked = os.path.join(directory, os.path.basename(snapshot)[:-len(".gz")] + ".restore")
+        with gzip.open(snapshot, "rb") as src, open(unpacked, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    try:
+        source_path = unpacked or snapshot
+        check_snapshot(source_path)
+        saved = backup_database(directory, label="pre-restore", progress=progress, path=path).path
+
+        source = sqlite3.connect(source_path)
+        live = sqlite3.connect(path, timeout=30.0)
+        try:
+            before = _table_versions(live)
+            source.backup(live)
+        finally:
+            source.close()
+            live.close()
+    finally:
+        if unpacked is not None:
+            os.remove(unpacked)
+
+    create_tables(path)
+    live = sqlite3.connect(path, timeout=30.0)
+    try:
+        with live:
+            for name, version in _table_versions(live).items():
+                live.execute(
+                    "UPDATE TableVersion SET version = ? WHERE name = ?",
+                    (max(version, before.get(name, 0)) + 1, name),
+                )
+        problems = [row[0] for row in live.execute("PRAGMA quick_check")]
+    finally:
+        live.close()
+    if problems != ["ok"]:
+        raise BackupError(f"The restored database failed its check: {'; '.join(problems[:5])}; "
+                          f"the previous one is saved as {saved}")
+    return saved
+
+
+def _table_versions(conn):
+    try:
+        return dict(conn.execute("SELECT name, version FROM TableVersion"))
+    except sqlite3.OperationalError:
+        return {}  # a snapshot from before migration 11
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Back up the library database while the desks keep working, or restore a backup"
+    )
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument("--dir", help="backup directory (default: backups/ next to the database)")
+    parser.add_argument("--compress", action="store_true", help="gzip the backup")
+    parser.add_argument("--keep", type=int, default=KEEP_BACKUPS, help="backups to keep (default: %(default)s)")
+    parser.add_argument(
+        "--pages-per-step", type=int, default=PAGES_PER_STEP,
+        help="pages copied per step of the backup API (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--pause", type=float, default=STEP_PAUSE, help="seconds to pause after each step (default: %(default)s)",
+    )
+    parser.add_argument("--list", action="store_true", help="list the backups, newest first")
+    parser.add_argument("--verify", metavar="BACKUP", help="run a full integrity check on a backup")
+    parser.add_argument(
+        "--restore", metavar="BACKUP",
+        help="check a backup and replace the database with it; the current one is saved first",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    directory = args.dir or backup_dir(args.database)
+
+    if args.list:
+        for backup in list_backups(directory, args.database):
+            print(f"{os.path.getsize(backup) / 1048576:10.1f} MiB  {backup}")
+        return
+
+    def report(copied, total):
+        print(f"\r{copied * 100 // max(total, 1)}% copied", end="", flush=True)
+
+    try:
+        if args.verify:
+            check_snapshot(args.verify)
+            print(f"{args.verify} is intact")
+        elif args.restore:
+            saved = restore_backup(args.restore, directory, progress=report, path=args.database)
+            print(f"\rRestored {args.database} from {args.restore}; the previous database is saved as {saved}")
+        else:
+            result = backup_database(
+                directory, args.compress, args.keep, pages_per_step=args.pages_per_step,
+                pause=args.pause, progress=report, path=args.database,
+            )
+            print(f"\rBacked up {result.pages} pages to {result.path} ({result.size / 1048576:.1f} MiB) "
+                  f"in {result.seconds:.1f} s")
+    except BackupError as e:
+        print()
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
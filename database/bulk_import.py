@@ -0,0 +1,112 @@
+import argparse
+import csv
+import time
+from collections import namedtuple
+from itertools import islice
+
+from database.repository import DB_PATH, configure, get_repository
+
+AVAILABILITY_VALUES = ("Available", "Not Available")
+NEW_CATEGORY_COLOR = "#FFFFFF"
+
+ImportResult = namedtuple("ImportResult", ["imported", "skipped", "categories_created", "seconds"])
+
+
+class ImportCancelled(Exception):
+    """Raised when the progress callback asks to stop; nothing is imported."""
+
+
+def read_books(path):
+    """Yield (title, author, category, availability) from a CSV file, one row at a time.
+
+    The file needs a header row with title, author and category columns;
+    availability is optional. Rows missing a required value yield None.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            title = (row.get("title") or "").strip()
+            author = (row.get("author") or "").strip()
+            category = (row.get("category") or "").strip()
+            availability = (row.get("availability") or "").strip()
+            if not title or not author or not category:
+                yield None
+                continue
+            if availability not in AVAILABILITY_VALUES:
+                availability = "Available"
+            yield title, author, category, availability
+
+
+def import_books_csv(path, batch_size=1000, progress=None, repository=None):
+    """Stream books from a CSV file into the database in a single transaction.
+
+    Categories are looked up by name and created when missing. Rows are
+    inserted with executemany in batches of ``batch_size``; after each batch
+    ``progress(imported, rows_per_second)`` is called, and returning False
+    from it cancels the import and rolls everything back.
+    """
+    repository = repository or get_repository()
+    start = time.perf_counter()
+    imported = skipped = categories_created = 0
+    rows = read_books(path)
+
+    with repository.pool.transaction() as conn:
+        category_ids = {}  # name -> id, first one wins for duplicate names
+        for category_id, name in conn.execute("SELECT id, name FROM BookCategory"):
+            category_ids.setdefault(name, category_id)
+
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+
+            batch = []
+            for row in chunk:
+                if row is None:
+                    skipped += 1
+                    continue
+                title, author, category, availability = row
+                category_id = category_ids.get(category)
+                if category_id is None:
+                    category_id = conn.execute(
+                        "INSERT INTO BookCategory (name, color) VALUES (?, ?)",
+                        (category, NEW_CATEGORY_COLOR),
+                    ).lastrowid
+                    category_ids[category] = category_id
+                    categories_created += 1
+                batch.append((title, author, category_id, availability))
+
+            conn.executemany(
+                "INSERT INTO Book (title, author, category_id, availability) VALUES (?, ?, ?, ?)",
+                batch,
+            )
+            imported += len(batch)
+
+            if progress is not None:
+                elapsed = time.perf_counter() - start
+                if progress(imported, imported / elapsed if elapsed else 0.0) is False:
+                    raise ImportCancelled()
+
+    return ImportResult(imported, skipped, categories_created, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import books from a CSV file")
+    parser.add_argument("csv_file", help="CSV with title, author, category and optional availability columns")
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    def report(imported, rate):
+        print(f"\r{imported} books imported ({rate:.0f} rows/s)", end="", flush=True)
+
+    result = import_books_csv(
+        args.csv_file, args.batch_size, progress=report, repository=configure(args.database)
+    )
+    print(
+        f"\nImported {result.imported} books in {result.seconds:.1f} s, "
+        f"skipped {result.skipped} incomplete rows, created {result.categories_created} categories"
+    )
+
+
+if __name__ == "__main__":
+    main()
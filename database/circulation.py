@@ -0,0 +1,131 @@
+import sqlite3
+from collections import namedtuple
+
+from database.repository import get_repository, remotable
+from database.timestamps import due_date
+
+# Outcomes of a checkout
+CHECKED_OUT = "checked_out"
+ALREADY_ON_LOAN = "already_on_loan"
+NO_SUCH_BOOK = "no_such_book"
+NO_SUCH_MEMBER = "no_such_member"
+
+# Outcomes of a return
+RETURNED = "returned"
+ALREADY_RETURNED = "already_returned"
+NO_SUCH_LOAN = "no_such_loan"
+NOT_ON_LOAN = "not_on_loan"
+
+
+class CirculationResult(namedtuple("CirculationResult", ["status", "borrow_id", "book_id"])):
+    """What a checkout or return did: one of the status constants above, plus the ids involved."""
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status in (CHECKED_OUT, RETURNED)
+
+
+def _decode_results(rows):
+    return [CirculationResult(*row) for row in rows]
+
+
+def checkout(book_id, member_id, borrow_date, repository=None):
+    """Lend a book to a member in one short write transaction.
+
+    Dates here are epoch seconds (database.timestamps.now()); the loan is
+    due LOAN_DAYS after ``borrow_date``.
+
+    The book is claimed with a conditional UPDATE that only succeeds while
+    it is Available. The unique index on open loans (migration 7) backs
+    this up. Two desks lending the same copy at the same moment therefore
+    get one CHECKED_OUT and one ALREADY_ON_LOAN, never two loans.
+    """
+    return checkout_books([book_id], member_id, borrow_date, repository)[0]
+
+
+@remotable(decode=_decode_results)
+def checkout_books(book_ids, member_id, borrow_date, repository=None):
+    """Lend several books to one member in a single transaction, returning a result per book.
+
+    Each book succeeds or fails on its own: a book that is on loan does
+    not stop the others from being lent.
+    """
+    repository = repository or get_repository()
+    with repository.pool.transaction() as conn:
+        if conn.execute("SELECT 1 FROM Member WHERE id = ?", (member_id,)).fetchone() is None:
+            return [CirculationResult(NO_SUCH_MEMBER, None, book_id) for book_id in book_ids]
+        return [_checkout(conn, book_id, member_id, borrow_date) for book_id in book_ids]
+
+
+def _checkout(conn, book_id, member_id, borrow_date):
+    claimed = conn.execute(
+        "UPDATE Book SET availability = 'Not Available' WHERE id = ? AND availability = 'Available'",
+        (book_id,),
+    ).rowcount
+    if not claimed:
+        exists = conn.execute("SELECT 1 FROM Book WHERE id = ?", (book_id,)).fetchone()
+        return CirculationResult(ALREADY_ON_LOAN if exists else NO_SUCH_BOOK, None, book_id)
+
+    try:
+        borrow_id = conn.execute(
+            "INSERT INTO Borrow (member_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)",
+            (member_id, book_id, borrow_date, due_date(borrow_date)),
+        ).lastrowid
+    except sqlite3.IntegrityError:
+        # Marked Available but it still has an open loan: put the flag back as it was
+        conn.execute("UPDATE Book SET availability = 'Available' WHERE id = ?", (book_id,))
+        return CirculationResult(ALREADY_ON_LOAN, None, book_id)
+    return CirculationResult(CHECKED_OUT, borrow_id, book_id)
+
+
+@remotable(decode=lambda row: CirculationResult(*row))
+def return_loan(borrow_id, return_date, repository=None):
+    """Close a loan and make its book available again, in one short write transaction.
+
+    Only an open loan is closed, so returning the same loan twice from two
+    desks leaves the first return date in place and reports ALREADY_RETURNED.
+    """
+    repository = repository or get_repository()
+    with repository.pool.transaction() as conn:
+        closed = conn.execute(
+            "UPDATE Borrow SET return_date = ? WHERE id = ? AND return_date IS NULL",
+            (return_date, borrow_id),
+        ).rowcount
+        row = conn.execute("SELECT book_id FROM Borrow WHERE id = ?", (borrow_id,)).fetchone()
+        if row is None:
+            archived = conn.execute("SELECT book_id FROM BorrowArchive WHERE id = ?", (borrow_id,)).fetchone()
+            if archived is not None:
+                return CirculationResult(ALREADY_RETURNED, borrow_id, archived[0])
+            return CirculationResult(NO_SUCH_LOAN, borrow_id, None)
+        if not closed:
+            return CirculationResult(ALREADY_RETURNED, borrow_id, row[0])
+
+        conn.execute("UPDATE Book SET availability = 'Available' WHERE id = ?", (row[0],))
+    return CirculationResult(RETURNED, borrow_id, row[0])
+
+
+@remotable(decode=_decode_results)
+def return_books(book_ids, return_date, repository=None):
+    """Close the open loans of several books, given by book id as scanned at the desk.
+
+    All of them are returned in a single transaction, with a result per
+    book; a book that is not on loan reports NOT_ON_LOAN.
+    """
+    repository = repository or get_repository()
+    with repository.pool.transaction() as conn:
+        return [_return_book(conn, book_id, return_date) for book_id in book_ids]
+
+
+def _return_book(conn, book_id, return_date):
+    row = conn.execute(
+        "SELECT id FROM Borrow WHERE book_id = ? AND return_date IS NULL", (book_id,)
+    ).fetchone()
+    if row is None:
+        exists = conn.execute("SELECT 1 FROM Book WHERE id = ?", (book_id,)).fetchone()
+        return CirculationResult(NOT_ON_LOAN if exists else NO_SUCH_BOOK, None, book_id)
+
+    conn.execute("UPDATE Borrow SET return_date = ? WHERE id = ?", (return_date, row[0]))
+    conn.execute("UPDATE Book SET availability = 'Available' WHERE id = ?", (book_id,))
+    return CirculationResult(RETURNED, row[0], book_id)
@@ -0,0 +1,116 @@
+import argparse
+import functools
+import http.client
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from database.repository import LibraryRepository
+from database.server import DEFAULT_PORT, OPERATIONS
+
+
+class RemoteError(sqlite3.DatabaseError):
+    """The library server could not be reached, or refused the request."""
+
+
+def _tuples(value):
+    """Turn the JSON arrays in a result back into the tuples sqlite3 returns, below the top-level list."""
+    if isinstance(value, list):
+        return [tuple(_tuples(item)) if isinstance(item, list) else item for item in value]
+    return value
+
+
+class RemoteRepository:
+    """Stands in for LibraryRepository, running every operation on a database.server process.
+
+    Each thread keeps its own keep-alive connection to the server. Database
+    errors raised on the server are raised here again as the same sqlite3
+    exception types, so the views handle them as before.
+    """
+
+    remote = True
+    make_search_query = staticmethod(LibraryRepository.make_search_query)
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=30.0):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        if name in OPERATIONS:
+            return functools.partial(self.call, name)
+        raise AttributeError(name)
+
+    def _request(self, method, path, body=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(method, path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        except (OSError, http.client.HTTPException, ValueError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def call(self, name, *args, **kwargs):
+        """Run the operation ``name`` on the server and return its result."""
+        body = json.dumps({"args": args, "kwargs": kwargs})
+        writes = OPERATIONS[name][2]
+        # A read can safely be sent again over a fresh connection, e.g. after the server restarted
+        for attempt in range(1 if writes else 2):
+            try:
+                status, payload = self._request("POST", f"/call/{name}", body)
+                break
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                error = e
+        else:
+            raise RemoteError(f"Library server {self.host}:{self.port} is not reachable: {error}") from error
+
+        if status != 200:
+            error_type = getattr(sqlite3, payload.get("type", ""), None)
+            if not (isinstance(error_type, type) and issubclass(error_type, sqlite3.Error)):
+                error_type = RemoteError
+            raise error_type(payload.get("error", f"{name} failed"))
+        return _tuples(payload["result"])
+
+    def health(self):
+        """Return the server's cache statistics."""
+        return self._request("GET", "/health")[1]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a library server answers, and how fast")
+    parser.add_argument("url", nargs="?", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    repository = RemoteRepository(args.url)
+    for name, call in (
+        ("count_books", repository.count_books),
+        ("get_books_page", repository.get_books_page),
+        ("get_members", repository.get_members),
+        ("get_borrow_records", repository.get_borrow_records),
+    ):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            call()
+            times.append((time.perf_counter() - start) * 1000)
+        print(f"{name:20s} first {times[0]:8.2f} ms, then best {min(times[1:] or times):8.2f} ms")
+    print(repository.health())
+
+
+if __name__ == "__main__":
+    main()
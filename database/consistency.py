@@ -0,0 +1,65 @@
+import argparse
+
+from database.repository import DB_PATH, configure, get_repository
+
+# The counters on BookCategory as they should be, computed from Book
+ACTUAL_CATEGORY_COUNTS = """
+    SELECT BookCategory.id,
+        COUNT(Book.id),
+        COUNT(CASE WHEN Book.availability = 'Available' THEN 1 END),
+        COUNT(CASE WHEN Book.availability = 'Not Available' THEN 1 END)
+    FROM BookCategory
+    LEFT JOIN Book ON Book.category_id = BookCategory.id
+    GROUP BY BookCategory.id
+"""
+
+
+def check_category_counts(repository=None):
+    """Compare the trigger-maintained category counters with a recount of Book.
+
+    Returns (category id, stored counts, actual counts) for every category
+    whose (book_count, available_count, on_loan_count) are off.
+    """
+    repository = repository or get_repository()
+    with repository.pool.connection() as conn:
+        stored = {row[0]: tuple(row[1:]) for row in conn.execute(
+            "SELECT id, book_count, available_count, on_loan_count FROM BookCategory"
+        )}
+        actual = {row[0]: tuple(row[1:]) for row in conn.execute(ACTUAL_CATEGORY_COUNTS)}
+    return [(category_id, stored[category_id], counts)
+            for category_id, counts in sorted(actual.items()) if stored.get(category_id) != counts]
+
+
+def rebuild_category_counts(repository=None):
+    """Recompute every category's counters from Book; returns the number of categories fixed."""
+    repository = repository or get_repository()
+    with repository.pool.transaction() as conn:
+        fixed = 0
+        for category_id, total, available, on_loan in conn.execute(ACTUAL_CATEGORY_COUNTS).fetchall():
+            fixed += conn.execute("""
+                UPDATE BookCategory SET book_count = ?, available_count = ?, on_loan_count = ?
+                WHERE id = ? AND (book_count, available_count, on_loan_count) IS NOT (?, ?, ?)
+            """, (total, available, on_loan, category_id, total, available, on_loan)).rowcount
+    return fixed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the denormalized counters against the data")
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument("--repair", action="store_true", help="Rebuild the counters that are off")
+    args = parser.parse_args()
+
+    repository = configure(args.database)
+    drift = check_category_counts(repository)
+    for category_id, stored, actual in drift:
+        print(f"Category {category_id}: stored (books, available, on loan) {stored}, actual {actual}")
+    if not drift:
+        print("Category counts are consistent")
+    elif args.repair:
+        print(f"Rebuilt the counts of {rebuild_category_counts(repository)} categories")
+    else:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import csv
+import gzip
+import json
+
+from database.repository import DB_PATH, configure, get_repository
+
+# What can be exported: name -> (column names, query)
+EXPORTS = {
+    "borrows": (
+        ["borrow_id", "borrow_date", "due_date", "return_date", "member_id", "member_name",
+         "member_email", "book_id", "book_title", "book_author"],
+        """
+        SELECT b.id,
+            datetime(b.borrow_date, 'unixepoch', 'localtime'),
+            datetime(b.due_date, 'unixepoch', 'localtime'),
+            datetime(b.return_date, 'unixepoch', 'localtime'),
+            m.id, m.name, m.email, bk.id, bk.title, bk.author
+        FROM (
+            SELECT id, book_id, member_id, borrow_date, due_date, return_date FROM BorrowArchive
+            UNION ALL
+            SELECT id, book_id, member_id, borrow_date, due_date, return_date FROM Borrow
+        ) b
+        JOIN Member m ON b.member_id = m.id
+        JOIN Book bk ON b.book_id = bk.id
+        ORDER BY b.id
+        """,
+    ),
+    "catalog": (
+        ["book_id", "title", "author", "category", "availability"],
+        """
+        SELECT Book.id, title, author, BookCategory.name, availability
+        FROM Book
+        LEFT JOIN BookCategory ON Book.category_id = BookCategory.id
+        ORDER BY Book.id
+        """,
+    ),
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+def iter_rows(conn, query, chunk_size=1000):
+    """Yield the rows of ``query`` while holding at most ``chunk_size`` of them in memory."""
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def write_csv(rows, columns, f):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_jsonl(rows, columns, f):
+    for row in rows:
+        f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        f.write("\n")
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def open_output(path, compress):
+    if compress:
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def export(name, path, fmt="csv", compress=None, chunk_size=1000, progress=None, repository=None):
+    """Stream one of the EXPORTS to ``path`` as CSV or JSON Lines and return the row count.
+
+    Rows flow from the cursor to the file through generators, so memory use
+    does not depend on the size of the table. ``compress`` defaults to
+    gzip when ``path`` ends in .gz.
+    """
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export {name!r}, expected one of: {', '.join(EXPORTS)}")
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of: {', '.join(FORMATS)}")
+    if compress is None:
+        compress = path.endswith(".gz")
+
+    repository = repository or get_repository()
+    columns, query = EXPORTS[name]
+    total = 0
+
+    def counted(rows, every=10000):
+        """Pass rows through, counting them and reporting progress every ``every`` rows."""
+        nonlocal total
+        for total, row in enumerate(rows, start=1):
+            yield row
+            if progress is not None and total % every == 0:
+                progress(total)
+
+    with repository.pool.connection() as conn, open_output(path, compress) as f:
+        WRITERS[fmt](counted(iter_rows(conn, query, chunk_size)), columns, f)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export borrow history or the catalog")
+    parser.add_argument("name", choices=sorted(EXPORTS))
+    parser.add_argument("output", help="File to write; a .gz suffix compresses it")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    total = export(
+        args.name, args.output, args.format, chunk_size=args.chunk_size,
+        progress=lambda count: print(f"\r{count} rows exported", end="", flush=True),
+        repository=configure(args.database),
+    )
+    print(f"\rExported {total} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
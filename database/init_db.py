@@ -1,7 +1,12 @@
+import logging
 import sqlite3
+from database.migrations import migrate
 
-def create_tables():
-    conn = sqlite3.connect("database/library.db")
+DB_PATH = "database/library.db"
+
+def create_tables(path=DB_PATH):
+    """Create any missing tables, then bring the schema up to date."""
+    conn = sqlite3.connect(path)
     cursor = conn.cursor()
 
     # Enable foreign key constraints
@@ -47,7 +52,12 @@ def create_tables():
     """)
 
     conn.commit()
+
+    # Indexes and later schema changes are versioned migrations
+    migrate(conn)
     conn.close()
 
 if __name__ == "__main__":
+    # Report the migrations applied
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     create_tables()
@@ -0,0 +1,305 @@
+import json
+import logging
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+
+log = logging.getLogger(__name__)
+
+# Statements slower than this are logged together with their query plan
+SLOW_QUERY_MS = 100.0
+
+# Support modules under views/ that run queries for a view; the view's own frame names the handler
+INFRASTRUCTURE_MODULES = {
+    "views.background", "views.changes", "views.invalidation", "views.lookup_ctrl", "views.paged_list",
+}
+
+# Set by QueryExecutor while a background query runs, naming the handler that submitted it
+submitted_by = ContextVar("submitted_by", default=None)
+
+
+def calling_handler():
+    """Name the view method (e.g. ``BorrowView.on_borrow_book``) the current statement runs for."""
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("views."):
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            if module not in INFRASTRUCTURE_MODULES:
+                return name
+            fallback = fallback or name
+        frame = frame.f_back
+    return submitted_by.get() or fallback or "-"
+
+
+@contextmanager
+def handler_context(handler):
+    """Attribute the statements run inside the block to ``handler``."""
+    token = submitted_by.set(handler)
+    try:
+        yield
+    finally:
+        submitted_by.reset(token)
+
+
+@lru_cache(maxsize=1024)
+def normalize(sql):
+    """Collapse whitespace so the same statement groups together however it is indented."""
+    return " ".join(sql.split())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class StatementStats:
+    """Running totals for one statement issued by one handler."""
+
+    def __init__(self, handler, sql, window):
+        self.handler = handler
+        self.sql = sql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.recent = deque(maxlen=window)  # latest durations, for the rolling percentiles
+        self.last_seen = None
+
+    def add(self, ms, rows):
+        self.calls += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.rows += rows
+        self.recent.append(ms)
+        self.last_seen = time.time()
+
+    def as_dict(self):
+        return {
+            "handler": self.handler,
+            "sql": self.sql,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.calls, 3),
+            "p50_ms": round(percentile(self.recent, 0.50), 3),
+            "p95_ms": round(percentile(self.recent, 0.95), 3),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "last_seen": datetime.fromtimestamp(self.last_seen).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+
+class QueryStats:
+    """Thread-safe aggregates of every statement run through an InstrumentedConnection.
+
+    Statements are grouped by calling handler and SQL text. Each group keeps
+    totals since startup (or the last ``reset``) and the durations of its
+    ``window`` latest runs for rolling p50/p95. Statements slower than
+    ``slow_ms`` are logged with their EXPLAIN QUERY PLAN and the latest
+    ``slow_log_size`` of them are kept for the diagnostics tab.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, window=200, slow_log_size=50):
+        self.slow_ms = slow_ms
+        self.window = window
+        self.statements = {}  # (handler, sql) -> StatementStats
+        self.slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def record(self, conn, sql, params, ms, rows, handler):
+        sql = normalize(sql)
+        with self._lock:
+            stats = self.statements.get((handler, sql))
+            if stats is None:
+                stats = self.statements[(handler, sql)] = StatementStats(handler, sql, self.window)
+            stats.add(ms, rows)
+
+        if ms >= self.slow_ms:
+            plan = explain(conn, sql, params)
+            with self._lock:
+                self.slow.append({
+                    "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "handler": handler,
+                    "sql": sql,
+                    "ms": round(ms, 3),
+                    "rows": rows,
+                    "plan": plan,
+                })
+            log.warning("Slow query (%.1f ms, %d rows) in %s: %s\n%s",
+                        ms, rows, handler, sql, "\n".join(plan) or "(no plan)")
+
+    def snapshot(self):
+        """Return (statement dicts, slowest total time first; slow query dicts, newest first)."""
+        with self._lock:
+            statements = [stats.as_dict() for stats in self.statements.values()]
+            slow = list(reversed(self.slow))
+        statements.sort(key=lambda stats: stats["total_ms"], reverse=True)
+        return statements, slow
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.slow.clear()
+
+    def export_json(self, path):
+        """Write the aggregates and the slow query log to ``path``."""
+        statements, slow = self.snapshot()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "slow_query_ms": self.slow_ms,
+                "statements": statements,
+                "slow_queries": slow,
+            }, f, indent=2)
+
+
+EXPLAINABLE = re.compile(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def explain(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN of a statement as indented lines."""
+    if not EXPLAINABLE.match(sql):
+        return []
+    try:
+        # A plain cursor, so explaining is not itself recorded
+        cursor = sqlite3.Cursor(conn)
+        rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+
+    depth = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that times each statement, counts its rows and reports it to the QueryStats.
+
+    A statement is reported once it is done with: after execute for writes,
+    and for reads when its rows are exhausted, fetchall'd, or the cursor is
+    re-executed, closed or collected. The time spent executing and fetching
+    is counted, not the time the caller spends between fetches.
+    """
+
+    _sql = None
+
+    def execute(self, sql, params=()):
+        return self._run(sql, params, super().execute, params)
+
+    def executemany(self, sql, seq_of_params):
+        # The plan does not depend on the values, so explain with the first row's
+        seq_of_params = list(seq_of_params)
+        first = seq_of_params[0] if seq_of_params else ()
+        return self._run(sql, first, super().executemany, seq_of_params)
+
+    def _run(self, sql, params, run, args):
+        self._finish()
+        self._sql, self._params, self._rows, self._ms = sql, params, 0, 0.0
+        self._handler = calling_handler()
+        start = time.perf_counter()
+        try:
+            run(sql, args)
+        finally:
+            self._ms += (time.perf_counter() - start) * 1000
+        if self.description is None:
+            # Not a query: nothing left to fetch
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def _timed(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._sql is not None:
+                self._ms += (time.perf_counter() - start) * 1000
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._sql is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._sql is not None:
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._sql is not None:
+            self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass  # may run during interpreter shutdown
+
+    def _finish(self):
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        try:
+            get_stats().record(self.connection, sql, self._params, self._ms, self._rows, self._handler)
+        except sqlite3.Error:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection factory whose statements all go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+_stats = None
+
+
+def get_stats():
+    """Return the process-wide statement statistics, creating them on first use."""
+    global _stats
+    if _stats is None:
+        _stats = QueryStats()
+    return _stats
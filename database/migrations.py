@@ -0,0 +1,535 @@
+import logging
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Registered migrations as (version, description, function, foreign_keys), applied in version order.
+# Each function receives an open connection inside a transaction and must be
+# safe to run against a database where some of its objects already exist.
+MIGRATIONS = []
+
+
+def migration(version, description, foreign_keys=True):
+    """Register a schema migration that upgrades the database to ``version``.
+
+    Migrations that rebuild a table another table references must pass
+    ``foreign_keys=False``: dropping the old parent table with foreign keys
+    enforced would cascade-delete its children.
+    """
+    def register(apply):
+        MIGRATIONS.append((version, description, apply, foreign_keys))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return apply
+    return register
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_columns(conn, table):
+    """Return the names of ``table``'s columns, e.g. to skip adding one that is already there."""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migrate(conn, log=logger.info):
+    """Apply every migration newer than the database's ``PRAGMA user_version``.
+
+    Each migration runs in its own transaction together with the bump of
+    ``user_version`` and a SchemaMigration row recording how long it took.
+    Returns the list of (version, description, duration_ms) applied.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS SchemaMigration (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL,
+        duration_ms REAL NOT NULL
+    )
+    """)
+    conn.commit()
+
+    applied = []
+    current = get_version(conn)
+    for version, description, apply, foreign_keys in MIGRATIONS:
+        if version <= current:
+            continue
+
+        # The pragma is ignored inside a transaction, so switch it before BEGIN
+        enforced = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+        if enforced and not foreign_keys:
+            conn.execute("PRAGMA foreign_keys = OFF")
+
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply(conn)
+            duration_ms = (time.perf_counter() - start) * 1000
+            conn.execute(
+                "INSERT OR REPLACE INTO SchemaMigration (version, description, applied_at, duration_ms) "
+                "VALUES (?, ?, ?, ?)",
+                (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), duration_ms),
+            )
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if enforced and not foreign_keys:
+                conn.execute("PRAGMA foreign_keys = ON")
+
+        if log:
+            log(f"Applied migration {version} ({description}) in {duration_ms:.1f} ms")
+        applied.append((version, description, duration_ms))
+        current = version
+    return applied
+
+
+@migration(1, "Index foreign keys")
+def index_foreign_keys(conn):
+    # Also covers the per-category book counts, which only read these two columns
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_book_category ON Book(category_id, availability)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_book ON Borrow(book_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_member ON Borrow(member_id)")
+
+
+@migration(2, "Partial index on open loans")
+def index_open_loans(conn):
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_borrow_open ON Borrow(book_id) WHERE return_date IS NULL"
+    )
+
+
+@migration(3, "Covering indexes for the dropdown lists")
+def index_dropdown_lists(conn):
+    # SELECT id, title FROM Book / SELECT id, name FROM Member read only the index
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_book_title ON Book(title)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_name ON Member(name)")
+
+
+@migration(4, "Full-text search over book titles and authors")
+def add_book_search(conn):
+    # External-content FTS5 index: the text lives in Book only, triggers keep the index in sync.
+    # The prefix indexes make search-as-you-type prefix queries cheap.
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS BookSearch USING fts5(
+        title, author,
+        content='Book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='1 2 3'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS book_search_insert AFTER INSERT ON Book BEGIN
+        INSERT INTO BookSearch (rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS book_search_delete AFTER DELETE ON Book BEGIN
+        INSERT INTO BookSearch (BookSearch, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS book_search_update AFTER UPDATE OF title, author ON Book BEGIN
+        INSERT INTO BookSearch (BookSearch, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO BookSearch (rowid, title, author) VALUES (new.id, new.title, new.author);
+    END
+    """)
+    conn.execute("INSERT INTO BookSearch (BookSearch) VALUES ('rebuild')")
+
+
+@migration(5, "Case-insensitive prefix indexes for the borrow lookups")
+def index_lookups(conn):
+    # The borrow pickers search by prefix instead of listing every row
+    conn.execute("DROP INDEX IF EXISTS idx_book_title")
+    conn.execute("DROP INDEX IF EXISTS idx_member_name")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_book_title_nocase ON Book(title COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_book_author_nocase ON Book(author COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_name_nocase ON Member(name COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_email_nocase ON Member(email COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_phone ON Member(phone)")
+
+
+@migration(6, "Trigger-maintained book counts per category")
+def add_category_counts(conn):
+    # The category tab reads these instead of counting the Book table on every refresh.
+    # "IS" yields 0 or 1 even for a NULL availability.
+    existing = table_columns(conn, "BookCategory")
+    for column in ("book_count", "available_count", "on_loan_count"):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE BookCategory ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_count_insert AFTER INSERT ON Book BEGIN
+        UPDATE BookCategory SET
+            book_count = book_count + 1,
+            available_count = available_count + (new.availability IS 'Available'),
+            on_loan_count = on_loan_count + (new.availability IS 'Not Available')
+        WHERE id = new.category_id;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_count_delete AFTER DELETE ON Book BEGIN
+        UPDATE BookCategory SET
+            book_count = book_count - 1,
+            available_count = available_count - (old.availability IS 'Available'),
+            on_loan_count = on_loan_count - (old.availability IS 'Not Available')
+        WHERE id = old.category_id;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_count_update AFTER UPDATE OF category_id, availability ON Book BEGIN
+        UPDATE BookCategory SET
+            book_count = book_count - 1,
+            available_count = available_count - (old.availability IS 'Available'),
+            on_loan_count = on_loan_count - (old.availability IS 'Not Available')
+        WHERE id = old.category_id;
+        UPDATE BookCategory SET
+            book_count = book_count + 1,
+            available_count = available_count + (new.availability IS 'Available'),
+            on_loan_count = on_loan_count + (new.availability IS 'Not Available')
+        WHERE id = new.category_id;
+    END
+    """)
+    conn.execute("""
+    UPDATE BookCategory SET
+        book_count = (SELECT COUNT(*) FROM Book WHERE category_id = BookCategory.id),
+        available_count = (SELECT COUNT(*) FROM Book
+                           WHERE category_id = BookCategory.id AND availability = 'Available'),
+        on_loan_count = (SELECT COUNT(*) FROM Book
+                         WHERE category_id = BookCategory.id AND availability = 'Not Available')
+    """)
+
+
+@migration(7, "At most one open loan per book")
+def unique_open_loans(conn):
+    # Older databases can hold several open loans for one book. A newer checkout
+    # means the book came back, so close each one when the next one started.
+    conn.execute("""
+    UPDATE Borrow SET return_date = (
+        SELECT MIN(newer.borrow_date) FROM Borrow newer
+        WHERE newer.book_id = Borrow.book_id AND newer.return_date IS NULL AND newer.id > Borrow.id
+    )
+    WHERE return_date IS NULL AND EXISTS (
+        SELECT 1 FROM Borrow newer
+        WHERE newer.book_id = Borrow.book_id AND newer.return_date IS NULL AND newer.id > Borrow.id
+    )
+    """)
+    conn.execute("""
+    UPDATE Book SET availability = 'Not Available'
+    WHERE availability IS NOT 'Not Available'
+        AND id IN (SELECT book_id FROM Borrow WHERE return_date IS NULL)
+    """)
+    # Replaces the plain partial index from migration 2
+    conn.execute("DROP INDEX IF EXISTS idx_borrow_open")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_borrow_open_unique ON Borrow(book_id) WHERE return_date IS NULL"
+    )
+
+
+@migration(8, "Archive table for old, returned loans")
+def add_borrow_archive(conn):
+    # Filled by database.archive; Borrow keeps the open and recent loans only.
+    # Rows keep their Borrow id, which AUTOINCREMENT never hands out again.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS BorrowArchive (
+        id INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        member_id INTEGER NOT NULL,
+        borrow_date TEXT NOT NULL,
+        return_date TEXT NOT NULL,
+        FOREIGN KEY(book_id) REFERENCES Book(id) ON DELETE CASCADE,
+        FOREIGN KEY(member_id) REFERENCES Member(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_archive_book ON BorrowArchive(book_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_archive_member ON BorrowArchive(member_id)")
+
+
+@migration(9, "Integer epoch timestamps and due dates", foreign_keys=False)
+def integer_timestamps(conn):
+    # Dates were local-time text. strftime('%s', text, 'utc') reads such a text as
+    # local time and gives seconds since the epoch, which index and compare as
+    # plain integers. Loans get a due date 14 days after they were borrowed.
+    # Dates that are integers already and due dates that exist already are kept.
+    loan_period = 14 * 86400
+
+    def epoch(column):
+        return (f"CASE WHEN typeof({column}) = 'text' "
+                f"THEN CAST(strftime('%s', {column}, 'utc') AS INTEGER) ELSE {column} END")
+
+    def due_date(table):
+        if "due_date" in table_columns(conn, table):
+            return "due_date"
+        return f"{epoch('borrow_date')} + {loan_period}"
+
+    def keep_sequence(table):
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def restore_sequence(table, seq):
+        # Ids of deleted or archived rows must never be handed out again
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (seq, table))
+        conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS "
+            "(SELECT 1 FROM sqlite_sequence WHERE name = ?)", (table, seq, table),
+        )
+
+    borrow_seq = keep_sequence("Borrow")
+    conn.execute("DROP TABLE IF EXISTS Borrow_new")
+    conn.execute("""
+    CREATE TABLE Borrow_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER NOT NULL,
+        member_id INTEGER NOT NULL,
+        borrow_date INTEGER NOT NULL,
+        due_date INTEGER NOT NULL,
+        return_date INTEGER,
+        FOREIGN KEY(book_id) REFERENCES Book(id) ON DELETE CASCADE,
+        FOREIGN KEY(member_id) REFERENCES Member(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute(f"""
+    INSERT INTO Borrow_new (id, book_id, member_id, borrow_date, due_date, return_date)
+    SELECT id, book_id, member_id, {epoch("borrow_date")}, {due_date("Borrow")}, {epoch("return_date")}
+    FROM Borrow
+    """)
+    conn.execute("DROP TABLE Borrow")
+    conn.execute("ALTER TABLE Borrow_new RENAME TO Borrow")
+    restore_sequence("Borrow", borrow_seq)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_book ON Borrow(book_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_member ON Borrow(member_id)")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_borrow_open_unique ON Borrow(book_id) WHERE return_date IS NULL"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_borrow_date ON Borrow(borrow_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_due_open ON Borrow(due_date) WHERE return_date IS NULL")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_borrow_returned ON Borrow(return_date) WHERE return_date IS NOT NULL"
+    )
+
+    conn.execute("DROP TABLE IF EXISTS BorrowArchive_new")
+    conn.execute("""
+    CREATE TABLE BorrowArchive_new (
+        id INTEGER PRIMARY KEY,
+        book_id INTEGER NOT NULL,
+        member_id INTEGER NOT NULL,
+        borrow_date INTEGER NOT NULL,
+        due_date INTEGER NOT NULL,
+        return_date INTEGER NOT NULL,
+        FOREIGN KEY(book_id) REFERENCES Book(id) ON DELETE CASCADE,
+        FOREIGN KEY(member_id) REFERENCES Member(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute(f"""
+    INSERT INTO BorrowArchive_new (id, book_id, member_id, borrow_date, due_date, return_date)
+    SELECT id, book_id, member_id, {epoch("borrow_date")}, {due_date("BorrowArchive")}, {epoch("return_date")}
+    FROM BorrowArchive
+    """)
+    conn.execute("DROP TABLE BorrowArchive")
+    conn.execute("ALTER TABLE BorrowArchive_new RENAME TO BorrowArchive")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_archive_book ON BorrowArchive(book_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_archive_member ON BorrowArchive(member_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrow_archive_borrow_date ON BorrowArchive(borrow_date)")
+
+    member_seq = keep_sequence("Member")
+    conn.execute("DROP TABLE IF EXISTS Member_new")
+    conn.execute("""
+    CREATE TABLE Member_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        membership_date INTEGER NOT NULL
+    )
+    """)
+    conn.execute(f"""
+    INSERT INTO Member_new (id, name, email, phone, membership_date)
+    SELECT id, name, email, phone, {epoch("membership_date")}
+    FROM Member
+    """)
+    conn.execute("DROP TABLE Member")
+    conn.execute("ALTER TABLE Member_new RENAME TO Member")
+    restore_sequence("Member", member_seq)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_name_nocase ON Member(name COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_email_nocase ON Member(email COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_phone ON Member(phone)")
+
+
+@migration(10, "Summary tables for the circulation reports")
+def add_loan_summaries(conn):
+    # Loan counts per book, member, category (the book's current one, see
+    # migration 14) and month. database.reports folds new loans in, up to
+    # the high-water mark on Borrow.id kept in ReportState; these triggers
+    # take deleted loans that were already counted back out, so the loans
+    # must go before their book. Moving a loan to the archive is not a
+    # deletion, the archive row exists by the time Borrow's goes.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ReportState (
+        name TEXT PRIMARY KEY,
+        high_water INTEGER NOT NULL,
+        refreshed_at INTEGER
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO ReportState (name, high_water) VALUES ('loans', 0)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS BookLoanSummary (
+        book_id INTEGER PRIMARY KEY,
+        loans INTEGER NOT NULL,
+        last_borrowed INTEGER
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS MemberLoanSummary (
+        member_id INTEGER PRIMARY KEY,
+        loans INTEGER NOT NULL,
+        last_borrowed INTEGER
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS CategoryLoanSummary (
+        category_id INTEGER PRIMARY KEY,
+        loans INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS MonthlyLoanSummary (
+        month TEXT PRIMARY KEY,
+        loans INTEGER NOT NULL
+    )
+    """)
+    # The top-N reports walk these backwards instead of sorting every row
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_book_loan_summary_loans ON BookLoanSummary(loans)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_loan_summary_loans ON MemberLoanSummary(loans)")
+
+    for table, condition in (
+        ("Borrow", "NOT EXISTS (SELECT 1 FROM BorrowArchive WHERE id = old.id)"),
+        ("BorrowArchive", "1"),
+    ):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table.lower()}_summary_delete AFTER DELETE ON {table}
+        WHEN old.id <= (SELECT high_water FROM ReportState WHERE name = 'loans') AND {condition}
+        BEGIN
+            UPDATE BookLoanSummary SET loans = loans - 1 WHERE book_id = old.book_id;
+            UPDATE MemberLoanSummary SET loans = loans - 1 WHERE member_id = old.member_id;
+            UPDATE CategoryLoanSummary SET loans = loans - 1
+                WHERE category_id = (SELECT category_id FROM Book WHERE id = old.book_id);
+            UPDATE MonthlyLoanSummary SET loans = loans - 1
+                WHERE month = strftime('%Y-%m', old.borrow_date, 'unixepoch', 'localtime');
+        END
+        """)
+
+
+# Tables the views show, and the columns whose updates they care about
+# (None: any column). BookCategory's counters change with every loan, but
+# the views only show its name and color.
+VERSIONED_TABLES = {
+    "Book": None,
+    "Member": None,
+    "BookCategory": "name, color",
+    "Borrow": None,
+}
+
+
+@migration(11, "Change counters for the reference data caches")
+def add_table_versions(conn):
+    # A counter per table, bumped by every row change whatever connection or
+    # process made it. database.reference_data polls them, after PRAGMA
+    # data_version says something was committed, to refetch only the tables
+    # that changed.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS TableVersion (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """)
+    for table, columns in VERSIONED_TABLES.items():
+        conn.execute("INSERT OR IGNORE INTO TableVersion (name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            target = f"UPDATE OF {columns}" if event == "UPDATE" and columns else event
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_{event.lower()} AFTER {target} ON {table}
+            BEGIN
+                UPDATE TableVersion SET version = version + 1 WHERE name = '{table}';
+            END
+            """)
+
+
+@migration(12, "Indexes for sorting the member and borrow lists")
+def add_sort_indexes(conn):
+    # Every sortable column of the two lists walks an index, see
+    # MEMBER_SORTS and BORROW_SORTS in database.repository. Open loans sort
+    # their missing return date as 0, so that one is an expression index.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_member_membership_date ON Member(membership_date)")
+    for table in ("Borrow", "BorrowArchive"):
+        prefix = "idx_borrow" if table == "Borrow" else "idx_borrow_archive"
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_due_date ON {table}(due_date)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_return_sort ON {table}(IFNULL(return_date, 0))")
+
+
+@migration(13, "Trigram index for the fuzzy member search")
+def add_member_search(conn):
+    # External-content FTS5 index over every substring of three characters
+    # of the name, email and phone, kept in sync by triggers like BookSearch.
+    # search_members only asks which rows hold which trigrams, so no
+    # positions are stored (detail='none'), which keeps the index small.
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS MemberSearch USING fts5(
+        name, email, phone,
+        content='Member', content_rowid='id',
+        tokenize='trigram', detail='none'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS member_search_insert AFTER INSERT ON Member BEGIN
+        INSERT INTO MemberSearch (rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS member_search_delete AFTER DELETE ON Member BEGIN
+        INSERT INTO MemberSearch (MemberSearch, rowid, name, email, phone)
+        VALUES ('delete', old.id, old.name, old.email, old.phone);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS member_search_update AFTER UPDATE OF name, email, phone ON Member BEGIN
+        INSERT INTO MemberSearch (MemberSearch, rowid, name, email, phone)
+        VALUES ('delete', old.id, old.name, old.email, old.phone);
+        INSERT INTO MemberSearch (rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone);
+    END
+    """)
+    # Merge the segments the rebuild leaves behind: lookups on one segment seek faster
+    conn.execute("INSERT INTO MemberSearch (MemberSearch) VALUES ('rebuild')")
+    conn.execute("INSERT INTO MemberSearch (MemberSearch) VALUES ('optimize')")
+
+
+@migration(14, "Category loan totals follow their books")
+def move_category_loans_with_books(conn):
+    # A book moved to another category takes its counted loans along, so
+    # CategoryLoanSummary always adds up the loans of the books now in each
+    # category, which is what the summary triggers take back out. The
+    # totals are then recounted from BookLoanSummary: archived loans that
+    # went by cascade after their book was deleted were never taken out.
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS book_category_loans_move AFTER UPDATE OF category_id ON Book
+    WHEN old.category_id IS NOT new.category_id
+    BEGIN
+        UPDATE CategoryLoanSummary
+            SET loans = loans - COALESCE((SELECT loans FROM BookLoanSummary WHERE book_id = old.id), 0)
+            WHERE category_id = old.category_id;
+        INSERT INTO CategoryLoanSummary (category_id, loans)
+        SELECT new.category_id, loans FROM BookLoanSummary WHERE book_id = new.id
+        ON CONFLICT(category_id) DO UPDATE SET loans = loans + excluded.loans;
+    END
+    """)
+    conn.execute("DELETE FROM CategoryLoanSummary")
+    conn.execute("""
+    INSERT INTO CategoryLoanSummary (category_id, loans)
+    SELECT Book.category_id, SUM(s.loans)
+    FROM BookLoanSummary s
+    JOIN Book ON Book.id = s.book_id
+    GROUP BY Book.category_id
+    """)
@@ -0,0 +1,149 @@
+import sqlite3
+import threading
+from collections import Counter
+
+from database.repository import get_repository
+
+# How often the desks and the server look for commits by other processes
+POLL_INTERVAL = 1.0
+
+# Member names and book titles kept per table before starting over
+MAX_CACHED_NAMES = 10000
+
+
+class ChangeTracker:
+    """Notices which tables other connections and processes have changed.
+
+    ``PRAGMA data_version`` on a dedicated connection changes whenever any
+    other connection commits, and costs no I/O, so polling it is cheap.
+    Only then are the TableVersion counters of migration 11 read. The part
+    of each counter's movement that the pool's own transactions account for
+    is this process's doing and already reported by the views; the rest
+    came from another desk.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+        self.data_version = None
+        self.versions = None  # counters at the previous poll
+        self.unclaimed = Counter()  # local changes committed after the counters were read
+
+    def poll(self):
+        """Return the names of the tables another process changed since the last poll."""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.pool.path, check_same_thread=False)
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return set()
+        self.data_version = data_version
+
+        versions = dict(self.conn.execute("SELECT name, version FROM TableVersion"))
+        local = self.pool.take_local_changes()
+        self.pool.note_table_versions(versions)
+        previous, self.versions = self.versions, versions
+        if previous is None:
+            return set()
+
+        changed = set()
+        for name, version in versions.items():
+            moved = version - previous.get(name, version)
+            claimed = local[name] + self.unclaimed[name]
+            if moved > claimed:
+                changed.add(name)
+                self.unclaimed[name] = 0
+            else:
+                self.unclaimed[name] = claimed - moved
+        return changed
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class ReferenceCache:
+    """Categories, member names and book titles, kept until their table changes.
+
+    An entry is good while the table's TableVersion counter still reads
+    what it did when the entry was fetched. The pool moves the counters on
+    every local commit and a ChangeTracker on other processes' commits, so
+    checking costs a dict lookup. Against a library server every call goes
+    to the server, which caches the results itself.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository or get_repository()
+        self._lock = threading.Lock()
+        self._entries = {}  # table -> (counter, cached data)
+
+    def _table(self, table, empty):
+        """Return (counter, cached data) of ``table``, emptied first if the table changed."""
+        if self.repository.remote:
+            return None, empty()
+        version = self.repository.pool.table_versions.get(table)
+        entry = self._entries.get(table)
+        if version is None or entry is None or entry[0] != version:
+            entry = self._entries[table] = (version, empty())
+        return entry
+
+    def _store(self, table, version, store):
+        """Run ``store(data)`` unless the table changed while its rows were fetched."""
+        with self._lock:
+            entry = self._entries.get(table)
+            if version is not None and entry is not None and entry[0] == version:
+                store(entry[1])
+
+    def categories(self, ids=None):
+        """Return (id, name) like LibraryRepository.get_categories."""
+        with self._lock:
+            version, categories = self._table("BookCategory", list)
+            rows = list(categories)
+        if not rows:
+            rows = self.repository.get_categories()
+
+            def store(categories):
+                if not categories:  # unless another thread got there first
+                    categories.extend(rows)
+            self._store("BookCategory", version, store)
+        if ids is None:
+            return rows
+        ids = set(ids)
+        return [row for row in rows if row[0] in ids]
+
+    def _names(self, table, ids, fetch):
+        """Return {id: name} for ``ids``, fetching the missing ones in one query."""
+        ids = set(ids)
+        with self._lock:
+            version, names = self._table(table, dict)
+            found = {row_id: names[row_id] for row_id in ids if row_id in names}
+        missing = ids - found.keys()
+        if missing:
+            fetched = dict(fetch(missing))
+            found.update(fetched)
+
+            def store(names):
+                if len(names) + len(fetched) > MAX_CACHED_NAMES:
+                    names.clear()
+                names.update(fetched)
+            self._store(table, version, store)
+        return found
+
+    def member_names(self, ids):
+        """Return {member id: name} for the members in ``ids`` that exist."""
+        return self._names("Member", ids, lambda ids: [row[:2] for row in self.repository.get_members(ids)])
+
+    def book_titles(self, ids):
+        """Return {book id: title} for the books in ``ids`` that exist."""
+        return self._names("Book", ids, lambda ids: [row[:2] for row in self.repository.get_books_by_id(ids)])
+
+
+_cache = None
+
+
+def get_reference_cache():
+    """Return the process-wide reference data cache."""
+    global _cache
+    if _cache is None or _cache.repository is not get_repository():
+        _cache = ReferenceCache()
+    return _cache
@@ -0,0 +1,165 @@
+import argparse
+
+from database.repository import DB_PATH, configure, get_repository, remotable
+from database.timestamps import now
+
+# Loans not yet in the summary tables, both still in Borrow and already archived
+NEW_LOANS = """
+    SELECT id, book_id, member_id, borrow_date FROM Borrow WHERE id > :low AND id <= :high
+    UNION ALL
+    SELECT id, book_id, member_id, borrow_date FROM BorrowArchive WHERE id > :low AND id <= :high
+"""
+
+# How each summary table takes in the new loans
+FOLD_NEW_LOANS = [
+    f"""
+    INSERT INTO BookLoanSummary (book_id, loans, last_borrowed)
+    SELECT book_id, COUNT(*), MAX(borrow_date) FROM ({NEW_LOANS}) GROUP BY book_id
+    ON CONFLICT(book_id) DO UPDATE SET
+        loans = loans + excluded.loans, last_borrowed = MAX(last_borrowed, excluded.last_borrowed)
+    """,
+    f"""
+    INSERT INTO MemberLoanSummary (member_id, loans, last_borrowed)
+    SELECT member_id, COUNT(*), MAX(borrow_date) FROM ({NEW_LOANS}) GROUP BY member_id
+    ON CONFLICT(member_id) DO UPDATE SET
+        loans = loans + excluded.loans, last_borrowed = MAX(last_borrowed, excluded.last_borrowed)
+    """,
+    f"""
+    INSERT INTO CategoryLoanSummary (category_id, loans)
+    SELECT Book.category_id, COUNT(*) FROM ({NEW_LOANS}) AS loan
+    JOIN Book ON Book.id = loan.book_id
+    GROUP BY Book.category_id
+    ON CONFLICT(category_id) DO UPDATE SET loans = loans + excluded.loans
+    """,
+    f"""
+    INSERT INTO MonthlyLoanSummary (month, loans)
+    SELECT strftime('%Y-%m', borrow_date, 'unixepoch', 'localtime') AS month, COUNT(*)
+    FROM ({NEW_LOANS}) GROUP BY month
+    ON CONFLICT(month) DO UPDATE SET loans = loans + excluded.loans
+    """,
+]
+
+SUMMARY_TABLES = ("BookLoanSummary", "MemberLoanSummary", "CategoryLoanSummary", "MonthlyLoanSummary")
+
+
+@remotable
+def refresh_summaries(batch_size=20000, repository=None):
+    """Fold the loans made since the last refresh into the summary tables.
+
+    Only loans above the high-water mark on Borrow.id are read, in short
+    transactions of at most ``batch_size`` ids that each move the mark
+    forward, so the first refresh of a large history does not hold the
+    write lock for long and later ones only touch the delta. Returns the
+    number of loans folded in.
+    """
+    repository = repository or get_repository()
+    total = 0
+    while True:
+        with repository.pool.transaction() as conn:
+            low = conn.execute("SELECT high_water FROM ReportState WHERE name = 'loans'").fetchone()[0]
+            top = conn.execute(
+                "SELECT MAX(COALESCE((SELECT MAX(id) FROM Borrow), 0), COALESCE((SELECT MAX(id) FROM BorrowArchive), 0))"
+            ).fetchone()[0]
+            if top <= low:
+                conn.execute("UPDATE ReportState SET refreshed_at = ? WHERE name = 'loans'", (now(),))
+                return total
+            high = min(top, low + batch_size)
+            total += conn.execute(
+                f"SELECT COUNT(*) FROM ({NEW_LOANS})", {"low": low, "high": high}
+            ).fetchone()[0]
+            for statement in FOLD_NEW_LOANS:
+                conn.execute(statement, {"low": low, "high": high})
+            conn.execute(
+                "UPDATE ReportState SET high_water = ?, refreshed_at = ? WHERE name = 'loans'", (high, now())
+            )
+
+
+def rebuild_summaries(repository=None):
+    """Empty the summary tables and fold in every loan again; returns the number of loans."""
+    repository = repository or get_repository()
+    with repository.pool.transaction() as conn:
+        for table in SUMMARY_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("UPDATE ReportState SET high_water = 0, refreshed_at = NULL WHERE name = 'loans'")
+    return refresh_summaries(repository=repository)
+
+
+def _fetchall(repository, query, params=()):
+    repository = repository or get_repository()
+    with repository.pool.connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+@remotable
+def get_report_state(repository=None):
+    """Return (high-water mark, time of the last refresh) of the summary tables."""
+    return _fetchall(repository, "SELECT high_water, refreshed_at FROM ReportState WHERE name = 'loans'")[0]
+
+
+@remotable
+def most_borrowed_books(limit=20, repository=None):
+    """Return (book id, title, author, loans, last borrowed) for the most borrowed books."""
+    return _fetchall(repository, """
+        SELECT Book.id, Book.title, Book.author, s.loans, s.last_borrowed
+        FROM BookLoanSummary s
+        CROSS JOIN Book ON Book.id = s.book_id
+        WHERE s.loans > 0
+        ORDER BY s.loans DESC
+        LIMIT ?
+    """, (limit,))
+
+
+@remotable
+def busiest_members(limit=20, repository=None):
+    """Return (member id, name, email, loans, last borrowed) for the members who borrowed most."""
+    return _fetchall(repository, """
+        SELECT Member.id, Member.name, Member.email, s.loans, s.last_borrowed
+        FROM MemberLoanSummary s
+        CROSS JOIN Member ON Member.id = s.member_id
+        WHERE s.loans > 0
+        ORDER BY s.loans DESC
+        LIMIT ?
+    """, (limit,))
+
+
+@remotable
+def category_utilisation(repository=None):
+    """Return (category id, name, loans, books, on loan now) per category, most loans first.
+
+    The book counts are the trigger-maintained counters of migration 6.
+    """
+    return _fetchall(repository, """
+        SELECT c.id, c.name, COALESCE(s.loans, 0), c.book_count, c.on_loan_count
+        FROM BookCategory c
+        LEFT JOIN CategoryLoanSummary s ON s.category_id = c.id
+        ORDER BY COALESCE(s.loans, 0) DESC, c.name
+    """)
+
+
+@remotable
+def monthly_loan_volume(months=24, repository=None):
+    """Return (month as YYYY-MM, loans) for the last ``months`` months with loans, newest first."""
+    return _fetchall(
+        repository, "SELECT month, loans FROM MonthlyLoanSummary ORDER BY month DESC LIMIT ?", (months,)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the circulation report summaries up to date")
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Recount every loan from scratch")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    args = parser.parse_args()
+
+    repository = configure(args.database)
+    if args.rebuild:
+        print(f"Rebuilt the summaries from {rebuild_summaries(repository)} loans")
+    else:
+        print(f"Folded {refresh_summaries(args.batch_size, repository)} new loans into the summaries")
+
+    for book_id, title, author, loans, _ in most_borrowed_books(10, repository):
+        print(f"{loans:8d}  {title} by {author} (#{book_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,808 @@
+import functools
+import inspect
+import queue
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from database.instrumentation import InstrumentedConnection
+from database.storage import DEFAULT_PROFILE, Checkpointer, apply_profile, get_profile, retry_busy
+
+DB_PATH = "database/library.db"
+
+# Applied to every new connection; sqlite forgets these when a connection closes.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+)
+
+# Sortable columns of the member and borrow lists: sort name -> ORDER BY
+# terms as (expression, position of its value in a row). Each sort ends in
+# a unique column, so the last row of a page says where the next starts,
+# and each can walk an index (migration 12) instead of sorting.
+MEMBER_SORTS = {
+    "id": [("id", 0)],
+    "name": [("name COLLATE NOCASE", 1), ("id", 0)],
+    "email": [("email COLLATE NOCASE", 2), ("id", 0)],
+    "phone": [("phone", 3), ("id", 0)],
+    "membership_date": [("membership_date", 4), ("id", 0)],
+}
+BORROW_SORTS = {
+    "id": [("b.id", 0)],
+    "member": [("m.name COLLATE NOCASE", 1), ("m.id", 6), ("b.id", 0)],
+    "title": [("bk.title COLLATE NOCASE", 2), ("bk.id", 7), ("b.id", 0)],
+    "borrow_date": [("b.borrow_date", 3), ("b.id", 0)],
+    "due_date": [("b.due_date", 4), ("b.id", 0)],
+    "return_date": [("IFNULL(b.return_date, 0)", 5), ("b.id", 0)],
+}
+
+# The joins of a borrow list page, led by the table whose index gives the order
+BORROW_JOINS = {
+    "member": "Member m CROSS JOIN {table} b ON b.member_id = m.id CROSS JOIN Book bk ON b.book_id = bk.id",
+    "title": "Book bk CROSS JOIN {table} b ON b.book_id = bk.id CROSS JOIN Member m ON b.member_id = m.id",
+}
+DEFAULT_BORROW_JOIN = "{table} b CROSS JOIN Member m ON b.member_id = m.id CROSS JOIN Book bk ON b.book_id = bk.id"
+
+# A filter that leaves fewer rows than this is applied first and only its
+# rows are sorted; a wider one is checked while walking the sort index,
+# which finds a page of matches sooner than sorting them all would.
+SORT_AFTER_FILTER_ROWS = 5000
+
+# Fuzzy member search, see LibraryRepository.search_members: the most
+# terms one FTS5 query may have, the rows read to tell how common a
+# trigram is, the candidates fetched per query for every result asked
+# for, and the most consecutive trigrams one typo spoils (a swap of two
+# letters spoils four)
+MEMBER_SEARCH_CLAUSES = 8
+MEMBER_SEARCH_SAMPLE = 64
+MEMBER_SEARCH_CANDIDATES = 2
+MEMBER_SEARCH_TYPO_SPAN = 4
+
+
+@functools.lru_cache(maxsize=4096)
+def _padded_trigrams(word):
+    """Trigrams of one word; names and mail domains recur, so they are worked out once."""
+    word = f"  {word} "
+    return frozenset(word[i:i + 3] for i in range(len(word) - 2))
+
+
+class ConnectionPool:
+    """A small pool of long-lived SQLite connections shared by all views."""
+
+    def __init__(self, path=DB_PATH, size=4, cached_statements=128, timeout=30.0,
+                 profile=DEFAULT_PROFILE):
+        self.path = path
+        self.size = size
+        self.cached_statements = cached_statements  # prepared statements kept per connection
+        self.timeout = timeout
+        self.profile = get_profile(profile)
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+        # TableVersion counters (migration 11) after the latest commit seen,
+        # and how far this process's own commits moved them; see
+        # database.reference_data. _changes_lock is held from each commit
+        # until its moves are counted, so they are never taken half-way.
+        self.table_versions = {}
+        self._local_changes = Counter()
+        self._changes_lock = threading.Lock()
+
+        self._checkpointer = None
+        if self.profile["journal_mode"] == "WAL" and self.profile["checkpoint_interval"]:
+            self._checkpointer = Checkpointer(self, self.profile["checkpoint_interval"])
+            self._checkpointer.start()
+
+    def _connect(self):
+        """Open a new connection and apply the storage profile and per-connection PRAGMAs.
+
+        Statements run on pooled connections are timed and attributed to the
+        calling view handler, see database.instrumentation.
+        """
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            timeout=self.profile["busy_timeout"] / 1000,
+            factory=InstrumentedConnection,
+        )
+        apply_profile(conn, self.profile)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one while below the pool size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any unfinished transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection for a write transaction; commit on success, roll back on error.
+
+        The write lock is taken up front with BEGIN IMMEDIATE, retrying with
+        backoff while another desk holds it, so the statements inside never
+        fail half-way with "database is locked". The change counters are
+        read at both ends, while the lock keeps other writers out, to tell
+        this process's changes from those of other desks. A ChangeTracker
+        that sees the commit therefore also gets its moves.
+        """
+        with self.connection() as conn:
+            retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"), self.profile)
+            try:
+                before = self._read_table_versions(conn)
+                yield conn
+                after = self._read_table_versions(conn)
+                with self._changes_lock:
+                    retry_busy(conn.commit, self.profile)
+                    for name, version in after.items():
+                        self._local_changes[name] += version - before.get(name, version)
+            except BaseException:
+                conn.rollback()
+                raise
+            with self._lock:
+                self._note_table_versions(after)
+
+    @staticmethod
+    def _read_table_versions(conn):
+        try:
+            return dict(conn.execute("SELECT name, version FROM TableVersion"))
+        except sqlite3.OperationalError:
+            return {}  # not migrated yet
+
+    def _note_table_versions(self, versions):
+        for name, version in versions.items():
+            if version > self.table_versions.get(name, -1):
+                self.table_versions[name] = version
+
+    def note_table_versions(self, versions):
+        """Record counters read outside a transaction, e.g. after another desk's commit."""
+        with self._lock:
+            self._note_table_versions(versions)
+
+    def take_local_changes(self):
+        """Return how far this process's commits moved each counter since the last call.
+
+        Waits for a commit in progress to be counted, so that counters read
+        after the commit are never compared with moves that leave it out.
+        """
+        with self._changes_lock:
+            changes, self._local_changes = self._local_changes, Counter()
+        return changes
+
+    def retry(self, operation):
+        """Run ``operation()``, retrying with backoff while the database is busy."""
+        return retry_busy(operation, self.profile)
+
+    def close(self):
+        """Stop checkpointing and close every connection owned by the pool."""
+        if self._checkpointer is not None:
+            self._checkpointer.stop()
+            self._checkpointer = None
+            try:
+                with self.connection() as conn:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._idle = queue.LifoQueue()
+
+
+class LibraryRepository:
+    """Data-access layer used by the views; every query goes through here."""
+
+    # database.client.RemoteRepository stands in for this class when the
+    # desks share a database.server process
+    remote = False
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def close(self):
+        self.pool.close()
+
+    def _fetchall(self, query, params=()):
+        with self.pool.connection() as conn:
+            return self.pool.retry(lambda: conn.execute(query, params).fetchall())
+
+    def _fetchone(self, query, params=()):
+        with self.pool.connection() as conn:
+            return self.pool.retry(lambda: conn.execute(query, params).fetchone())
+
+    def _execute(self, query, params=()):
+        with self.pool.transaction() as conn:
+            return conn.execute(query, params).lastrowid
+
+    @staticmethod
+    def _id_filter(column, ids):
+        """Build a ``WHERE column IN (...)`` clause, or nothing when ids is None."""
+        if ids is None:
+            return "", ()
+        ids = tuple(ids)
+        return f"WHERE {column} IN ({', '.join('?' * len(ids))})", ids
+
+    def _is_narrow(self, table, conditions, params):
+        """Return True when ``conditions`` leave fewer than SORT_AFTER_FILTER_ROWS rows of ``table``."""
+        if not conditions:
+            return False
+        return self._fetchone(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {' AND '.join(conditions)} LIMIT ?)",
+            tuple(params) + (SORT_AFTER_FILTER_ROWS,),
+        )[0] < SORT_AFTER_FILTER_ROWS
+
+    @staticmethod
+    def _seek(terms, after, descending):
+        """Build the condition for the rows that sort after the row ``after``, and its parameters.
+
+        Spelled ``a >= ? AND (a > ? OR (...))`` rather than as a row value
+        comparison, which SQLite cannot seek on when a term has a collation.
+        """
+        greater, greater_or_equal = ("<", "<=") if descending else (">", ">=")
+        # A NULL sorts as IFNULL(column, 0) does
+        values = [0 if after[position] is None else after[position] for _, position in terms]
+        condition, params = f"{terms[-1][0]} {greater} ?", (values[-1],)
+        for (expression, _), value in zip(reversed(terms[:-1]), reversed(values[:-1])):
+            condition = f"{expression} {greater_or_equal} ? AND ({expression} {greater} ? OR ({condition}))"
+            params = (value, value) + params
+        return condition, params
+
+    def _page(self, columns, source, terms, conditions, params, descending, after, offset, limit,
+              use_sort_index=True):
+        """Fetch one page of a sorted list, seeking past ``after`` or else skipping ``offset`` rows.
+
+        Without ``use_sort_index`` the sort terms are written as ``+term``,
+        which keeps SQLite off their indexes and on those of the filters.
+        """
+        if not use_sort_index:
+            terms = [(f"+{expression}", position) for expression, position in terms]
+        conditions, params = list(conditions), tuple(params)
+        if after is not None:
+            condition, seek_params = self._seek(terms, after, descending)
+            conditions.append(condition)
+            params += seek_params
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+        order = ", ".join(f"{expression} {direction}" for expression, _ in terms)
+        return self._fetchall(
+            f"SELECT {columns} FROM {source} {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + (limit, 0 if after is not None else offset),
+        )
+
+    # Categories
+
+    def get_categories(self, ids=None):
+        """Return (id, name) for every category, or only those in ``ids``."""
+        where, params = self._id_filter("id", ids)
+        return self._fetchall(f"SELECT id, name FROM BookCategory {where}", params)
+
+    def get_categories_with_counts(self, ids=None):
+        """Return (id, name, color, book_count, available_count, on_loan_count) per category.
+
+        The counts are kept up to date by triggers on Book (migration 6), so
+        this reads one row per category; database.consistency can check and
+        rebuild them.
+        """
+        where, params = self._id_filter("id", ids)
+        return self._fetchall(f"""
+            SELECT id, name, color, book_count, available_count, on_loan_count
+            FROM BookCategory
+            {where}
+        """, params)
+
+    def add_category(self, name, color):
+        return self._execute(
+            "INSERT INTO BookCategory (name, color) VALUES (?, ?)", (name, color)
+        )
+
+    def update_category(self, category_id, name, color):
+        self._execute(
+            "UPDATE BookCategory SET name = ?, color = ? WHERE id = ?",
+            (name, color, category_id),
+        )
+
+    def delete_category(self, category_id):
+        """Delete a category together with all of its books and their loans, archived ones included.
+
+        Returns the ids of the deleted books and borrow records.
+        """
+        with self.pool.transaction() as conn:
+            book_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM Book WHERE category_id = ?", (category_id,)
+            )]
+            borrow_ids = []
+            for table in ("Borrow", "BorrowArchive"):
+                borrow_ids += [row[0] for row in conn.execute(
+                    f"SELECT id FROM {table} WHERE book_id IN (SELECT id FROM Book WHERE category_id = ?)",
+                    (category_id,),
+                )]
+                # Before the books: the summary triggers look up each loan's category through its book
+                conn.execute(
+                    f"DELETE FROM {table} WHERE book_id IN (SELECT id FROM Book WHERE category_id = ?)",
+                    (category_id,),
+                )
+            conn.execute("DELETE FROM Book WHERE category_id = ?", (category_id,))
+            conn.execute("DELETE FROM BookCategory WHERE id = ?", (category_id,))
+        return book_ids, borrow_ids
+
+    # Books
+
+    def count_books(self):
+        return self._fetchone("SELECT COUNT(*) FROM Book")[0]
+
+    def get_books_page(self, after_id=None, offset=0, limit=100):
+        """Return one page of (id, title, author, category, availability, color) rows.
+
+        Pages are keyed on Book.id: pass the last id of the previous page as
+        ``after_id`` to seek straight to the next one. Without it, the first
+        id of the page is located by ``offset`` on the primary key alone.
+        """
+        if after_id is not None:
+            condition, params = "Book.id > ?", (after_id, limit)
+        else:
+            condition = "Book.id >= (SELECT id FROM Book ORDER BY id LIMIT 1 OFFSET ?)"
+            params = (offset, limit)
+
+        return self._fetchall(f"""
+            SELECT Book.id, title, author, BookCategory.name, availability, BookCategory.color
+            FROM Book
+            LEFT JOIN BookCategory ON Book.category_id = BookCategory.id
+            WHERE {condition}
+            ORDER BY Book.id
+            LIMIT ?
+        """, params)
+
+    @staticmethod
+    def make_search_query(text):
+        """Turn what the user typed into an FTS5 query matching every word as a prefix.
+
+        Returns None when there is nothing to search for.
+        """
+        words = [word.replace('"', "") for word in text.split()]
+        words = [word for word in words if word]
+        if not words:
+            return None
+        return " ".join(f'"{word}"*' for word in words)
+
+    def count_book_search(self, query):
+        """Return how many books match an FTS5 query from make_search_query."""
+        return self._fetchone(
+            "SELECT COUNT(*) FROM BookSearch WHERE BookSearch MATCH ?", (query,)
+        )[0]
+
+    def search_books_page(self, query, after=None, offset=0, limit=100):
+        """Return one page of books matching ``query``, best matches first.
+
+        Rows have the get_books_page columns plus the match rank. Pages are
+        keyed on (rank, id): pass the last row of the previous page as
+        ``after`` to seek straight to the next one, otherwise ``offset`` is used.
+        """
+        if after is not None:
+            condition = "AND (BookSearch.rank > ? OR (BookSearch.rank = ? AND BookSearch.rowid > ?))"
+            params = (query, after[6], after[6], after[0], limit, 0)
+        else:
+            condition, params = "", (query, limit, offset)
+
+        return self._fetchall(f"""
+            SELECT Book.id, Book.title, Book.author, BookCategory.name, availability,
+                BookCategory.color, BookSearch.rank
+            FROM BookSearch
+            JOIN Book ON Book.id = BookSearch.rowid
+            LEFT JOIN BookCategory ON Book.category_id = BookCategory.id
+            WHERE BookSearch MATCH ? {condition}
+            ORDER BY BookSearch.rank, BookSearch.rowid
+            LIMIT ? OFFSET ?
+        """, params)
+
+    def get_books_by_id(self, ids):
+        """Return the same columns as get_books_page for the books in ``ids``."""
+        where, params = self._id_filter("Book.id", ids)
+        return self._fetchall(f"""
+            SELECT Book.id, title, author, BookCategory.name, availability, BookCategory.color
+            FROM Book
+            LEFT JOIN BookCategory ON Book.category_id = BookCategory.id
+            {where}
+        """, params)
+
+    def _lookup(self, table, text, limit, id_label, prefix_columns, label, binary_columns=()):
+        """Find up to ``limit`` rows whose id equals ``text`` or whose columns start with it.
+
+        Each prefix search is a range scan on a COLLATE NOCASE index, or on
+        a plain one for the ``binary_columns`` that hold no letters, so the
+        cost depends on ``limit``, not on the size of the table. Returns
+        (id, label) pairs with ``label(row)`` built from the selected columns.
+        """
+        columns = ", ".join(["id"] + id_label)
+        results = {}
+        with self.pool.connection() as conn:
+            if text.isdigit():
+                for row in conn.execute(f"SELECT {columns} FROM {table} WHERE id = ?", (int(text),)):
+                    results[row[0]] = label(row)
+
+            # Every string starting with text sorts between text and text + the highest code point
+            low, high = text, text + "\U0010ffff"
+            for column in prefix_columns:
+                if len(results) >= limit:
+                    break
+                # The comparison has to use the index's collation, or SQLite scans the table
+                collate = "" if column in binary_columns else " COLLATE NOCASE"
+                rows = conn.execute(f"""
+                    SELECT {columns} FROM {table}
+                    WHERE {column} >= ?{collate} AND {column} < ?{collate}
+                    ORDER BY {column}{collate}
+                    LIMIT ?
+                """, (low, high, limit))
+                for row in rows:
+                    results.setdefault(row[0], label(row))
+        return list(results.items())[:limit]
+
+    def lookup_books(self, text, limit=20):
+        """Return up to ``limit`` (id, label) pairs for books matching an id or a title/author prefix."""
+        return self._lookup(
+            "Book", text.strip(), limit, ["title", "author"], ["title", "author"],
+            lambda row: f"{row[1]} - {row[2]} (#{row[0]})",
+        )
+
+    def add_book(self, title, author, category_id, availability):
+        return self._execute(
+            """
+            INSERT INTO Book (title, author, category_id, availability)
+            VALUES (?, ?, ?, ?)
+            """,
+            (title, author, category_id, availability),
+        )
+
+    def update_book(self, book_id, title, author, category_id, availability):
+        self._execute(
+            """
+            UPDATE Book SET title = ?, author = ?, category_id = ?, availability = ?
+            WHERE id = ?
+            """,
+            (title, author, category_id, availability, book_id),
+        )
+
+    def delete_book(self, book_id):
+        """Delete a book and its borrow history, archived loans included, returning the deleted borrow ids."""
+        with self.pool.transaction() as conn:
+            borrow_ids = []
+            for table in ("Borrow", "BorrowArchive"):
+                borrow_ids += [row[0] for row in conn.execute(
+                    f"SELECT id FROM {table} WHERE book_id = ?", (book_id,)
+                )]
+                # Before the book: the summary triggers look up each loan's category through it
+                conn.execute(f"DELETE FROM {table} WHERE book_id = ?", (book_id,))
+            conn.execute("DELETE FROM Book WHERE id = ?", (book_id,))
+        return borrow_ids
+
+    # Members
+
+    def get_members(self, ids=None):
+        """Return (id, name, email, phone, membership_date) for every member, or only those in ``ids``.
+
+        The membership date is in epoch seconds.
+        """
+        where, params = self._id_filter("id", ids)
+        return self._fetchall(
+            f"SELECT id, name, email, phone, membership_date FROM Member {where}", params
+        )
+
+    @staticmethod
+    def _member_filters(joined_since=None):
+        if joined_since is None:
+            return [], ()
+        return ["membership_date >= ?"], (joined_since,)
+
+    def count_members(self, joined_since=None):
+        """Count the members, or those who joined at or after ``joined_since``."""
+        conditions, params = self._member_filters(joined_since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._fetchone(f"SELECT COUNT(*) FROM Member {where}", params)[0]
+
+    def get_members_page(self, sort="id", descending=False, after=None, offset=0, limit=100,
+                         joined_since=None):
+        """Return one page of get_members rows in the order of MEMBER_SORTS[sort].
+
+        Pass the last row of the previous page as ``after`` to seek straight
+        to the next one; without it ``offset`` rows are skipped on the index.
+        """
+        conditions, params = self._member_filters(joined_since)
+        return self._page(
+            "id, name, email, phone, membership_date", "Member", MEMBER_SORTS[sort],
+            conditions, params, descending, after, offset, limit,
+            use_sort_index=not self._is_narrow("Member", conditions, params),
+        )
+
+    def lookup_members(self, text, limit=20):
+        """Return up to ``limit`` (id, label) pairs for members matching an id or a name/email/phone prefix."""
+        return self._lookup(
+            "Member", text.strip(), limit, ["name", "email"], ["name", "email", "phone"],
+            lambda row: f"{row[1]} <{row[2]}> (#{row[0]})", binary_columns=["phone"],
+        )
+
+    def _trigram_densities(self, conn, phrases):
+        """Estimate the share of members holding each trigram, from its first rows in id order.
+
+        The id reached after MEMBER_SEARCH_SAMPLE rows tells a common trigram
+        from a rare one at the cost of a short read, which a count would not.
+        """
+        top = conn.execute("SELECT MAX(id) FROM Member").fetchone()[0] or 1
+        densities = {}
+        for phrase in phrases:
+            found, reached = conn.execute("""
+                SELECT COUNT(*), MAX(rowid) FROM (
+                    SELECT rowid FROM MemberSearch WHERE MemberSearch MATCH ? LIMIT ?
+                )
+            """, (phrase, MEMBER_SEARCH_SAMPLE)).fetchone()
+            densities[phrase] = found / (reached if found == MEMBER_SEARCH_SAMPLE else top)
+        return densities
+
+    def _member_search_queries(self, conn, text):
+        """Turn what the user typed into the FTS5 queries of search_members, strictest first.
+
+        A typo spoils a run of consecutive trigrams: two for a dropped letter,
+        three for a wrong or extra one and MEMBER_SEARCH_TYPO_SPAN for a swap
+        of two, fewer at either end of the text. Of two trigrams ``gap``
+        apart, at least one survives a run of up to ``gap``: the query of each
+        ``gap`` from 2 wants one of every such pair, and the first query wants
+        every trigram. So a member the text names with one typo is found by
+        the query of the run the typo spoils, before the looser ones let in
+        members who merely share part of the text. Each query keeps only its
+        MEMBER_SEARCH_CLAUSES rarest terms; they narrow it down the most, and
+        every term costs a pass over the rows holding it.
+        """
+        text = " ".join(text.lower().split())
+        phrases = ['"' + text[i:i + 3].replace('"', '""') + '"' for i in range(len(text) - 2)]
+        if not phrases:
+            return []
+        density = self._trigram_densities(conn, set(phrases))
+
+        def rarest(terms, weight):
+            return sorted(set(terms), key=lambda term: (weight(term), term))[:MEMBER_SEARCH_CLAUSES]
+
+        queries = [" AND ".join(rarest(phrases, density.get))]
+        for gap in range(min(2, len(phrases) - 1), min(MEMBER_SEARCH_TYPO_SPAN, len(phrases) - 1) + 1):
+            pairs = {f"({a} OR {b})" if a != b else a: (a, b) for a, b in zip(phrases, phrases[gap:])}
+            query = " AND ".join(rarest(pairs, lambda pair: sum(map(density.get, set(pairs[pair])))))
+            if query not in queries:
+                queries.append(query)
+        return queries
+
+    @staticmethod
+    def _word_trigrams(text):
+        """Return the trigrams of the words in ``text``, padded like pg_trgm's so word starts count."""
+        return set().union(*map(_padded_trigrams, re.findall(r"\w+", text.lower())))
+
+    def search_members(self, text, limit=20, joined_since=None):
+        """Return up to ``limit`` members resembling ``text`` in name, email or phone, best first.
+
+        Rows have the get_members columns plus the share, from 0 to 1, of the
+        text's trigrams found in the member's closest field. The MemberSearch
+        trigram index (migration 13) finds candidates holding all of those
+        trigrams, then all but a typo's worth of them, a few times ``limit``
+        per query in id order, until the queries of _member_search_queries
+        have found ``limit``; only those are ranked. So a member one typo away
+        is found before members who only share part of the text, but among
+        many equally good matches, e.g. namesakes, the ones with the lowest
+        ids are found. Texts shorter than three characters find nothing.
+        """
+        conditions, params = self._member_filters(joined_since)
+        found = {}
+        with self.pool.connection() as conn:
+            for strictness, query in enumerate(self._member_search_queries(conn, text)):
+                rows = conn.execute(f"""
+                    SELECT Member.id, Member.name, Member.email, Member.phone, Member.membership_date
+                    FROM MemberSearch
+                    CROSS JOIN Member ON Member.id = MemberSearch.rowid
+                    WHERE {" AND ".join(["MemberSearch MATCH ?"] + conditions)}
+                    LIMIT ?
+                """, (query, *params, limit * MEMBER_SEARCH_CANDIDATES))
+                for row in rows:
+                    found.setdefault(row[0], (strictness, row))
+                if len(found) >= limit:
+                    break
+
+        wanted = self._word_trigrams(text)
+
+        def score(row):
+            # Best share of the text found in one field; of equal shares, the closer field in length
+            best = (0.0, 0.0)
+            for value in row[1:4]:
+                trigrams = self._word_trigrams(value or "")
+                common = len(wanted & trigrams)
+                if common:
+                    best = max(best, (common / len(wanted), common / (len(wanted) + len(trigrams) - common)))
+            return best
+
+        ranked = sorted(
+            (tuple(-part for part in score(row)), strictness, row[0], row) for strictness, row in found.values()
+        )
+        return [row + (round(-share, 3),) for (share, _), _, _, row in ranked[:limit]]
+
+    def add_member(self, name, email, phone, membership_date):
+        return self._execute(
+            """
+            INSERT INTO Member (name, email, phone, membership_date)
+            VALUES (?, ?, ?, ?)
+            """,
+            (name, email, phone, membership_date),
+        )
+
+    def update_member(self, member_id, name, email, phone):
+        self._execute(
+            "UPDATE Member SET name = ?, email = ?, phone = ? WHERE id = ?",
+            (name, email, phone, member_id),
+        )
+
+    def delete_member(self, member_id):
+        """Delete a member and their borrow history, archived loans included, returning the deleted borrow ids."""
+        with self.pool.transaction() as conn:
+            borrow_ids = []
+            for table in ("Borrow", "BorrowArchive"):
+                borrow_ids += [row[0] for row in conn.execute(
+                    f"SELECT id FROM {table} WHERE member_id = ?", (member_id,)
+                )]
+                conn.execute(f"DELETE FROM {table} WHERE member_id = ?", (member_id,))
+            conn.execute("DELETE FROM Member WHERE id = ?", (member_id,))
+        return borrow_ids
+
+    # Borrowing
+
+    @staticmethod
+    def _borrow_filters(archived=False, borrowed_since=None, overdue_at=None, open_only=False, member_id=None):
+        """Build the conditions and parameters of the borrow list filters.
+
+        ``borrowed_since`` keeps loans borrowed at or after that time,
+        ``overdue_at`` open loans that were due before it, ``open_only`` the
+        loans not returned yet and ``member_id`` one member's loans. Each is
+        a range or equality on an index of migrations 9 and 12.
+        """
+        conditions, params = [], ()
+        if borrowed_since is not None:
+            conditions.append("b.borrow_date >= ?")
+            params += (borrowed_since,)
+        if overdue_at is not None:
+            conditions.append("b.return_date IS NULL AND b.due_date < ?")
+            params += (overdue_at,)
+        if open_only:
+            conditions.append("b.return_date IS NULL")
+        if member_id is not None:
+            conditions.append("b.member_id = ?")
+            params += (member_id,)
+        if archived and (open_only or overdue_at is not None):
+            conditions.append("0")  # archived loans were all returned; do not scan for open ones
+        return conditions, params
+
+    def get_borrow_records(self, ids=None, archived=False):
+        """Return borrow records with member names and book titles, newest first.
+
+        Rows are (id, member name, book title, borrow_date, due_date,
+        return_date, member_id, book_id) with the dates as epoch seconds;
+        views.date_format renders them. When ``ids`` is given only those
+        records are returned. ``archived`` reads BorrowArchive instead.
+        """
+        where, params = self._id_filter("b.id", ids)
+        table = "BorrowArchive" if archived else "Borrow"
+        return self._fetchall(f"""
+            SELECT b.id, m.name, bk.title, b.borrow_date, b.due_date, b.return_date, b.member_id, b.book_id
+            FROM {table} b
+            JOIN Member m ON b.member_id = m.id
+            JOIN Book bk ON b.book_id = bk.id
+            {where}
+            ORDER BY b.id DESC
+        """, params)
+
+    def count_borrow_records(self, archived=False, **filters):
+        """Count the records get_borrow_records_page pages through with the same filters."""
+        conditions, params = self._borrow_filters(archived, **filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        table = "BorrowArchive" if archived else "Borrow"
+        return self._fetchone(f"SELECT COUNT(*) FROM {table} b {where}", params)[0]
+
+    def get_borrow_records_page(self, sort="id", descending=True, after=None, offset=0, limit=100,
+                                archived=False, **filters):
+        """Return one page of get_borrow_records rows in the order of BORROW_SORTS[sort].
+
+        ``filters`` are those of _borrow_filters, and ``archived`` pages
+        through BorrowArchive instead. Pass the last row of the previous
+        page as ``after`` to seek straight to the next one. Sorting by
+        member or title walks that table's name index and joins the loans
+        in through their foreign key index, so no sort runs over all loans;
+        only the few loans of a narrow filter are sorted.
+        """
+        conditions, params = self._borrow_filters(archived, **filters)
+        table = "BorrowArchive" if archived else "Borrow"
+        narrow = self._is_narrow(f"{table} b", conditions, params)
+        # A narrow filter's loans are joined to their member and book, then sorted
+        source = DEFAULT_BORROW_JOIN if narrow else BORROW_JOINS.get(sort, DEFAULT_BORROW_JOIN)
+        return self._page(
+            "b.id, m.name, bk.title, b.borrow_date, b.due_date, b.return_date, b.member_id, b.book_id",
+            source.format(table=table), BORROW_SORTS[sort], conditions, params, descending, after, offset,
+            limit, use_sort_index=not narrow,
+        )
+
+    # Lending and returning books live in database.circulation
+
+    def delete_borrow(self, borrow_id):
+        """Delete a borrow record, whether it is still in Borrow or already archived."""
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM Borrow WHERE id = ?", (borrow_id,))
+            conn.execute("DELETE FROM BorrowArchive WHERE id = ?", (borrow_id,))
+
+
+_repository = None
+
+
+def configure(path=DB_PATH, pool_size=4, profile=DEFAULT_PROFILE):
+    """Replace the shared repository, e.g. to point the app at another database
+    file or storage profile (see database.storage.STORAGE_PROFILES)."""
+    return use(LibraryRepository(ConnectionPool(path, size=pool_size, profile=profile)))
+
+
+def use(repository):
+    """Make ``repository`` the shared one, closing the previous one; e.g. a database.client.RemoteRepository."""
+    global _repository
+    if _repository is not None:
+        _repository.close()
+    _repository = repository
+    return _repository
+
+
+def get_repository():
+    """Return the process-wide repository, creating it on first use."""
+    if _repository is None:
+        configure()
+    return _repository
+
+
+def remotable(function=None, decode=None):
+    """Run a module-level operation taking a ``repository`` argument on the server in client mode.
+
+    With a local repository ``function`` runs as written. With a remote one
+    the call, minus the repository, is sent to the database.server process
+    under the function's name, and ``decode`` turns the JSON result back
+    into what the function would have returned.
+    """
+    if function is None:
+        return lambda function: remotable(function, decode)
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        repository = bound.arguments.get("repository") or get_repository()
+        if not repository.remote:
+            return function(*args, **kwargs)
+        bound.arguments.pop("repository", None)
+        result = repository.call(function.__name__, *bound.args, **bound.kwargs)
+        return decode(result) if decode is not None else result
+    return wrapper
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from database.archive import ARCHIVE_AFTER_DAYS, Archiver
+from database.circulation import checkout_books, return_books, return_loan
+from database.init_db import create_tables
+from database.instrumentation import get_stats, handler_context
+from database.reference_data import POLL_INTERVAL, ChangeTracker
+from database.reports import (
+    busiest_members, category_utilisation, get_report_state, monthly_loan_volume, most_borrowed_books,
+    refresh_summaries,
+)
+from database.repository import DB_PATH, configure
+from database.storage import DEFAULT_PROFILE, STORAGE_PROFILES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+# What an operation reads or writes, for invalidating cached results
+BOOKS, MEMBERS, LOANS, CATEGORIES, SUMMARIES = "books", "members", "loans", "categories", "summaries"
+
+
+def _method(name):
+    return lambda repository, *args, **kwargs: getattr(repository, name)(*args, **kwargs)
+
+
+def _function(function):
+    return lambda repository, *args, **kwargs: function(*args, repository=repository, **kwargs)
+
+
+# The operations the views use: name -> (call(repository, *args, **kwargs), reads, writes).
+# Operations that write run one at a time and drop the cached results of
+# every operation that reads what they wrote.
+OPERATIONS = {
+    "get_categories": (_method("get_categories"), {CATEGORIES}, set()),
+    "get_categories_with_counts": (_method("get_categories_with_counts"), {CATEGORIES, BOOKS}, set()),
+    "add_category": (_method("add_category"), set(), {CATEGORIES}),
+    "update_category": (_method("update_category"), set(), {CATEGORIES}),
+    "delete_category": (_method("delete_category"), set(), {CATEGORIES, BOOKS, LOANS, SUMMARIES}),
+    "count_books": (_method("count_books"), {BOOKS}, set()),
+    "get_books_page": (_method("get_books_page"), {BOOKS, CATEGORIES}, set()),
+    "count_book_search": (_method("count_book_search"), {BOOKS}, set()),
+    "search_books_page": (_method("search_books_page"), {BOOKS, CATEGORIES}, set()),
+    "get_books_by_id": (_method("get_books_by_id"), {BOOKS, CATEGORIES}, set()),
+    "lookup_books": (_method("lookup_books"), {BOOKS}, set()),
+    "add_book": (_method("add_book"), set(), {BOOKS}),
+    "update_book": (_method("update_book"), set(), {BOOKS}),
+    "delete_book": (_method("delete_book"), set(), {BOOKS, LOANS, SUMMARIES}),
+    "get_members": (_method("get_members"), {MEMBERS}, set()),
+    "count_members": (_method("count_members"), {MEMBERS}, set()),
+    "get_members_page": (_method("get_members_page"), {MEMBERS}, set()),
+    "search_members": (_method("search_members"), {MEMBERS}, set()),
+    "lookup_members": (_method("lookup_members"), {MEMBERS}, set()),
+    "add_member": (_method("add_member"), set(), {MEMBERS}),
+    "update_member": (_method("update_member"), set(), {MEMBERS}),
+    "delete_member": (_method("delete_member"), set(), {MEMBERS, LOANS, SUMMARIES}),
+    "get_borrow_records": (_method("get_borrow_records"), {LOANS, MEMBERS, BOOKS}, set()),
+    "count_borrow_records": (_method("count_borrow_records"), {LOANS}, set()),
+    "get_borrow_records_page": (_method("get_borrow_records_page"), {LOANS, MEMBERS, BOOKS}, set()),
+    "delete_borrow": (_method("delete_borrow"), set(), {LOANS, SUMMARIES}),
+    "checkout_books": (_function(checkout_books), set(), {LOANS, BOOKS}),
+    "return_loan": (_function(return_loan), set(), {LOANS, BOOKS}),
+    "return_books": (_function(return_books), set(), {LOANS, BOOKS}),
+    "refresh_summaries": (_function(refresh_summaries), set(), {SUMMARIES}),
+    "get_report_state": (_function(get_report_state), {SUMMARIES}, set()),
+    "most_borrowed_books": (_function(most_borrowed_books), {SUMMARIES, BOOKS}, set()),
+    "busiest_members": (_function(busiest_members), {SUMMARIES, MEMBERS}, set()),
+    "category_utilisation": (_function(category_utilisation), {SUMMARIES, CATEGORIES, BOOKS}, set()),
+    "monthly_loan_volume": (_function(monthly_loan_volume), {SUMMARIES}, set()),
+}
+
+# What a commit by another process to each table makes stale, see watch()
+TABLE_DATA = {
+    "Book": {BOOKS},
+    "Member": {MEMBERS},
+    "BookCategory": {CATEGORIES},
+    "Borrow": {LOANS, SUMMARIES},
+}
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+class LibraryServer:
+    """Owns the database and serves the repository operations as JSON over HTTP.
+
+    Each request is ``POST /call/<operation>`` with ``{"args": [...],
+    "kwargs": {...}}`` and gets ``{"result": ...}`` back, or ``{"error": ...,
+    "type": ...}``. Reads run on a small thread pool and their encoded
+    results are cached until a write touches what they read. Writes run on
+    a single thread in arrival order, so desks never wait on each other's
+    locks. ``GET /health`` reports the cache and ``GET /stats`` the statement
+    timings of database.instrumentation.
+    """
+
+    def __init__(self, repository, cache_size=256, readers=4):
+        self.repository = repository
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # request key -> (encoded result, what it read)
+        self.versions = Counter()  # writes so far to each kind of data
+        self.hits = 0
+        self.misses = 0
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="server-read")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="server-write")
+
+    def invalidate(self, written):
+        """Forget the cached results that read any of ``written``."""
+        for kind in written:
+            self.versions[kind] += 1
+        for key in [key for key, (_, reads) in self.cache.items() if reads & written]:
+            del self.cache[key]
+
+    def run(self, name, args, kwargs):
+        call = OPERATIONS[name][0]
+        with handler_context(f"server.{name}"):
+            return json.dumps(call(self.repository, *args, **kwargs)).encode()
+
+    async def call(self, name, args, kwargs):
+        """Run one operation and return its result encoded as JSON."""
+        _, reads, writes = OPERATIONS[name]
+        loop = asyncio.get_running_loop()
+        if writes:
+            try:
+                return await loop.run_in_executor(self.writer, self.run, name, args, kwargs)
+            finally:
+                self.invalidate(writes)
+
+        key = json.dumps([name, args, kwargs], sort_keys=True)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key][0]
+        self.misses += 1
+
+        # A write that lands while the read runs may or may not be in its result
+        before = [self.versions[kind] for kind in reads]
+        result = await loop.run_in_executor(self.readers, self.run, name, args, kwargs)
+        if before == [self.versions[kind] for kind in reads]:
+            self.cache[key] = (result, reads)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    async def dispatch(self, method, path, body):
+        """Return (status, JSON body) for one request."""
+        if method == "GET" and path == "/health":
+            return 200, json.dumps({
+                "ok": True, "cached": len(self.cache), "hits": self.hits, "misses": self.misses,
+            }).encode()
+        if method == "GET" and path == "/stats":
+            statements, slow_queries = get_stats().snapshot()
+            return 200, json.dumps({"statements": statements, "slow_queries": slow_queries}).encode()
+
+        name = path[len("/call/"):] if method == "POST" and path.startswith("/call/") else None
+        if name not in OPERATIONS:
+            return 404, json.dumps({"error": f"No such operation: {method} {path}", "type": "LookupError"}).encode()
+        try:
+            request = json.loads(body or b"{}")
+            result = await self.call(name, request.get("args", []), request.get("kwargs", {}))
+        except (ValueError, TypeError) as e:
+            return 400, json.dumps({"error": str(e), "type": type(e).__name__}).encode()
+        except sqlite3.Error as e:
+            # e.g. a constraint; the desk shows it like a local database error
+            return 500, json.dumps({"error": str(e), "type": type(e).__name__}).encode()
+        except Exception as e:
+            logger.exception("%s failed", name)
+            return 500, json.dumps({"error": str(e), "type": type(e).__name__}).encode()
+        return 200, b'{"result": ' + result + b"}"
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, path, body)
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # the desk went away or sent something that is not HTTP
+        finally:
+            writer.close()
+
+    async def watch(self, interval=POLL_INTERVAL):
+        """Drop the cached results that another process, e.g. an import run by hand, made stale."""
+        tracker = ChangeTracker(self.repository.pool)
+        try:
+            while True:
+                try:
+                    changed = tracker.poll()
+                except sqlite3.Error as e:
+                    logger.warning("Could not check for changes by other processes: %s", e)
+                    changed = set()
+                written = set().union(*(TABLE_DATA.get(table, set()) for table in changed))
+                if written:
+                    self.invalidate(written)
+                await asyncio.sleep(interval)
+        finally:
+            tracker.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        listener = await asyncio.start_server(self.handle, host, port)
+        port = listener.sockets[0].getsockname()[1]  # the one picked for port 0
+        logger.warning("Serving the library database on %s:%s", host, port)
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            watcher.cancel()
+
+    def close(self):
+        self.readers.shutdown()
+        self.writer.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the library database to the desks; run the app with --server http://HOST:PORT"
+    )
+    parser.add_argument("--database", default=DB_PATH)
+    parser.add_argument(
+        "--host", default="127.0.0.1",
+        help="address to listen on; there is no authentication, so only open it to a trusted network",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port and logs it")
+    parser.add_argument("--storage-profile", choices=sorted(STORAGE_PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--cache-size", type=int, default=256, help="cached read results")
+    parser.add_argument("--readers", type=int, default=4, help="threads running reads")
+    parser.add_argument(
+        "--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS,
+        help="move loans returned longer ago than this to the archive in the background; 0 disables",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    create_tables(args.database)
+    repository = configure(args.database, pool_size=args.readers + 1, profile=args.storage_profile)
+    server = LibraryServer(repository, args.cache_size, args.readers)
+
+    loop = asyncio.new_event_loop()
+    archiver = None
+    if args.archive_after_days:
+        # Archived loans are no longer where the cached borrow lists found them
+        archiver = Archiver(
+            args.archive_after_days,
+            on_batch=lambda ids: loop.call_soon_threadsafe(server.invalidate, {LOANS}),
+        )
+        archiver.start()
+    try:
+        loop.run_until_complete(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if archiver is not None:
+            archiver.stop()
+            archiver.join(timeout=5)
+        server.close()
+        repository.close()
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+
+# Storage profiles applied to every pooled connection.
+#
+# "default" keeps SQLite's stock rollback journal and is meant for a single desk.
+# "shared" is for several desks (processes) on the same machine working against
+# one library.db: WAL lets readers carry on while a writer commits, and
+# synchronous=NORMAL is durable enough in WAL mode while avoiding an fsync per
+# commit. WAL needs shared memory, so it does not work across a network share.
+# None leaves a setting at SQLite's default.
+STORAGE_PROFILES = {
+    "default": {
+        "journal_mode": None,
+        "synchronous": None,
+        "busy_timeout": 5000,  # ms sqlite itself waits on a lock
+        "cache_size": None,
+        "mmap_size": None,
+        "retries": 3,  # extra attempts after busy_timeout gave up
+        "retry_backoff": 0.05,  # seconds, doubled on every attempt
+        "checkpoint_interval": None,  # seconds between WAL checkpoints
+    },
+    "shared": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,  # negative means KiB, i.e. 64 MiB
+        "mmap_size": 268435456,  # 256 MiB
+        "retries": 5,
+        "retry_backoff": 0.05,
+        "checkpoint_interval": 60,
+    },
+}
+
+DEFAULT_PROFILE = "default"
+
+
+def get_profile(name):
+    """Look up a storage profile by name."""
+    try:
+        return STORAGE_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown storage profile {name!r}, expected one of: {', '.join(STORAGE_PROFILES)}"
+        )
+
+
+def apply_profile(conn, profile):
+    """Apply a storage profile's PRAGMAs to a freshly opened connection."""
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+    if profile["journal_mode"]:
+        conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    if profile["synchronous"]:
+        conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    if profile["cache_size"] is not None:
+        conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+    if profile["mmap_size"] is not None:
+        conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+
+
+def is_busy_error(error):
+    """Return True for the errors sqlite raises when another connection holds the lock."""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message
+    )
+
+
+def retry_busy(operation, profile):
+    """Call ``operation()``, retrying with exponential backoff while the database is busy."""
+    delay = profile["retry_backoff"]
+    for attempt in range(profile["retries"] + 1):
+        try:
+            return operation()
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == profile["retries"]:
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+
+class Checkpointer(threading.Thread):
+    """Background thread that periodically folds the WAL back into the database file."""
+
+    def __init__(self, pool, interval):
+        super(Checkpointer, self).__init__(name="wal-checkpoint", daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                with self.pool.connection() as conn:
+                    # PASSIVE never waits for readers or writers
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            except sqlite3.Error:
+                pass  # try again on the next tick
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,37 @@
+import time
+from datetime import datetime, timedelta
+
+# Dates are stored as whole seconds since the epoch (migration 9), so they
+# sort and range-filter on plain integer indexes. These helpers give the
+# boundaries the views filter on, in local time.
+
+# A loan is due this long after it was borrowed
+LOAN_DAYS = 14
+
+
+def now():
+    """The current time as stored in the database."""
+    return int(time.time())
+
+
+def due_date(borrow_date):
+    """When a loan borrowed at ``borrow_date`` is due back."""
+    return int((datetime.fromtimestamp(borrow_date) + timedelta(days=LOAN_DAYS)).timestamp())
+
+
+def start_of_day(when=None):
+    """Local midnight of the day of ``when`` (default: today)."""
+    day = datetime.fromtimestamp(now() if when is None else when)
+    return int(day.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+
+def start_of_week(when=None):
+    """Local midnight of the Monday of the week of ``when`` (default: this week)."""
+    day = datetime.fromtimestamp(start_of_day(when))
+    return int((day - timedelta(days=day.weekday())).timestamp())
+
+
+def start_of_month(when=None):
+    """Local midnight of the first day of the month of ``when`` (default: this month)."""
+    day = datetime.fromtimestamp(start_of_day(when))
+    return int(day.replace(day=1).timestamp())
@@ -0,0 +1,14 @@
+import pytest
+
+from database.init_db import create_tables
+from database.repository import configure
+
+
+@pytest.fixture
+def repository(tmp_path):
+    """A repository on a fresh, fully migrated database of its own."""
+    path = str(tmp_path / "library.db")
+    create_tables(path)
+    repository = configure(path)
+    yield repository
+    repository.close()
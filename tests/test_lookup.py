@@ -0,0 +1,31 @@
+from database.instrumentation import get_stats
+
+
+def lookup_plans(repository, monkeypatch, text):
+    """Run lookup_members and return {sql: plan} for its statements, explained as slow queries."""
+    stats = get_stats()
+    stats.reset()
+    monkeypatch.setattr(stats, "slow_ms", 0)
+    repository.lookup_members(text)
+    return {entry["sql"]: entry["plan"] for entry in stats.slow}
+
+
+def test_every_prefix_lookup_walks_an_index(repository, monkeypatch):
+    for i in range(50):
+        repository.add_member(f"Member {i}", f"member{i}@example.com", f"555-{i:07d}", 1600000000)
+
+    plans = lookup_plans(repository, monkeypatch, "555")
+    prefix_plans = {sql: plan for sql, plan in plans.items() if ">= ?" in sql}
+    assert len(prefix_plans) == 3  # name, email and phone: nothing matched before the phone
+
+    for sql, plan in prefix_plans.items():
+        text = "\n".join(plan)
+        assert "USING INDEX" in text and "SCAN Member" not in text, (sql, text)
+        assert "TEMP B-TREE" not in text, (sql, text)
+
+
+def test_phone_prefix_finds_members(repository):
+    repository.add_member("Ann Lee", "ann@example.com", "555-0100", 1600000000)
+    repository.add_member("Bob Ray", "bob@example.com", "556-0100", 1600000000)
+
+    assert [label for _, label in repository.lookup_members("555-01")] == ["Ann Lee <ann@example.com> (#1)"]
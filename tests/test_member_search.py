@@ -0,0 +1,32 @@
+from database.repository import MEMBER_SEARCH_CANDIDATES
+
+SURNAMES = ["Khan", "Wang", "Benali", "Dubois", "Jones", "Tanaka", "Garcia", "Brown", "Rossi", "Sato"]
+
+
+def add_members(repository, names):
+    for i, name in enumerate(names):
+        first, last = name.lower().split()
+        repository.add_member(name, f"{first}.{last}{i}@example.com", f"555-{i:07d}", 1600000000)
+
+
+def test_one_letter_typo_finds_the_member_first(repository):
+    # Far more namesakes-but-one than candidates fetched, all with lower ids
+    others = [f"Alice {SURNAMES[i % len(SURNAMES)]}" for i in range(20 * 5 * MEMBER_SEARCH_CANDIDATES)]
+    add_members(repository, others + ["Alice Smith"] * 8)
+
+    for text in ["Alice Smth", "Alice Smiht", "Alice Smoth", "Alcie Smith", "alice smithh"]:
+        results = repository.search_members(text, limit=5)
+        assert [row[1] for row in results] == ["Alice Smith"] * 5, text
+
+
+def test_exact_text_ranks_first(repository):
+    add_members(repository, ["Alice Smith", "Alice Smithson", "Alicia Smith"])
+
+    results = repository.search_members("Alice Smith", limit=3)
+    assert results[0][1:2] == ("Alice Smith",)
+    assert results[0][5] == 1.0
+
+
+def test_short_text_finds_nothing(repository):
+    add_members(repository, ["Al Smith"])
+    assert repository.search_members("Al") == []
@@ -0,0 +1,39 @@
+import sqlite3
+
+from database.archive import archive_closed_loans
+from database.circulation import checkout_books, return_books
+from database.migrations import MIGRATIONS, migrate
+from database.reports import refresh_summaries
+from database.timestamps import now
+
+DAY = 86400
+TABLES = ["Book", "BookCategory", "Member", "Borrow", "BorrowArchive", "CategoryLoanSummary"]
+
+
+def snapshot(conn):
+    schema = set(conn.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+    rows = {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall() for table in TABLES}
+    return schema, rows
+
+
+def test_migrations_run_again_over_their_own_objects(repository):
+    category = repository.add_category("Fiction", "#FFFFFF")
+    book = repository.add_book("Novel", "Author", category, "Available")
+    member = repository.add_member("Reader", "reader@example.com", "555", now())
+    for days_ago in (900, 10):
+        assert checkout_books([book], member, now() - days_ago * DAY, repository)[0].ok
+        assert return_books([book], now() - (days_ago - 1) * DAY, repository)[0].ok
+    assert checkout_books([book], member, now(), repository)[0].ok
+    assert archive_closed_loans(older_than_days=365, pause=0, repository=repository) == 1
+    assert refresh_summaries(repository=repository) == 3
+    repository.close()
+
+    # Every column, table, index and trigger the migrations create is there already
+    conn = sqlite3.connect(repository.pool.path)
+    before = snapshot(conn)
+    assert before[1]["BorrowArchive"] and before[1]["CategoryLoanSummary"]
+    conn.execute("PRAGMA user_version = 0")
+    applied = migrate(conn, log=None)
+    assert [entry[0] for entry in applied] == [entry[0] for entry in MIGRATIONS]
+    assert snapshot(conn) == before
+    conn.close()
@@ -0,0 +1,37 @@
+import sqlite3
+import threading
+
+import database.repository
+from database.reference_data import ChangeTracker
+
+
+def test_poll_during_a_local_commit_does_not_hide_the_next_change(repository, monkeypatch):
+    tracker = ChangeTracker(repository.pool)
+    tracker.poll()  # the counters to compare against
+
+    # Poll from another thread right after the local commit, before the pool
+    # could count its moves, as the change watcher may
+    pollers, changed = [], []
+    retry_busy = database.repository.retry_busy
+
+    def commit_then_poll(operation, profile):
+        result = retry_busy(operation, profile)
+        if getattr(operation, "__name__", None) == "commit" and not pollers:
+            pollers.append(threading.Thread(target=lambda: changed.append(tracker.poll())))
+            pollers[0].start()
+            pollers[0].join(0.5)
+        return result
+
+    monkeypatch.setattr(database.repository, "retry_busy", commit_then_poll)
+    repository.add_category("Local", "#ffffff")
+    monkeypatch.undo()
+    pollers[0].join()
+    assert changed == [set()]  # the poll saw the local commit and its moves together
+
+    # Another desk then adds a category: its change must not pass for the local one
+    other = sqlite3.connect(repository.pool.path)
+    with other:
+        other.execute("INSERT INTO BookCategory (name, color) VALUES ('Remote', '#000000')")
+    other.close()
+    assert "BookCategory" in tracker.poll()
+    tracker.close()
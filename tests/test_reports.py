@@ -0,0 +1,72 @@
+import pytest
+
+from database.archive import archive_closed_loans
+from database.circulation import checkout_books, return_books
+from database.reports import refresh_summaries
+from database.timestamps import now
+
+DAY = 86400
+
+
+def lend(repository, book_id, member_id, days_ago, times):
+    """Lend a book ``times`` times, each loan returned a day later, starting ``days_ago`` days ago."""
+    start = now() - days_ago * DAY
+    for i in range(times):
+        assert checkout_books([book_id], member_id, start + 2 * i * DAY, repository)[0].ok
+        assert return_books([book_id], start + (2 * i + 1) * DAY, repository)[0].ok
+
+
+def summary_totals(repository):
+    with repository.pool.connection() as conn:
+        categories = dict(conn.execute("SELECT category_id, loans FROM CategoryLoanSummary WHERE loans != 0"))
+        sums = [conn.execute(f"SELECT COALESCE(SUM(loans), 0) FROM {table}").fetchone()[0] for table in (
+            "BookLoanSummary", "MemberLoanSummary", "CategoryLoanSummary", "MonthlyLoanSummary",
+        )]
+    return categories, sums
+
+
+@pytest.fixture
+def library(repository):
+    fiction = repository.add_category("Fiction", "#FFFFFF")
+    science = repository.add_category("Science", "#FFFFFF")
+    novel = repository.add_book("Novel", "Author", fiction, "Available")
+    poems = repository.add_book("Poems", "Author", fiction, "Available")
+    physics = repository.add_book("Physics", "Author", science, "Available")
+    reader = repository.add_member("Reader", "reader@example.com", "555", now())
+    other = repository.add_member("Other", "other@example.com", "556", now())
+
+    lend(repository, novel, reader, 800, 17)  # returned long ago, so archived
+    lend(repository, novel, other, 10, 2)
+    lend(repository, poems, other, 700, 3)
+    lend(repository, physics, reader, 10, 4)
+    assert archive_closed_loans(older_than_days=365, pause=0, repository=repository) == 20
+    assert refresh_summaries(repository=repository) == 26
+    return repository, fiction, science, novel, poems, physics, reader
+
+
+def test_deleting_a_book_takes_its_archived_loans_out_of_every_total(library):
+    repository, fiction, science, novel, poems, physics, reader = library
+
+    repository.delete_book(novel)
+
+    assert summary_totals(repository) == ({fiction: 3, science: 4}, [7, 7, 7, 7])
+
+
+def test_deleting_a_member_or_a_category_keeps_the_totals_in_step(library):
+    repository, fiction, science, novel, poems, physics, reader = library
+
+    repository.delete_member(reader)
+    assert summary_totals(repository) == ({fiction: 5}, [5, 5, 5, 5])
+
+    repository.delete_category(fiction)
+    assert summary_totals(repository) == ({}, [0, 0, 0, 0])
+
+
+def test_category_totals_follow_a_book_to_its_new_category(library):
+    repository, fiction, science, novel, poems, physics, reader = library
+
+    repository.update_book(poems, "Poems", "Author", science, "Available")
+    assert summary_totals(repository)[0] == {fiction: 19, science: 7}
+
+    repository.delete_book(poems)
+    assert summary_totals(repository) == ({fiction: 19, science: 4}, [23, 23, 23, 23])
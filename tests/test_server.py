@@ -0,0 +1,83 @@
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from database.circulation import ALREADY_ON_LOAN, CHECKED_OUT, NOT_ON_LOAN, RETURNED, checkout_books, return_books
+from database.client import RemoteRepository
+from database.timestamps import now
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """A RemoteRepository talking to a database.server process on a free localhost port."""
+    log_path = tmp_path / "server.log"
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "database.server", "--database", str(tmp_path / "library.db"),
+             "--port", "0", "--archive-after-days", "0"],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=log,
+        )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            found = re.search(r"Serving the library database on 127\.0\.0\.1:(\d+)", log_path.read_text())
+            if found:
+                break
+            assert process.poll() is None, log_path.read_text()
+            assert time.monotonic() < deadline, "the server did not start"
+            time.sleep(0.05)
+        repository = RemoteRepository(f"http://127.0.0.1:{found.group(1)}")
+        yield repository
+        repository.close()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+@pytest.fixture
+def book_and_member(remote):
+    category = remote.add_category("Fiction", "#FFFFFF")
+    book = remote.add_book("Novel", "Author", category, "Available")
+    member = remote.add_member("Reader", "reader@example.com", "555", now())
+    return book, member
+
+
+def test_checkout_and_return_round_trip(remote, book_and_member):
+    book, member = book_and_member
+
+    assert [result.status for result in checkout_books([book], member, now(), remote)] == [CHECKED_OUT]
+    assert [result.status for result in checkout_books([book], member, now(), remote)] == [ALREADY_ON_LOAN]
+    [loan] = remote.get_borrow_records_page(open_only=True)
+    borrow_id, member_name, book_title, _, _, return_date = loan[:6]
+    assert (member_name, book_title, return_date) == ("Reader", "Novel", None)
+
+    returned = return_books([book], now(), remote)
+    assert [(result.status, result.borrow_id) for result in returned] == [(RETURNED, borrow_id)]
+    assert [result.status for result in return_books([book], now(), remote)] == [NOT_ON_LOAN]
+    assert remote.get_borrow_records_page(open_only=True) == []
+
+
+def test_database_errors_come_back_as_the_same_type(remote, book_and_member):
+    book, member = book_and_member
+
+    with pytest.raises(sqlite3.IntegrityError):
+        remote.add_book("Orphan", "Author", 12345, "Available")  # no such category
+    assert remote.count_books() == 1
+
+
+def test_writes_drop_the_cached_reads_they_change(remote, book_and_member):
+    assert remote.count_members() == 1
+    hits = remote.health()["hits"]
+    assert remote.count_members() == 1
+    assert remote.health()["hits"] == hits + 1
+
+    remote.add_member("Another", "another@example.com", "556", now())
+    assert remote.count_members() == 2
+    assert remote.health()["hits"] == hits + 1
@@ -0,0 +1,85 @@
+import threading
+import wx
+from concurrent.futures import ThreadPoolExecutor
+from wx.lib.pubsub import pub
+from database.instrumentation import calling_handler, handler_context
+
+
+class QueryExecutor:
+    """Runs database reads on worker threads and hands the results back to the GUI thread.
+
+    Requests are keyed by (owner, name). Only the most recent request for a
+    key is delivered: results of older ones that finish later are dropped as
+    stale, and nothing is delivered to an owner window that has been destroyed.
+    The number of requests in flight is published on the "query_status" topic.
+    """
+
+    def __init__(self, workers=2):
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._latest = {}  # (id(owner), name) -> generation of the newest request
+        self._pending = {}  # (id(owner), name) -> generations still running
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def submit(self, owner, name, query, on_result, on_error=None):
+        """Run ``query()`` in the background and call ``on_result(result)`` on the GUI thread."""
+        key = (id(owner), name)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._latest[key] = generation
+            self._pending.setdefault(key, set()).add(generation)
+        self._publish_status()
+        handler = calling_handler()  # statements in query() are attributed to the submitting handler
+
+        def run():
+            try:
+                with handler_context(handler):
+                    result = query()
+                callback = on_result
+            except Exception as e:
+                result, callback = e, on_error or self._show_error
+            wx.CallAfter(self._deliver, owner, key, generation, callback, result)
+
+        self._workers.submit(run)
+
+    def is_pending(self, owner, name):
+        """Return True while a request for (owner, name) has not been delivered yet."""
+        with self._lock:
+            return bool(self._pending.get((id(owner), name)))
+
+    def _deliver(self, owner, key, generation, callback, result):
+        with self._lock:
+            running = self._pending.get(key, set())
+            running.discard(generation)
+            if not running:
+                self._pending.pop(key, None)
+            current = self._latest.get(key) == generation
+        self._publish_status()
+
+        # Destroyed wx windows evaluate as False
+        if current and owner:
+            callback(result)
+
+    def _publish_status(self):
+        with self._lock:
+            pending = sum(len(running) for running in self._pending.values())
+        pub.sendMessage("query_status", pending=pending)
+
+    @staticmethod
+    def _show_error(error):
+        wx.MessageBox(f"Error loading data: {error}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def shutdown(self):
+        self._workers.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+
+
+def get_executor():
+    """Return the process-wide query executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = QueryExecutor()
+    return _executor
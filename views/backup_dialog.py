@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+import wx
+from database.backup import BackupCancelled, backup_database, backup_dir, list_backups, restore_backup
+from database.repository import get_repository
+from views.change_watcher import TABLE_TOPICS
+from views.changes import notify_reload
+
+
+class BackupDialog(wx.Dialog):
+    """Back up the database while the desks keep working, or restore one of the backups."""
+
+    def __init__(self, parent):
+        super(BackupDialog, self).__init__(parent, title="Backups")
+        self.path = get_repository().pool.path
+        self.directory = backup_dir(self.path)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        self.backup_list = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        self.backup_list.InsertColumn(0, "Backup", width=300)
+        self.backup_list.InsertColumn(1, "Size", width=100, format=wx.LIST_FORMAT_RIGHT)
+        self.backup_list.Bind(wx.EVT_LIST_ITEM_SELECTED, lambda event: self.update_buttons())
+        self.backup_list.Bind(wx.EVT_LIST_ITEM_DESELECTED, lambda event: self.update_buttons())
+
+        folder_label = wx.StaticText(self, label=f"Kept in {self.directory}")
+        self.compress_checkbox = wx.CheckBox(self, label="Compress (smaller, takes longer)")
+
+        self.gauge = wx.Gauge(self, range=100)
+        self.status_label = wx.StaticText(self, label="")
+
+        self.backup_button = wx.Button(self, label="Back Up Now")
+        self.backup_button.Bind(wx.EVT_BUTTON, self.on_backup)
+        self.restore_button = wx.Button(self, label="Restore Selected...")
+        self.restore_button.Bind(wx.EVT_BUTTON, self.on_restore)
+        self.cancel_button = wx.Button(self, wx.ID_CANCEL, label="Close")
+        self.cancel_button.Bind(wx.EVT_BUTTON, self.on_cancel)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(self.backup_button, 0, wx.ALL, 5)
+        button_sizer.Add(self.restore_button, 0, wx.ALL, 5)
+        button_sizer.Add(self.cancel_button, 0, wx.ALL, 5)
+
+        sizer.Add(self.backup_list, 1, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(folder_label, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 15)
+        sizer.Add(self.compress_checkbox, 0, wx.ALL, 15)
+        sizer.Add(self.gauge, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 15)
+        sizer.Add(self.status_label, 0, wx.EXPAND | wx.ALL, 15)
+        sizer.Add(button_sizer, 0, wx.CENTER | wx.ALL, 5)
+
+        self.SetSizer(sizer)
+        self.SetSize((500, 450))
+
+        self.running = False
+        self.cancel_requested = False
+        self.backups = []
+        self.load_backups()
+
+    def load_backups(self):
+        """List the backups in the backup directory, newest first."""
+        self.backups = list_backups(self.directory, self.path)
+        self.backup_list.DeleteAllItems()
+        for backup in self.backups:
+            index = self.backup_list.InsertItem(self.backup_list.GetItemCount(), os.path.basename(backup))
+            self.backup_list.SetItem(index, 1, f"{os.path.getsize(backup) / 1048576:.1f} MiB")
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.backup_button.Enable(not self.running)
+        self.restore_button.Enable(not self.running and self.backup_list.GetFirstSelected() != -1)
+
+    def start(self, message, target, *args):
+        self.running = True
+        self.cancel_requested = False
+        self.cancel_button.SetLabel("Cancel")
+        self.update_buttons()
+        self.gauge.SetValue(0)
+        self.status_label.SetLabel(message)
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+
+    def on_backup(self, event):
+        """Start a backup on a worker thread."""
+        self.start("Backing up...", self.run_backup, self.compress_checkbox.GetValue())
+
+    def run_backup(self, compress):
+        """Worker thread: copy the database and report back on the GUI thread."""
+        try:
+            result = backup_database(
+                self.directory, compress=compress, progress=self.report_progress, path=self.path,
+            )
+        except BackupCancelled:
+            wx.CallAfter(self.on_finished, "Backup cancelled, nothing was saved.")
+        except Exception as e:
+            wx.CallAfter(self.on_finished, f"Backup failed: {e}")
+        else:
+            wx.CallAfter(
+                self.on_finished,
+                f"Saved {os.path.basename(result.path)} ({result.size / 1048576:.1f} MiB) "
+                f"in {result.seconds:.1f} s.",
+            )
+
+    def on_restore(self, event):
+        """Ask for confirmation, then restore the selected backup on a worker thread."""
+        snapshot = self.backups[self.backup_list.GetFirstSelected()]
+        answer = wx.MessageBox(
+            f"Replace the library database with {os.path.basename(snapshot)}?\n\n"
+            "Everything changed since that backup is undone at every desk. The current "
+            "database is saved as a pre-restore backup first.",
+            "Restore Backup", wx.YES_NO | wx.NO_DEFAULT | wx.ICON_WARNING, self,
+        )
+        if answer != wx.YES:
+            return
+        self.start("Checking the backup...", self.run_restore, snapshot)
+
+    def run_restore(self, snapshot):
+        """Worker thread: check and restore the backup and report back on the GUI thread."""
+        start = time.perf_counter()
+        try:
+            saved = restore_backup(snapshot, self.directory, progress=self.report_progress, path=self.path)
+        except BackupCancelled:
+            wx.CallAfter(self.on_finished, "Restore cancelled, nothing was changed.")
+        except Exception as e:
+            wx.CallAfter(self.on_finished, f"Restore failed: {e}")
+        else:
+            wx.CallAfter(
+                self.on_finished,
+                f"Restored {os.path.basename(snapshot)} in {time.perf_counter() - start:.1f} s; "
+                f"the previous database is saved as {os.path.basename(saved)}.",
+                restored=True,
+            )
+
+    def report_progress(self, copied, total):
+        wx.CallAfter(self.show_progress, copied, total)
+        return not self.cancel_requested
+
+    def show_progress(self, copied, total):
+        if self and self.running:
+            self.gauge.SetValue(copied * 100 // max(total, 1))
+            self.status_label.SetLabel(f"Copied {copied} of {total} pages")
+
+    def on_finished(self, message, restored=False):
+        self.running = False
+        if restored:
+            # Every list of this desk shows the old rows; other desks notice through their change watchers
+            for topic in TABLE_TOPICS.values():
+                notify_reload(topic)
+
+        if not self:
+            return
+        self.gauge.SetValue(0)
+        self.status_label.SetLabel(message)
+        self.cancel_button.SetLabel("Close")
+        self.load_backups()
+
+    def on_cancel(self, event):
+        """Cancel a running backup, or close the dialog."""
+        if self.running:
+            self.cancel_requested = True
+            self.status_label.SetLabel("Cancelling...")
+        else:
+            self.EndModal(wx.ID_CANCEL)
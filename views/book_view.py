@@ -1,12 +1,22 @@
 import wx
 import sqlite3
-from wx.lib.pubsub import pub
+from database.reference_data import get_reference_cache
+from database.repository import get_repository
+from views.paged_list import PagedListCtrl
+from views.background import get_executor
+from views.invalidation import get_bus
+from views.import_dialog import ImportBooksDialog
+from views.changes import INSERT, UPDATE, DELETE, notify, apply_to_choices
 
 
 class BookView(wx.Panel):
     def __init__(self, parent):
         super(BookView, self).__init__(parent)
 
+        self.repository = get_repository()
+        self.reference = get_reference_cache()
+        self.executor = get_executor()
+
         # Layout
         sizer = wx.BoxSizer(wx.VERTICAL)
 
@@ -50,10 +60,23 @@ class BookView(wx.Panel):
 
         form_sizer.Add(update_button, pos=(4, 2), flag=wx.CENTER | wx.ALL,  border=5)
         
+        # Search-as-you-type over titles and authors
+        self.search_input = wx.SearchCtrl(self)
+        self.search_input.ShowCancelButton(True)
+        self.search_input.SetDescriptiveText("Search title or author")
+        self.search_input.Bind(wx.EVT_TEXT, self.on_search_text)
+        self.search_input.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self.on_search_cancel)
+        self.search_query = None  # FTS5 query currently shown, None for all books
+        self.search_timer = wx.CallLater(250, self.apply_search)  # debounce keystrokes
+        self.search_timer.Stop()
+
         # Table to display books
-        self.book_table = wx.ListCtrl(
-            self, style=wx.LC_REPORT | wx.BORDER_SUNKEN
+        # Virtual table: only the rows on screen are fetched, one page at a time
+        self.book_table = PagedListCtrl(
+            self, self.fetch_books_page, self.count_books, executor=self.executor
         )
+        self.book_table.row_attr = self.get_row_attr
+        self.row_attrs = {}  # category color -> shared wx.ItemAttr
         self.book_table.InsertColumn(0, "ID", width=50)
         self.book_table.InsertColumn(1, "Title", width=150)
         self.book_table.InsertColumn(2, "Author", width=150)
@@ -66,10 +89,18 @@ class BookView(wx.Panel):
         delete_button = wx.Button(self, label="Delete Book")
         delete_button.Bind(wx.EVT_BUTTON, self.on_delete_book)
 
+        import_button = wx.Button(self, label="Import CSV...")
+        import_button.Bind(wx.EVT_BUTTON, self.on_import_books)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(delete_button, 0, wx.ALL, 5)
+        button_sizer.Add(import_button, 0, wx.ALL, 5)
+
         # Main layout
         sizer.Add(form_sizer, 0, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(self.search_input, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
         sizer.Add(self.book_table, 1, wx.EXPAND | wx.ALL, 10)
-        sizer.Add(delete_button, 0, wx.CENTER | wx.ALL, 10)
+        sizer.Add(button_sizer, 0, wx.CENTER | wx.ALL, 5)
 
         self.SetSizer(sizer)
 
@@ -77,34 +108,55 @@ class BookView(wx.Panel):
         self.selected_book_id = None
         
         self.categories = {}  # Dictionary to store category IDs and names
-        self.load_categories()
-        
-        pub.subscribe(self.load_books, "update_books")
-        pub.subscribe(self.load_categories, "update_categories")
-        
-        # Load books into the table
-        self.load_books()
 
-    def load_categories(self):
-        """Load book categories into the dropdown."""
-        try:
-            with sqlite3.connect("database/library.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, name FROM BookCategory")
-                self.categories = {str(row[0]): row[1] for row in cursor.fetchall()}  # ID -> Name
-                self.category_input.Set(list(self.categories.values()))
-        except sqlite3.Error as e:
-            wx.MessageBox(f"Error loading categories: {e}", "Error", wx.OK | wx.ICON_ERROR)
+        bus = get_bus()
+        bus.register(self, "update_books", self.load_books)
+        bus.register(self, "update_categories", self.load_categories)
+
+        # Load categories and books once the window is on screen
+        wx.CallAfter(self.load_categories)
+        wx.CallAfter(self.load_books)
+
+    def load_categories(self, change=None):
+        """Load book categories into the dropdown, or patch only the changed ones.
+
+        The categories come from the reference cache, which only goes to the
+        database after the category table changed. Either way they are read
+        on the query executor.
+        """
+        on_error = lambda e: wx.MessageBox(f"Error loading categories: {e}", "Error", wx.OK | wx.ICON_ERROR)
+        if change is not None and not self.executor.is_pending(self, "categories"):
+            if change.kind == DELETE:
+                self.show_category_change(change, None)
+            else:
+                self.executor.submit(
+                    self, ("rows", change), lambda: self.reference.categories(change.ids),
+                    lambda rows: self.show_category_change(change, rows), on_error=on_error,
+                )
+            return
+
+        self.executor.submit(self, "categories", self.reference.categories, self.show_categories, on_error=on_error)
+
+    def show_categories(self, rows):
+        """Fill the category dropdown with rows loaded in the background."""
+        self.categories = {row[0]: row[1] for row in rows}  # ID -> Name
+        self.category_input.Set(list(self.categories.values()))
+
+    def show_category_change(self, change, rows):
+        """Patch the dropdown with the changed categories' rows, loaded in the background."""
+        apply_to_choices(self.category_input, self.categories, change, lambda ids: rows)
+        if change.kind != INSERT:
+            # Book rows show the category name and color
+            self.book_table.invalidate()
 
     def on_edit_book(self, event):
         """Load selected book details into the form for editing."""
-        selected_item = event.GetIndex()
+        row = self.book_table.get_row(event.GetIndex())
+        if row is None:
+            return
 
-        self.selected_book_id = self.book_table.GetItemText(selected_item)  # Book ID
-        title = self.book_table.GetItem(selected_item, 1).GetText()
-        author = self.book_table.GetItem(selected_item, 2).GetText()
-        category = self.book_table.GetItem(selected_item, 3).GetText()
-        availability = self.book_table.GetItem(selected_item, 4).GetText()
+        self.selected_book_id = str(row[0])  # Book ID
+        title, author, category, availability = row[1], row[2], row[3] or "", row[4]
         
         # Populate the form with selected book's details
         self.title_input.SetValue(title)
@@ -129,20 +181,12 @@ class BookView(wx.Panel):
             return
 
         try:
-            with sqlite3.connect("database/library.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE Book SET title = ?, author = ?, category_id = ?, availability = ?
-                    WHERE id = ?
-                    """,
-                    (title, author, category_id, availability, self.selected_book_id),
-                )
-                conn.commit()
+            self.repository.update_book(
+                self.selected_book_id, title, author, category_id, availability
+            )
 
             wx.MessageBox("Book updated successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-            self.load_books()
-            pub.sendMessage("update_books")
+            notify("update_books", UPDATE, [self.selected_book_id])
             self.clear_form()
         except sqlite3.Error as e:
             wx.MessageBox(f"Error updating book: {e}", "Error", wx.OK | wx.ICON_ERROR)
@@ -160,45 +204,69 @@ class BookView(wx.Panel):
             return
 
         try:
-            with sqlite3.connect("database/library.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO Book (title, author, category_id, availability)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (title, author, category_id, availability),
-                )
-                conn.commit()
+            book_id = self.repository.add_book(title, author, category_id, availability)
 
             wx.MessageBox("Book added successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-            self.load_books()
-            pub.sendMessage("update_books")
+            notify("update_books", INSERT, [book_id])
             self.clear_form()
         except sqlite3.Error as e:
             wx.MessageBox(f"Error adding book: {e}", "Error", wx.OK | wx.ICON_ERROR)
 
-    def load_books(self):
-        """Load books from the database into the table."""
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        # Clear existing rows in the table
-        self.book_table.DeleteAllItems()
-
-        cursor.execute("""
-            SELECT Book.id, title, author, BookCategory.name, availability, BookCategory.color
-            FROM Book 
-            JOIN BookCategory ON Book.category_id = BookCategory.id
-        """)
-        for row in cursor.fetchall():
-            index = self.book_table.Append([str(row[i]) for i in range(5)])
-            # Set row color
-            color = wx.Colour(row[5])  # row[5] = category color
-            for col in range(5):
-                self.book_table.SetItemBackgroundColour(index, color)
-
-        conn.close()
+    def load_books(self, change=None):
+        """Reload the books table, or patch only the changed rows.
+
+        Rows are fetched lazily as they are shown.
+        """
+        if change is None or self.search_query:
+            # Search results are ordered by rank, so any change may move rows around
+            self.book_table.refresh()
+        elif change.kind == INSERT:
+            self.book_table.rows_inserted(change.ids)
+        elif change.kind == UPDATE:
+            self.book_table.update_rows(change.ids, self.repository.get_books_by_id)
+        elif change.kind == DELETE:
+            self.book_table.rows_deleted(change.ids)
+
+    def fetch_books_page(self, after, offset, limit):
+        """Fetch one page of books, or of search results, for the virtual table."""
+        query = self.search_query
+        if query:
+            return self.repository.search_books_page(query, after, offset, limit)
+        after_id = after[0] if after else None
+        return self.repository.get_books_page(after_id, offset, limit)
+
+    def count_books(self):
+        """Count the books, or the search results, shown in the virtual table."""
+        query = self.search_query
+        if query:
+            return self.repository.count_book_search(query)
+        return self.repository.count_books()
+
+    def on_search_text(self, event):
+        """Restart the debounce timer on every keystroke."""
+        self.search_timer.Start(250)
+
+    def on_search_cancel(self, event):
+        self.search_input.SetValue("")  # fires EVT_TEXT, which clears the search
+
+    def apply_search(self):
+        """Show the books matching the search box, or all books when it is empty."""
+        query = self.repository.make_search_query(self.search_input.GetValue())
+        if query != self.search_query:
+            self.search_query = query
+            self.book_table.refresh()
+
+    def get_row_attr(self, row):
+        """Return the shared item attribute for the row's category color."""
+        color = row[5]
+        if not color:
+            return None
+        attr = self.row_attrs.get(color)
+        if attr is None:
+            attr = wx.ItemAttr()
+            attr.SetBackgroundColour(wx.Colour(color))
+            self.row_attrs[color] = attr
+        return attr
 
 
     def on_delete_book(self, event):
@@ -209,22 +277,32 @@ class BookView(wx.Panel):
             wx.MessageBox("Please select a book to delete.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        book_id = self.book_table.GetItemText(selected_item)
+        row = self.book_table.get_row(selected_item)
+        if row is None:
+            return  # still loading
+        book_id = row[0]
 
         try:
-            with sqlite3.connect("database/library.db") as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM Borrow WHERE book_id = ?", (book_id,))  
-                cursor.execute("DELETE FROM Book WHERE id = ?", (book_id,))  
-                conn.commit()
+            borrow_ids = self.repository.delete_book(book_id)
 
             wx.MessageBox("Book deleted successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-            pub.sendMessage("update_books")
-            pub.sendMessage("update_borrow_records")  # Notify BorrowView to refresh
-            self.load_books()
+            notify("update_books", DELETE, [book_id])
+            notify("update_borrow_records", DELETE, borrow_ids)  # Notify BorrowView to refresh
         except sqlite3.Error as e:
             wx.MessageBox(f"Error deleting book: {e}", "Error", wx.OK | wx.ICON_ERROR)
 
+    def on_import_books(self, event):
+        """Open the bulk CSV import dialog."""
+        if self.repository.remote:
+            wx.MessageBox(
+                "Imports write straight to the database file. Run python -m database.bulk_import "
+                "on the machine that runs the library server.", "Import", wx.OK | wx.ICON_INFORMATION,
+            )
+            return
+        dialog = ImportBooksDialog(self)
+        dialog.ShowModal()
+        dialog.Destroy()
+
     def clear_form(self):
         """Clear the input form."""
         self.title_input.SetValue("")
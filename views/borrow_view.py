@@ -1,28 +1,81 @@
 import wx
-import sqlite3
-from datetime import datetime
-from wx.lib.pubsub import pub 
+from database.repository import get_repository
+from database.circulation import (
+    ALREADY_ON_LOAN, ALREADY_RETURNED, NO_SUCH_BOOK, NO_SUCH_LOAN, NO_SUCH_MEMBER, checkout, return_loan,
+)
+from database.timestamps import now, start_of_day, start_of_month, start_of_week
+from views.background import get_executor
+from views.date_format import format_borrow_record
+from views.invalidation import get_bus
+from views.changes import INSERT, UPDATE, DELETE, notify
+from views.lookup_ctrl import LookupCtrl
+from views.paged_list import PagedListCtrl
+from views.scan_dialog import ScanDialog
+
+# Messages for the circulation results that are not a success
+CHECKOUT_ERRORS = {
+    ALREADY_ON_LOAN: "The book is already borrowed or not available for borrowing.",
+    NO_SUCH_BOOK: "The book no longer exists.",
+    NO_SUCH_MEMBER: "The member no longer exists.",
+}
+RETURN_ERRORS = {
+    ALREADY_RETURNED: "The book has already been returned.",
+    NO_SUCH_LOAN: "The borrow record no longer exists.",
+}
+
+# Filters for the borrow list: label -> get_borrow_records arguments,
+# computed when the list is loaded so "today" stays today
+FILTERS = [
+    ("All loans", lambda: {}),
+    ("Borrowed today", lambda: {"borrowed_since": start_of_day()}),
+    ("Borrowed this week", lambda: {"borrowed_since": start_of_week()}),
+    ("Borrowed this month", lambda: {"borrowed_since": start_of_month()}),
+    ("Overdue", lambda: {"overdue_at": now()}),
+]
+
+# Borrow table columns: (title, width, sort name in database.repository.BORROW_SORTS)
+COLUMNS = [
+    ("Borrow ID", 70, "id"),
+    ("Member Name", 100, "member"),
+    ("Book Title", 100, "title"),
+    ("Borrow Date", 130, "borrow_date"),
+    ("Due Date", 90, "due_date"),
+    ("Return Date", 130, "return_date"),
+]
 
 class BorrowView(wx.Panel):
     def __init__(self, parent):
         super(BorrowView, self).__init__(parent)
 
+        self.repository = get_repository()
+        self.executor = get_executor()
+
         # Layout
         sizer = wx.BoxSizer(wx.VERTICAL)
 
         # Form to borrow a book
         form_sizer = wx.GridBagSizer(5, 5)
         
-        # Choose book dropdown
+        # Choose book: type a title or author prefix, or scan/type the book ID
         choose_book_label = wx.StaticText(self, label="Choose Book:")
-        self.choose_book = wx.ComboBox(self, style=wx.CB_READONLY)
+        self.choose_book = LookupCtrl(
+            self, self.repository.lookup_books, self.on_select_book, self.executor
+        )
+        self.choose_book.SetHint("Title, author or book ID")
         
-        # Choose member dropdown
+        # Choose member: type a name, email or phone prefix, or the member ID
         choose_member_label = wx.StaticText(self, label="Choose Member:")
-        self.choose_member = wx.ComboBox(self, style=wx.CB_READONLY)
+        self.choose_member = LookupCtrl(
+            self, self.repository.lookup_members, self.on_select_member, self.executor
+        )
+        self.choose_member.SetHint("Name, email, phone or member ID")
         
         borrow_button = wx.Button(self, label="Borrow Book")
         borrow_button.Bind(wx.EVT_BUTTON, self.on_borrow_book)
+
+        # Returning or lending piles of books by scanning them
+        scanner_button = wx.Button(self, label="Scanner Mode...")
+        scanner_button.Bind(wx.EVT_BUTTON, self.on_scanner_mode)
                 
         # Add to layout        
         form_sizer.Add(choose_book_label, pos=(0, 0), flag=wx.ALL, border=5)
@@ -32,17 +85,43 @@ class BorrowView(wx.Panel):
         form_sizer.Add(self.choose_member, pos=(1,1), flag=wx.EXPAND | wx.ALL, border=5)
         
         form_sizer.Add(borrow_button, pos=(2, 0), span=(2, 1), flag=wx.CENTER | wx.ALL, border=10)
+        form_sizer.Add(scanner_button, pos=(2, 1), flag=wx.ALL, border=10)
         form_sizer.AddGrowableCol(1)
 
-        # Table to display borrow records
-        self.borrow_table = wx.ListCtrl(
-            self, style=wx.LC_REPORT | wx.BORDER_SUNKEN
+        # Which loans to show: a period, and filter chips that narrow it down
+        self.filter_choice = wx.Choice(self, choices=[label for label, _ in FILTERS])
+        self.filter_choice.SetSelection(0)
+        self.filter_choice.Bind(wx.EVT_CHOICE, lambda event: self.apply_filters())
+
+        self.open_filter = wx.CheckBox(self, label="Not returned")
+        self.open_filter.Bind(wx.EVT_CHECKBOX, lambda event: self.apply_filters())
+
+        self.member_filter = LookupCtrl(
+            self, self.repository.lookup_members, self.on_filter_member, self.executor
+        )
+        self.member_filter.SetHint("Borrowed by any member")
+        self.filter_member_id = None
+        self.active_filters = {}  # what the rows on screen were fetched with
+
+        # Old returned loans live in the archive and are only read on request
+        self.archive_filter = wx.CheckBox(self, label="Archived loans")
+        self.archive_filter.Bind(wx.EVT_CHECKBOX, lambda event: self.apply_filters())
+
+        filter_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        filter_sizer.Add(self.filter_choice, 0, wx.RIGHT, 10)
+        filter_sizer.Add(self.open_filter, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 10)
+        filter_sizer.Add(self.member_filter, 1, wx.RIGHT, 10)
+        filter_sizer.Add(self.archive_filter, 0, wx.ALIGN_CENTER_VERTICAL)
+
+        # Virtual table: the database sorts, filters and pages the loans,
+        # and only the rows on screen are fetched; click a header to sort
+        self.borrow_table = PagedListCtrl(
+            self, self.fetch_borrow_records_page, self.count_borrow_records, executor=self.executor
         )
-        self.borrow_table.InsertColumn(0, "Borrow ID", width=70)
-        self.borrow_table.InsertColumn(1, "Member Name", width=100)
-        self.borrow_table.InsertColumn(2, "Book Title", width=100)
-        self.borrow_table.InsertColumn(3, "Borrow Date", width=150)
-        self.borrow_table.InsertColumn(4, "Return Date", width=150)
+        self.borrow_table.cell_text = lambda row, col: str(format_borrow_record(row)[col])
+        for col, (title, width, _) in enumerate(COLUMNS):
+            self.borrow_table.InsertColumn(col, title, width=width)
+        self.borrow_table.make_sortable([key for _, _, key in COLUMNS], "id", descending=True)
 
         # Buttons for returning books
         return_button = wx.Button(self, label="Return Book")
@@ -53,6 +132,7 @@ class BorrowView(wx.Panel):
         
         # Main layout
         sizer.Add(form_sizer, 0, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(filter_sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
         sizer.Add(self.borrow_table, 1, wx.EXPAND | wx.ALL, 10)
         sizer.Add(return_button, 0, wx.CENTER | wx.ALL, 10)
         sizer.Add(delete_button, 0, wx.CENTER | wx.ALL, 10)
@@ -61,128 +141,64 @@ class BorrowView(wx.Panel):
         
         self.selected_book_id = None
         self.selected_member_id = None
+        self.scan_dialog = None
         
-        # Load borrow records into the table
-        self.load_borrow_records()
-        
-        # Populate dropdowns
-        self.populate_books_dropdown()
-        self.populate_members_dropdown()
-
-        # Subscribe to updates
-        pub.subscribe(self.populate_books_dropdown, "update_books")
-        pub.subscribe(self.populate_members_dropdown, "update_members")
-        pub.subscribe(self.load_borrow_records, "update_borrow_records")
-        
-        # Auto-refresh on show
-        self.Bind(wx.EVT_SHOW, self.on_show)
-        self.choose_book.Bind(wx.EVT_COMBOBOX, self.on_select_book)
-        self.choose_member.Bind(wx.EVT_COMBOBOX, self.on_select_member)
-
-    def on_show(self, event):
-        """Refresh data when the panel is shown."""
-        if event.IsShown():
-            wx.CallAfter(self.populate_books_dropdown)
-            wx.CallAfter(self.populate_members_dropdown)
-            wx.CallAfter(self.load_borrow_records)
+        # Load borrow records into the table once the window is on screen
+        wx.CallAfter(self.load_borrow_records)
+
+        # Subscribe to updates; while the tab is hidden they are held back
+        # and applied once when it is shown again
+        bus = get_bus()
+        bus.register(self, "update_books", self.on_books_changed)
+        bus.register(self, "update_members", self.on_members_changed)
+        bus.register(self, "update_borrow_records", self.load_borrow_records)
     
-    def on_select_book(self, event):
+    def on_select_book(self, book_id):
         """Update selected book ID when a book is chosen."""
-        selected_title = self.choose_book.GetValue()
-        for book_id, title in self.book_dict.items():
-            if title == selected_title:
-                self.selected_book_id = book_id
-                break
+        self.selected_book_id = book_id
 
-    def on_select_member(self, event):
+    def on_select_member(self, member_id):
         """Update selected member ID when a member is chosen."""
-        selected_name = self.choose_member.GetValue()
-        for member_id, name in self.member_dict.items():
-            if name == selected_name:
-                self.selected_member_id = member_id
-                break
-
-    
-    def populate_books_dropdown(self):
-        """Load books into the dropdown."""
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        self.choose_book.Clear()  # Clear previous items
-        self.book_dict = {}
-
-        cursor.execute("SELECT id, title FROM Book")
-        rows = cursor.fetchall()
-        
-        for row in rows:
-            self.book_dict[row[0]] = row[1]
-
-        self.choose_book.AppendItems(list(self.book_dict.values()))
-        conn.close()
-
-    def populate_members_dropdown(self):
-        """Load members into the dropdown."""
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        self.choose_member.Clear()  # Clear previous items
-        self.member_dict = {}
-
-        cursor.execute("SELECT id, name FROM Member")
-        rows = cursor.fetchall()
-
-        for row in rows:
-            self.member_dict[row[0]] = row[1]
-
-        self.choose_member.AppendItems(list(self.member_dict.values()))
-        conn.close()
+        self.selected_member_id = member_id
+
+    def on_books_changed(self, change=None):
+        """Forget the chosen book if it was deleted."""
+        if change is not None and change.kind == DELETE and self.selected_book_id in change.ids:
+            self.choose_book.clear()
+            self.selected_book_id = None
+
+    def on_members_changed(self, change=None):
+        """Forget the chosen member, and the member filter, if they were deleted."""
+        if change is not None and change.kind == DELETE and self.selected_member_id in change.ids:
+            self.choose_member.clear()
+            self.selected_member_id = None
+        if change is not None and change.kind == DELETE and self.filter_member_id in change.ids:
+            self.member_filter.clear()
+            self.on_filter_member(None)
     
     def on_borrow_book(self, event):
         """Borrow a book."""
         member_id = self.selected_member_id
         book_id = self.selected_book_id
-        borrow_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        borrow_date = now()
 
         if not member_id or not book_id:
             wx.MessageBox("All fields are required.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        # Check if the book is available
-        cursor.execute("SELECT availability FROM Book WHERE id = ?", (book_id,))
-        availability = cursor.fetchone()
-
-        if availability and availability[0] == "Not Available":
-            wx.MessageBox("The book is not available for borrowing.", "Error", wx.OK | wx.ICON_ERROR)
-            conn.close()
-            return
-        
-        # Check if the book is already borrowed
-        cursor.execute("SELECT id FROM Borrow WHERE book_id = ? AND return_date IS NULL", (book_id,))
-        if cursor.fetchone():
-            wx.MessageBox("The book is already borrowed.", "Error", wx.OK | wx.ICON_ERROR)
-            conn.close()
+        # Claim the book and record the loan in one transaction
+        result = checkout(book_id, member_id, borrow_date)
+        if not result.ok:
+            wx.MessageBox(CHECKOUT_ERRORS[result.status], "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        # Insert borrow record
-        cursor.execute("INSERT INTO Borrow (member_id, book_id, borrow_date) VALUES (?, ?, ?)", 
-                    (member_id, book_id, borrow_date))
-
-        # Update book availability to False
-        cursor.execute("UPDATE Book SET availability = ? WHERE id = ?", ("Not Available", book_id))
-
-        conn.commit()
-        conn.close()
-
         wx.MessageBox("Book borrowed successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
 
-        self.load_borrow_records()
         self.clear_form()
 
-        # Notify other views to update
-        pub.sendMessage("update_books")
+        # Notify views to update
+        notify("update_borrow_records", INSERT, [result.borrow_id])
+        notify("update_books", UPDATE, [book_id])
 
     def on_return_book(self, event):
         """Mark a book as returned."""
@@ -192,60 +208,96 @@ class BorrowView(wx.Panel):
             wx.MessageBox("Please select a record to mark as returned.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        borrow_id = self.borrow_table.GetItemText(selected_item)
-        return_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-        
-        # Mark the book as returned in the Borrow table
-        cursor.execute("UPDATE Borrow SET return_date = ? WHERE id = ?", (return_date, borrow_id))
+        row = self.borrow_table.get_row(selected_item)
+        if row is None:
+            return  # still loading
+        borrow_id = row[0]
+        return_date = now()
 
-        # Get the book_id associated with the borrow record
-        cursor.execute("SELECT book_id FROM Borrow WHERE id = ?", (borrow_id,))
-        book_id = cursor.fetchone()[0]
+        # Close the loan and make the book available again
+        result = return_loan(borrow_id, return_date)
+        if not result.ok:
+            wx.MessageBox(RETURN_ERRORS[result.status], "Error", wx.OK | wx.ICON_ERROR)
+            return
 
-        # Update book availability to True
-        cursor.execute("UPDATE Book SET availability = ? WHERE id = ?", ("Available", book_id))
+        wx.MessageBox("Book marked as returned!", "Success", wx.OK | wx.ICON_INFORMATION)
 
-        conn.commit()
-        conn.close()
+        notify("update_borrow_records", UPDATE, [borrow_id])
+        notify("update_books", UPDATE, [result.book_id])
 
-        wx.MessageBox("Book marked as returned!", "Success", wx.OK | wx.ICON_INFORMATION)
+    def load_borrow_records(self, change=None):
+        """Reload the borrow table, or patch only the changed rows.
 
-        self.load_borrow_records()
-
-    def load_borrow_records(self):
-        """Load borrow records with full names and book titles into the table."""
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        self.borrow_table.DeleteAllItems()
-
-        query = """
-            SELECT 
-                b.id, 
-                m.name, 
-                bk.title, 
-                strftime('%d-%m-%Y %H:%M', b.borrow_date), 
-                COALESCE(strftime('%d-%m-%Y %H:%M', b.return_date), 'Not Returned') 
-            FROM Borrow b
-            JOIN Member m ON b.member_id = m.id
-            JOIN Book bk ON b.book_id = bk.id
-            ORDER BY b.id DESC
+        Rows are patched in place only in the default order, newest first,
+        with no filter chosen; otherwise a change can move a loan within the
+        list or in and out of it, and the pages on screen are fetched again.
         """
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        for row in rows:
-            self.borrow_table.Append([str(col) for col in row])
-
-        conn.close()
+        table = self.borrow_table
+        if change is None or table.sort != "id" or not table.descending or self.active_filters:
+            self.reload()
+        elif change.kind == INSERT:
+            table.rows_inserted(change.ids)
+        elif change.kind == UPDATE:
+            table.update_rows(change.ids, self.repository.get_borrow_records)
+        elif change.kind == DELETE:
+            table.rows_deleted(change.ids)
+
+    def reload(self):
+        """Fetch the loans on screen again, with the period worked out anew so "today" stays today.
+
+        The filters are read from the controls here, on the GUI thread; the
+        pages are fetched in the background with this copy.
+        """
+        self.active_filters = self.filters()
+        self.borrow_table.refresh()
+
+    def filters(self):
+        """Return the get_borrow_records_page filters of the chosen period and chips."""
+        filters = FILTERS[self.filter_choice.GetSelection()][1]()
+        if self.open_filter.GetValue():
+            filters["open_only"] = True
+        if self.filter_member_id is not None:
+            filters["member_id"] = self.filter_member_id
+        if self.archive_filter.GetValue():
+            filters["archived"] = True
+        return filters
+
+    def fetch_borrow_records_page(self, after, offset, limit):
+        """Fetch one page of borrow records in the table's order for the virtual table."""
+        table = self.borrow_table
+        return self.repository.get_borrow_records_page(
+            table.sort, table.descending, after, offset, limit, **self.active_filters
+        )
 
+    def count_borrow_records(self):
+        return self.repository.count_borrow_records(**self.active_filters)
+
+    def on_filter_member(self, member_id):
+        """Show only the loans of the member picked in the filter, or everyone's again."""
+        if member_id != self.filter_member_id:
+            self.filter_member_id = member_id
+            self.reload()
+
+    def apply_filters(self):
+        """Show only the loans the period and filter chips let through."""
+        # Archived loans were all returned
+        archived = self.archive_filter.GetValue()
+        self.open_filter.Enable(not archived)
+        if archived:
+            self.open_filter.SetValue(False)
+        self.reload()
+
+    def on_scanner_mode(self, event):
+        """Open the scanner window, or bring it to the front if it is already open."""
+        if not self.scan_dialog:
+            self.scan_dialog = ScanDialog(self, self.repository, self.executor)
+        self.scan_dialog.Show()
+        self.scan_dialog.Raise()
 
     def clear_form(self):
         """Clear the input form."""
-        self.choose_book.SetSelection(wx.NOT_FOUND)
-        self.choose_member.SetSelection(wx.NOT_FOUND)
+        self.choose_book.clear()
+        self.choose_member.clear()
         self.selected_book_id = None
         self.selected_member_id = None
 
@@ -257,15 +309,12 @@ class BorrowView(wx.Panel):
             wx.MessageBox("Please select a record to delete.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        record_id = self.borrow_table.GetItemText(selected_item)
-
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM Borrow WHERE id = ?", (record_id,))  
+        row = self.borrow_table.get_row(selected_item)
+        if row is None:
+            return  # still loading
+        record_id = row[0]
 
-        conn.commit()
-        conn.close()
+        self.repository.delete_borrow(record_id)
 
         wx.MessageBox("Record deleted successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-        pub.sendMessage("update_borrow_records")  # Notify BorrowView to refresh
+        notify("update_borrow_records", DELETE, [record_id])  # Notify BorrowView to refresh
@@ -1,11 +1,16 @@
 import wx
-import sqlite3
-from wx.lib.pubsub import pub 
+from database.repository import get_repository
+from views.background import get_executor
+from views.invalidation import get_bus
+from views.changes import INSERT, UPDATE, DELETE, notify, apply_to_list
 
 class CategoryView(wx.Panel):
     def __init__(self, parent):
         super(CategoryView, self).__init__(parent)
 
+        self.repository = get_repository()
+        self.executor = get_executor()
+
         # Layout
         sizer = wx.BoxSizer(wx.VERTICAL)
 
@@ -45,6 +50,8 @@ class CategoryView(wx.Panel):
         self.category_table.InsertColumn(1, "Name", width=150)
         self.category_table.InsertColumn(2, "Color", width=200)
         self.category_table.InsertColumn(3, "Number of Books", width=100)
+        self.category_table.InsertColumn(4, "Available", width=80)
+        self.category_table.InsertColumn(5, "On Loan", width=80)
 
         # Bind double-click event
         self.category_table.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_edit_category)
@@ -64,30 +71,44 @@ class CategoryView(wx.Panel):
         self.selected_category_id = None
         self.selected_color = None
 
-        # Load categories into the table
-        self.load_categories()
+        # Load categories into the table once the window is on screen
+        wx.CallAfter(self.load_categories)
 
-        
-    def load_categories(self):
-        """Load categories from the database into the table, including book counts."""
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
+        bus = get_bus()
+        bus.register(self, "update_categories", self.load_categories)
+        bus.register(self, "update_books", self.on_books_changed)
 
-        self.category_table.DeleteAllItems()
+        
+    def load_categories(self, change=None):
+        """Load categories from the database into the table, including book counts.
 
-        # Query to get category name and book count
-        query = """
-            SELECT BookCategory.id, BookCategory.name, BookCategory.color, 
-                COUNT(Book.id) AS book_count
-            FROM BookCategory
-            LEFT JOIN Book ON Book.category_id = BookCategory.id
-            GROUP BY BookCategory.id
+        When a change is given only the affected rows are patched.
         """
+        if change is not None and not self.executor.is_pending(self, "categories"):
+            if change.kind == DELETE:
+                apply_to_list(self.category_table, change, None)
+            else:
+                # Fetch the changed rows off the GUI thread, then patch them in
+                self.executor.submit(
+                    self, ("rows", change), lambda: self.repository.get_categories_with_counts(change.ids),
+                    lambda rows: apply_to_list(self.category_table, change, lambda ids: rows),
+                )
+            return
 
-        for row in cursor.execute(query):
-            self.category_table.Append([str(row[0]), row[1], row[2], str(row[3])])
+        self.executor.submit(
+            self, "categories", self.repository.get_categories_with_counts, self.show_categories
+        )
+
+    def on_books_changed(self, change=None):
+        """Adding, deleting, borrowing or returning books changes the counts; rereading them is cheap."""
+        self.load_categories()
+
+    def show_categories(self, rows):
+        """Fill the table with categories loaded in the background."""
+        self.category_table.DeleteAllItems()
 
-        conn.close()
+        for row in rows:
+            self.category_table.Append([str(col) for col in row])
 
     
     def on_add_category(self, event):
@@ -100,25 +121,11 @@ class CategoryView(wx.Panel):
             wx.MessageBox("All fields are required.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO BookCategory (name, color)
-            VALUES (?, ?)
-            """,
-            (name, hexCode)
-        )
-
-        conn.commit()
-        conn.close()
+        category_id = self.repository.add_category(name, hexCode)
 
         wx.MessageBox("Category added successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
 
-        self.load_categories()
-        # pub.sendMessage("update_books")
-        pub.sendMessage("update_categories")
+        notify("update_categories", INSERT, [category_id])
         self.clear_form()
         
     def on_update_category(self, event):
@@ -135,21 +142,10 @@ class CategoryView(wx.Panel):
             wx.MessageBox("All fields are required.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            UPDATE BookCategory SET name = ?, color = ? WHERE id = ?
-            """,
-            (name, hexCode, self.selected_category_id),
-        )
-        conn.commit()
-        conn.close()
+        self.repository.update_category(self.selected_category_id, name, hexCode)
 
         wx.MessageBox("Category updated successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-        self.load_categories()
-        pub.sendMessage("update_books")
+        notify("update_categories", UPDATE, [self.selected_category_id])
         self.clear_form()
         
     def on_edit_category(self, event):
@@ -174,19 +170,12 @@ class CategoryView(wx.Panel):
 
         record_id = self.category_table.GetItemText(selected_item)
 
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-        
-        # First, delete all books associated with the category
-        cursor.execute("DELETE FROM Book WHERE category_id = ?", (record_id,))
-        
-        cursor.execute("DELETE FROM BookCategory WHERE id = ?", (record_id,))  
-
-        conn.commit()
-        conn.close()
+        # Deletes all books associated with the category as well
+        book_ids, borrow_ids = self.repository.delete_category(record_id)
         wx.MessageBox("Category deleted successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-        self.load_categories()
-        pub.sendMessage("update_books")
+        notify("update_categories", DELETE, [record_id])
+        notify("update_books", DELETE, book_ids)
+        notify("update_borrow_records", DELETE, borrow_ids)
         
     def clear_form(self):
         """Clear the input form."""
@@ -0,0 +1,47 @@
+import logging
+import sqlite3
+import wx
+from database.reference_data import POLL_INTERVAL, ChangeTracker
+from views.changes import notify_reload
+
+log = logging.getLogger(__name__)
+
+# The update_* topic that makes the views show each table's rows again
+TABLE_TOPICS = {
+    "Book": "update_books",
+    "Member": "update_members",
+    "BookCategory": "update_categories",
+    "Borrow": "update_borrow_records",
+}
+
+
+class ChangeWatcher(wx.Timer):
+    """Polls for commits by other desks and tells the views to reload what they changed.
+
+    A poll where nothing was committed is one ``PRAGMA data_version``, so it
+    runs on the GUI thread. The changes of this desk are left alone, the
+    views already patched them row by row.
+    """
+
+    def __init__(self, pool, interval=POLL_INTERVAL):
+        super(ChangeWatcher, self).__init__()
+        self.tracker = ChangeTracker(pool)
+        self.interval = interval
+
+    def start(self):
+        self.Notify()  # read the counters the caches start from
+        self.Start(int(self.interval * 1000))
+
+    def Notify(self):
+        try:
+            changed = self.tracker.poll()
+        except sqlite3.Error as e:
+            log.warning("Could not check for changes by other desks: %s", e)
+            return
+        for table in sorted(changed & TABLE_TOPICS.keys()):
+            log.debug("%s was changed by another desk", table)
+            notify_reload(TABLE_TOPICS[table])
+
+    def stop(self):
+        self.Stop()
+        self.tracker.close()
@@ -0,0 +1,65 @@
+from collections import namedtuple
+from wx.lib.pubsub import pub
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+# Payload of the update_* messages: what happened and to which rows.
+# Listeners receive change=None when they should reload everything.
+Change = namedtuple("Change", ["kind", "ids"])
+
+
+def notify(topic, kind, ids):
+    """Tell the subscribers of ``topic`` which rows were inserted, updated or deleted."""
+    ids = tuple(int(row_id) for row_id in ids)
+    if ids:
+        pub.sendMessage(topic, change=Change(kind, ids))
+
+
+def notify_reload(topic):
+    """Tell the subscribers of ``topic`` to reload everything, e.g. after another desk changed the table."""
+    pub.sendMessage(topic, change=None)
+
+
+def apply_to_list(list_ctrl, change, fetch_rows, prepend=False):
+    """Patch a report ListCtrl whose first column holds the row id.
+
+    ``fetch_rows(ids)`` returns the fresh rows for inserted or updated ids.
+    New rows go to the end of the list, or to the top when ``prepend`` is set.
+    """
+    if change.kind == DELETE:
+        for row_id in change.ids:
+            index = list_ctrl.FindItem(-1, str(row_id))
+            if index != -1:
+                list_ctrl.DeleteItem(index)
+        return
+
+    for row in fetch_rows(change.ids):
+        values = [str(col) for col in row]
+        index = list_ctrl.FindItem(-1, values[0])
+        if index == -1:
+            position = 0 if prepend else list_ctrl.GetItemCount()
+            index = list_ctrl.InsertItem(position, values[0])
+        for col, value in enumerate(values[1:], start=1):
+            list_ctrl.SetItem(index, col, value)
+
+
+def apply_to_choices(combo, labels, change, fetch_rows):
+    """Patch a ComboBox whose items mirror the ``labels`` dict (id -> label) in order.
+
+    ``fetch_rows(ids)`` returns fresh (id, label) pairs for inserted or updated ids.
+    """
+    if change.kind == DELETE:
+        for row_id in change.ids:
+            if row_id in labels:
+                combo.Delete(list(labels).index(row_id))
+                del labels[row_id]
+        return
+
+    for row_id, label in fetch_rows(change.ids):
+        if row_id in labels:
+            combo.SetString(list(labels).index(row_id), label)
+        else:
+            combo.Append(label)
+        labels[row_id] = label
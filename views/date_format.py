@@ -0,0 +1,58 @@
+import calendar
+import time
+from functools import lru_cache
+
+# Dates are stored as epoch seconds and rendered here rather than per row in
+# SQL. The local UTC offset is looked up once per day and the date string
+# once per local day; hours and minutes are plain arithmetic, so a table
+# of thousands of loans costs a few thousand cache hits, not strftime calls.
+
+# "HH:MM" for every minute of the day
+_CLOCK = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)]
+
+
+@lru_cache(maxsize=8192)
+def _utc_offset(day):
+    """The local UTC offset in seconds during a UTC day, or None if it changes that day (DST)."""
+    offsets = {time.localtime(day * 86400 + second).tm_gmtoff for second in (0, 86399)}
+    return offsets.pop() if len(offsets) == 1 else None
+
+
+@lru_cache(maxsize=8192)
+def _day_label(local_day):
+    return time.strftime("%d-%m-%Y", time.gmtime(local_day * 86400))
+
+
+def _local_seconds(timestamp):
+    """Seconds since the epoch on the local wall clock."""
+    offset = _utc_offset(timestamp // 86400)
+    if offset is None:
+        return calendar.timegm(time.localtime(timestamp))
+    return timestamp + offset
+
+
+def format_datetime(timestamp, missing=""):
+    """Render an epoch timestamp as day-month-year hours:minutes, or ``missing`` for None."""
+    if timestamp is None:
+        return missing
+    local = _local_seconds(timestamp)
+    return _day_label(local // 86400) + " " + _CLOCK[local // 60 % 1440]
+
+
+def format_date(timestamp, missing=""):
+    """Render an epoch timestamp as day-month-year, or ``missing`` for None."""
+    if timestamp is None:
+        return missing
+    return _day_label(_local_seconds(timestamp) // 86400)
+
+
+def format_borrow_record(row):
+    """Turn a borrow record from the repository into the strings shown in the table."""
+    borrow_id, member, title, borrow_date, due_date, return_date = row[:6]
+    return (borrow_id, member, title, format_datetime(borrow_date), format_date(due_date),
+            format_datetime(return_date, "Not Returned"))
+
+
+def format_member(row):
+    """Turn a member row from the repository into the strings shown in the table."""
+    return row[:4] + (format_date(row[4]),)
@@ -0,0 +1,111 @@
+import wx
+from database.instrumentation import get_stats
+
+class DiagnosticsView(wx.Panel):
+    """Shows the per-statement timings and the slow query log collected by database.instrumentation."""
+
+    def __init__(self, parent, refresh_ms=2000):
+        super(DiagnosticsView, self).__init__(parent)
+
+        self.stats = get_stats()
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+
+        # Aggregates per handler and statement, most total time first
+        self.statement_table = wx.ListCtrl(self, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
+        self.statement_table.InsertColumn(0, "Handler", width=200)
+        self.statement_table.InsertColumn(1, "Calls", width=60)
+        self.statement_table.InsertColumn(2, "Total ms", width=80)
+        self.statement_table.InsertColumn(3, "Avg ms", width=70)
+        self.statement_table.InsertColumn(4, "p95 ms", width=70)
+        self.statement_table.InsertColumn(5, "Max ms", width=70)
+        self.statement_table.InsertColumn(6, "Rows", width=70)
+        self.statement_table.InsertColumn(7, "Statement", width=400)
+
+        # Slow queries, newest first; selecting one shows its query plan
+        slow_label = wx.StaticText(
+            self, label=f"Statements slower than {self.stats.slow_ms:.0f} ms (select one for its query plan):"
+        )
+        self.slow_table = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.BORDER_SUNKEN)
+        self.slow_table.InsertColumn(0, "At", width=130)
+        self.slow_table.InsertColumn(1, "Handler", width=200)
+        self.slow_table.InsertColumn(2, "ms", width=70)
+        self.slow_table.InsertColumn(3, "Rows", width=70)
+        self.slow_table.InsertColumn(4, "Statement", width=400)
+        self.slow_table.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_select_slow_query)
+
+        self.plan_text = wx.TextCtrl(self, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+
+        reset_button = wx.Button(self, label="Reset")
+        reset_button.Bind(wx.EVT_BUTTON, self.on_reset)
+        export_button = wx.Button(self, label="Export JSON...")
+        export_button.Bind(wx.EVT_BUTTON, self.on_export)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(reset_button, 0, wx.ALL, 5)
+        button_sizer.Add(export_button, 0, wx.ALL, 5)
+
+        sizer.Add(self.statement_table, 2, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(slow_label, 0, wx.LEFT | wx.RIGHT, 10)
+        sizer.Add(self.slow_table, 1, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(self.plan_text, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+        sizer.Add(button_sizer, 0, wx.CENTER | wx.ALL, 5)
+
+        self.SetSizer(sizer)
+
+        self.slow_queries = []
+
+        # Refresh while the tab is on screen
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_timer, self.timer)
+        self.timer.Start(refresh_ms)
+        wx.CallAfter(self.load_stats)
+
+    def on_timer(self, event):
+        if self.IsShownOnScreen():
+            self.load_stats()
+
+    def load_stats(self):
+        """Fill both tables from a snapshot of the statistics."""
+        statements, self.slow_queries = self.stats.snapshot()
+
+        self.statement_table.Freeze()
+        self.statement_table.DeleteAllItems()
+        for stats in statements:
+            self.statement_table.Append([
+                stats["handler"], str(stats["calls"]), f"{stats['total_ms']:.1f}", f"{stats['avg_ms']:.2f}",
+                f"{stats['p95_ms']:.2f}", f"{stats['max_ms']:.2f}", str(stats["rows"]), stats["sql"],
+            ])
+        self.statement_table.Thaw()
+
+        self.slow_table.Freeze()
+        self.slow_table.DeleteAllItems()
+        for query in self.slow_queries:
+            self.slow_table.Append([
+                query["at"], query["handler"], f"{query['ms']:.1f}", str(query["rows"]), query["sql"],
+            ])
+        self.slow_table.Thaw()
+
+    def on_select_slow_query(self, event):
+        query = self.slow_queries[event.GetIndex()]
+        self.plan_text.SetValue(query["sql"] + "\n\n" + ("\n".join(query["plan"]) or "(no plan)"))
+
+    def on_reset(self, event):
+        self.stats.reset()
+        self.plan_text.SetValue("")
+        self.load_stats()
+
+    def on_export(self, event):
+        """Save the statistics and the slow query log as JSON."""
+        with wx.FileDialog(
+            self, "Export diagnostics", defaultFile="diagnostics.json",
+            wildcard="JSON (*.json)|*.json", style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        ) as dialog:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            path = dialog.GetPath()
+
+        try:
+            self.stats.export_json(path)
+        except OSError as e:
+            wx.MessageBox(f"Export failed: {e}", "Error", wx.OK | wx.ICON_ERROR)
@@ -0,0 +1,124 @@
+import threading
+import wx
+from wx.lib.pubsub import pub
+from database.bulk_import import ImportCancelled, import_books_csv
+
+
+class ImportBooksDialog(wx.Dialog):
+    """Pick a CSV file and import its books in the background, showing progress."""
+
+    def __init__(self, parent):
+        super(ImportBooksDialog, self).__init__(parent, title="Import Books from CSV")
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        form_sizer = wx.GridBagSizer(5, 5)
+
+        file_label = wx.StaticText(self, label="CSV file:")
+        self.file_picker = wx.FilePickerCtrl(
+            self, wildcard="CSV files (*.csv)|*.csv|All files (*.*)|*.*",
+            style=wx.FLP_OPEN | wx.FLP_FILE_MUST_EXIST | wx.FLP_USE_TEXTCTRL,
+        )
+
+        batch_label = wx.StaticText(self, label="Batch size:")
+        self.batch_input = wx.SpinCtrl(self, min=1, max=100000, initial=1000)
+
+        help_text = wx.StaticText(
+            self, label="Columns: title, author, category and optionally availability.\n"
+                        "Missing categories are created."
+        )
+
+        form_sizer.Add(file_label, pos=(0, 0), flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        form_sizer.Add(self.file_picker, pos=(0, 1), flag=wx.EXPAND | wx.ALL, border=5)
+        form_sizer.Add(batch_label, pos=(1, 0), flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        form_sizer.Add(self.batch_input, pos=(1, 1), flag=wx.ALL, border=5)
+        form_sizer.Add(help_text, pos=(2, 0), span=(1, 2), flag=wx.ALL, border=5)
+        form_sizer.AddGrowableCol(1)
+
+        self.gauge = wx.Gauge(self, range=100)
+        self.status_label = wx.StaticText(self, label="")
+
+        self.import_button = wx.Button(self, label="Import")
+        self.import_button.Bind(wx.EVT_BUTTON, self.on_import)
+        self.cancel_button = wx.Button(self, wx.ID_CANCEL, label="Cancel")
+        self.cancel_button.Bind(wx.EVT_BUTTON, self.on_cancel)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(self.import_button, 0, wx.ALL, 5)
+        button_sizer.Add(self.cancel_button, 0, wx.ALL, 5)
+
+        sizer.Add(form_sizer, 0, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(self.gauge, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 15)
+        sizer.Add(self.status_label, 0, wx.EXPAND | wx.ALL, 15)
+        sizer.Add(button_sizer, 0, wx.CENTER | wx.ALL, 5)
+
+        self.SetSizerAndFit(sizer)
+        self.SetSize((500, -1))
+
+        self.running = False
+        self.cancel_requested = False
+
+    def on_import(self, event):
+        """Start the import on a worker thread."""
+        path = self.file_picker.GetPath()
+        if not path:
+            wx.MessageBox("Please choose a CSV file.", "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        self.running = True
+        self.cancel_requested = False
+        self.import_button.Disable()
+        self.status_label.SetLabel("Importing...")
+
+        batch_size = self.batch_input.GetValue()
+        thread = threading.Thread(target=self.run_import, args=(path, batch_size), daemon=True)
+        thread.start()
+
+    def run_import(self, path, batch_size):
+        """Worker thread: run the import and report back on the GUI thread."""
+        try:
+            result = import_books_csv(path, batch_size, progress=self.report_progress)
+        except ImportCancelled:
+            wx.CallAfter(self.on_finished, None, "Import cancelled, nothing was imported.")
+        except Exception as e:
+            wx.CallAfter(self.on_finished, None, f"Import failed, nothing was imported: {e}")
+        else:
+            wx.CallAfter(self.on_finished, result, None)
+
+    def report_progress(self, imported, rate):
+        wx.CallAfter(self.show_progress, imported, rate)
+        return not self.cancel_requested
+
+    def show_progress(self, imported, rate):
+        if self:
+            self.gauge.Pulse()
+            self.status_label.SetLabel(f"{imported} books imported ({rate:.0f} rows/s)")
+
+    def on_finished(self, result, error):
+        self.running = False
+        if result is not None:
+            # Let every view reload books and categories
+            pub.sendMessage("update_books")
+            pub.sendMessage("update_categories")
+
+        if not self:
+            return
+        self.import_button.Enable()
+        self.gauge.SetValue(0)
+        if error:
+            self.status_label.SetLabel(error)
+            return
+
+        self.gauge.SetValue(100)
+        rate = result.imported / result.seconds if result.seconds else 0
+        self.status_label.SetLabel(
+            f"Imported {result.imported} books in {result.seconds:.1f} s ({rate:.0f} rows/s).\n"
+            f"Skipped {result.skipped} incomplete rows, created {result.categories_created} categories."
+        )
+
+    def on_cancel(self, event):
+        """Cancel a running import (rolling it back), or close the dialog."""
+        if self.running:
+            self.cancel_requested = True
+            self.status_label.SetLabel("Cancelling...")
+        else:
+            self.EndModal(wx.ID_CANCEL)
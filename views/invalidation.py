@@ -0,0 +1,125 @@
+import logging
+import wx
+from wx.lib.pubsub import pub
+from views.changes import INSERT, UPDATE, DELETE, Change
+
+log = logging.getLogger(__name__)
+
+# Beyond this many changed ids a full reload is cheaper than patching row by row
+MAX_PATCH_IDS = 500
+
+
+class PendingChanges:
+    """Changes collected for one view handler since it last ran."""
+
+    def __init__(self):
+        self.reload = False
+        self.ids = {INSERT: set(), UPDATE: set(), DELETE: set()}
+
+    def add(self, change):
+        if change is None:
+            self.reload = True
+        elif not self.reload:
+            self.ids[change.kind].update(change.ids)
+            if sum(len(ids) for ids in self.ids.values()) > MAX_PATCH_IDS:
+                self.reload = True
+
+    def changes(self):
+        """Return the merged changes to apply, None meaning a full reload.
+
+        Inserts are applied before updates and deletes, which is safe even when
+        the same row was inserted and deleted again within one burst.
+        """
+        if self.reload:
+            return [None]
+        return [Change(kind, tuple(sorted(self.ids[kind])))
+                for kind in (INSERT, UPDATE, DELETE) if self.ids[kind]]
+
+
+class InvalidationBus:
+    """Sits between the update_* pubsub messages and the views' refresh handlers.
+
+    Messages only mark handlers dirty. Everything that arrives during one
+    event-loop turn is merged and applied once, on the next turn. Views that
+    are not on screen (hidden notebook tabs) stay dirty until ``activate`` is
+    called for them, so a burst of edits costs one refresh per visible view.
+    """
+
+    def __init__(self):
+        self._handlers = {}  # topic -> [(view, handler)]
+        self._listeners = {}  # topic -> pubsub listener, kept alive here
+        self._dirty = {}  # (view, handler) -> PendingChanges, in arrival order
+        self._flush_scheduled = False
+        self._messages = 0  # messages since the last flush, for the debug log
+
+    def register(self, view, topic, handler):
+        """Call ``handler(change)`` for ``view`` when ``topic`` is published."""
+        if topic not in self._listeners:
+            listener = self._make_listener(topic)
+            self._listeners[topic] = listener
+            pub.subscribe(listener, topic)
+        self._handlers.setdefault(topic, []).append((view, handler))
+
+    def _make_listener(self, topic):
+        def listener(change=None):
+            self.invalidate(topic, change)
+        return listener
+
+    def invalidate(self, topic, change=None):
+        """Mark every handler of ``topic`` dirty and schedule a flush."""
+        self._messages += 1
+        for view, handler in self._handlers.get(topic, []):
+            self._dirty.setdefault((view, handler), PendingChanges()).add(change)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            wx.CallAfter(self.flush)
+
+    def flush(self):
+        """Apply the merged changes of every dirty handler whose view is on screen."""
+        self._flush_scheduled = False
+        refreshed = deferred = 0
+        for key, pending in list(self._dirty.items()):
+            view, handler = key
+            if not view:
+                del self._dirty[key]  # destroyed
+                self._forget(view)
+            elif view.IsShown():  # notebook tabs that are not selected are hidden
+                del self._dirty[key]
+                self._apply(handler, pending)
+                refreshed += 1
+            else:
+                deferred += 1
+
+        log.debug("%d message(s) -> %d refresh(es), %d deferred for hidden views",
+                  self._messages, refreshed, deferred)
+        self._messages = 0
+
+    def activate(self, view):
+        """Bring a view up to date when it becomes visible, e.g. on a tab switch."""
+        refreshed = 0
+        for key, pending in list(self._dirty.items()):
+            if key[0] is view:
+                del self._dirty[key]
+                self._apply(key[1], pending)
+                refreshed += 1
+        if refreshed:
+            log.debug("%s activated -> %d deferred refresh(es)", type(view).__name__, refreshed)
+
+    def _forget(self, view):
+        for topic, handlers in self._handlers.items():
+            self._handlers[topic] = [entry for entry in handlers if entry[0] is not view]
+
+    def _apply(self, handler, pending):
+        for change in pending.changes():
+            handler(change)
+
+
+_bus = None
+
+
+def get_bus():
+    """Return the process-wide invalidation bus, creating it on first use."""
+    global _bus
+    if _bus is None:
+        _bus = InvalidationBus()
+    return _bus
@@ -0,0 +1,106 @@
+import wx
+
+
+class LookupCtrl(wx.ComboBox):
+    """A type-ahead picker: fetches at most ``limit`` candidates as the user types.
+
+    ``search(text, limit)`` returns (id, label) pairs and runs on the query
+    executor, so typing never waits on the database and only the answer to
+    the latest keystroke is shown. ``on_select(id)`` is called when the user
+    picks a candidate, and with None when the text no longer matches one.
+    """
+
+    def __init__(self, parent, search, on_select, executor, limit=20, delay=150):
+        super(LookupCtrl, self).__init__(parent, style=wx.CB_DROPDOWN | wx.TE_PROCESS_ENTER)
+        self.search = search
+        self.on_select = on_select
+        self.executor = executor
+        self.limit = limit
+
+        self.candidates = []  # (id, label) pairs shown in the dropdown
+        self.candidates_text = None  # the text they were looked up for
+        self.selected_id = None
+        self.selected_label = None
+
+        self.timer = wx.CallLater(delay, self.run_search)
+        self.timer.Stop()
+        self.delay = delay
+
+        self.Bind(wx.EVT_TEXT, self.on_text)
+        self.Bind(wx.EVT_COMBOBOX, self.on_choose)
+        self.Bind(wx.EVT_TEXT_ENTER, self.on_enter)
+
+    def on_text(self, event):
+        """Restart the debounce timer, forgetting the selection once the text is edited."""
+        text = self.GetValue()
+        if text == self.selected_label:
+            return  # the text was set by picking a candidate
+        if self.selected_id is not None:
+            self.selected_id = self.selected_label = None
+            self.on_select(None)
+        self.timer.Start(self.delay)
+
+    def run_search(self, then=None):
+        """Look up the current text; ``then()`` runs once its candidates are shown."""
+        text = self.GetValue().strip()
+        if not text:
+            self.show_candidates([], text)
+            return
+
+        def on_result(candidates):
+            self.show_candidates(candidates, text)
+            if then is not None:
+                then()
+
+        self.executor.submit(self, "lookup", lambda: self.search(text, self.limit), on_result)
+
+    def show_candidates(self, candidates, text):
+        """Replace the dropdown items with those found for ``text``, keeping what the user has typed."""
+        self.candidates = list(candidates)
+        self.candidates_text = text
+        typed = self.GetValue()
+        self.Set([label for candidate_id, label in self.candidates])
+        self.ChangeValue(typed)
+        self.SetInsertionPointEnd()
+        if self.candidates and self.HasFocus():
+            self.Popup()
+
+    def on_choose(self, event):
+        selection = self.GetSelection()
+        if selection != wx.NOT_FOUND and selection < len(self.candidates):
+            self.select(*self.candidates[selection])
+
+    def on_enter(self, event):
+        """Enter picks the first candidate for the text as it is now, e.g. after scanning an id.
+
+        The dropdown may still hold the candidates of an earlier keystroke
+        when Enter comes before the debounce timer, so the current text is
+        then looked up first. Typing on before the answer cancels the pick.
+        """
+        if self.selected_id is not None and self.GetValue() == self.selected_label:
+            return
+        self.timer.Stop()
+        if self.candidates_text == self.GetValue().strip():
+            self.select_first()
+        else:
+            self.run_search(then=self.select_first)
+
+    def select_first(self):
+        if self.candidates and self.candidates_text == self.GetValue().strip():
+            self.select(*self.candidates[0])
+
+    def select(self, candidate_id, label):
+        self.timer.Stop()
+        self.selected_id = candidate_id
+        self.selected_label = label
+        self.ChangeValue(label)
+        self.on_select(candidate_id)
+
+    def clear(self):
+        """Forget the selection, the typed text and the candidates."""
+        self.timer.Stop()
+        self.selected_id = self.selected_label = None
+        self.candidates = []
+        self.candidates_text = None
+        self.Set([])
+        self.ChangeValue("")
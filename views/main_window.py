@@ -1,23 +1,171 @@
+import threading
+import time
 import wx
+from wx.lib.pubsub import pub
+from database.export import export
+from database.repository import get_repository
+from views.invalidation import get_bus
+from views.backup_dialog import BackupDialog
 from views.book_view import BookView
 from views.member_view import MemberView
 from views.borrow_view import BorrowView
 from views.category_view import CategoryView
+from views.reports_view import ReportsView
+from views.diagnostics_view import DiagnosticsView
+
+# File dialog filters for exports: (wildcard, format), in filter index order
+EXPORT_FILTERS = [
+    ("CSV (*.csv)|*.csv", "csv"),
+    ("Compressed CSV (*.csv.gz)|*.csv.gz", "csv"),
+    ("JSON Lines (*.jsonl)|*.jsonl", "jsonl"),
+    ("Compressed JSON Lines (*.jsonl.gz)|*.jsonl.gz", "jsonl"),
+]
+
+# Notebook tabs: (view class, label), in tab order
+PAGES = [
+    (BookView, "Books"),
+    (MemberView, "Members"),
+    (BorrowView, "Borrow/Return"),
+    (CategoryView, "Book Categories"),
+    (ReportsView, "Reports"),
+    (DiagnosticsView, "Diagnostics"),
+]
+
+class PlaceholderPage(wx.Panel):
+    """Stands in for a tab whose view has not been built yet."""
+
+    def __init__(self, parent, view_class):
+        super(PlaceholderPage, self).__init__(parent)
+        self.view_class = view_class
 
 class MainWindow(wx.Frame):
-    def __init__(self, parent, title):
+    def __init__(self, parent, title, profile=None):
         super(MainWindow, self).__init__(parent, title=title, size=(800, 600))
+        self.profile = profile
 
-        notebook = wx.Notebook(self)
-
-        # Add tabs
-        notebook.AddPage(BookView(notebook), "Books")
-        notebook.AddPage(MemberView(notebook), "Members")
-        notebook.AddPage(BorrowView(notebook), "Borrow/Return")
-        notebook.AddPage(CategoryView(notebook), "Book Categories")
+        # Tabs are built when first opened, so startup does not pay for
+        # panels (and their queries) that may never be looked at
+        self.notebook = notebook = wx.Notebook(self)
+        for view_class, label in PAGES:
+            notebook.AddPage(PlaceholderPage(notebook, view_class), label)
+        self.build_page(0)
+        notebook.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.on_page_changed)
 
         sizer = wx.BoxSizer(wx.VERTICAL)
         sizer.Add(notebook, 1, wx.EXPAND)
 
         self.SetSizer(sizer)
-        self.Centre()
\ No newline at end of file
+        self.Centre()
+
+        # Shows "Loading..." while list queries run in the background
+        self.CreateStatusBar()
+        pub.subscribe(self.on_query_status, "query_status")
+
+        # File menu with the exports and backups
+        file_menu = wx.Menu()
+        export_borrows = file_menu.Append(wx.ID_ANY, "Export Borrow History...")
+        export_catalog = file_menu.Append(wx.ID_ANY, "Export Catalog...")
+        file_menu.AppendSeparator()
+        backups = file_menu.Append(wx.ID_ANY, "Backups...")
+        file_menu.AppendSeparator()
+        exit_item = file_menu.Append(wx.ID_EXIT, "Exit")
+
+        menu_bar = wx.MenuBar()
+        menu_bar.Append(file_menu, "&File")
+        self.SetMenuBar(menu_bar)
+
+        self.Bind(wx.EVT_MENU, lambda event: self.on_export("borrows"), export_borrows)
+        self.Bind(wx.EVT_MENU, lambda event: self.on_export("catalog"), export_catalog)
+        self.Bind(wx.EVT_MENU, self.on_backups, backups)
+        self.Bind(wx.EVT_MENU, lambda event: self.Close(), exit_item)
+
+        if profile is not None:
+            notebook.GetPage(0).Bind(wx.EVT_PAINT, self.on_first_paint)
+
+    def build_page(self, index):
+        """Replace the placeholder at ``index`` with its view and select it."""
+        placeholder = self.notebook.GetPage(index)
+        label = self.notebook.GetPageText(index)
+
+        start = time.perf_counter()
+        self.notebook.Freeze()
+        try:
+            view = placeholder.view_class(self.notebook)
+            # Insert before removing, so the selection never moves to another placeholder
+            self.notebook.InsertPage(index, view, label, select=True)
+            self.notebook.RemovePage(index + 1)
+            placeholder.Destroy()
+        finally:
+            self.notebook.Thaw()
+        if self.profile is not None:
+            self.profile.panel_built(label, time.perf_counter() - start)
+
+    def on_page_changed(self, event):
+        """Build a tab on first use, or apply the updates it missed while hidden."""
+        event.Skip()
+        index = event.GetSelection()
+        page = self.notebook.GetPage(index)
+        if isinstance(page, PlaceholderPage):
+            # Swapping pages from inside the notebook's own event is not safe
+            wx.CallAfter(self.build_page, index)
+        else:
+            get_bus().activate(page)
+
+    def on_first_paint(self, event):
+        event.Skip()
+        event.GetEventObject().Unbind(wx.EVT_PAINT, handler=self.on_first_paint)
+        # Report once the paint has been handled and the frame is on screen
+        wx.CallAfter(self.profile.mark_first_paint)
+
+    def on_query_status(self, pending):
+        """Reflect background query activity in the status bar."""
+        self.SetStatusText("Loading..." if pending else "")
+
+    def on_export(self, name):
+        """Ask for a file and stream the export to it on a worker thread."""
+        if get_repository().remote:
+            wx.MessageBox(
+                "Exports read straight from the database file. Run python -m database.export "
+                "on the machine that runs the library server.", "Export", wx.OK | wx.ICON_INFORMATION,
+            )
+            return
+        with wx.FileDialog(
+            self, "Export to", defaultFile=name,
+            wildcard="|".join(wildcard for wildcard, fmt in EXPORT_FILTERS),
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        ) as dialog:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            path = dialog.GetPath()
+            fmt = EXPORT_FILTERS[dialog.GetFilterIndex()][1]
+
+        self.SetStatusText(f"Exporting {name}...")
+        thread = threading.Thread(target=self.run_export, args=(name, path, fmt), daemon=True)
+        thread.start()
+
+    def run_export(self, name, path, fmt):
+        """Worker thread: run the export and report back on the GUI thread."""
+        def progress(count):
+            wx.CallAfter(self.SetStatusText, f"Exporting {name}... {count} rows")
+
+        try:
+            total = export(name, path, fmt, progress=progress)
+        except Exception as e:
+            wx.CallAfter(self.on_export_finished, f"Export failed: {e}", wx.ICON_ERROR)
+        else:
+            wx.CallAfter(self.on_export_finished, f"Exported {total} rows to {path}", wx.ICON_INFORMATION)
+
+    def on_export_finished(self, message, icon):
+        self.SetStatusText("")
+        wx.MessageBox(message, "Export", wx.OK | icon)
+
+    def on_backups(self, event):
+        """Show the backups of the database, to make a new one or restore one."""
+        if get_repository().remote:
+            wx.MessageBox(
+                "Backups read straight from the database file. Run python -m database.backup "
+                "on the machine that runs the library server.", "Backups", wx.OK | wx.ICON_INFORMATION,
+            )
+            return
+        with BackupDialog(self) as dialog:
+            dialog.ShowModal()
@@ -1,13 +1,34 @@
+import threading
 import wx
-import sqlite3
-from datetime import datetime  # Import the datetime module
-from wx.lib.pubsub import pub 
+import wx.adv
+from database.repository import get_repository
+from database.timestamps import start_of_day
+from views.background import get_executor
+from views.date_format import format_member
+from views.invalidation import get_bus
+from views.changes import INSERT, UPDATE, DELETE, notify
+from views.paged_list import PagedListCtrl
+
+# Member table columns: (title, width, sort name in database.repository.MEMBER_SORTS)
+COLUMNS = [
+    ("ID", 50, "id"),
+    ("Name", 150, "name"),
+    ("Email", 200, "email"),
+    ("Phone", 100, "phone"),
+    ("Membership date", 100, "membership_date"),
+]
+
+# How many of the best matches a member search lists
+SEARCH_RESULTS = 50
 
 
 class MemberView(wx.Panel):
     def __init__(self, parent):
         super(MemberView, self).__init__(parent)
 
+        self.repository = get_repository()
+        self.executor = get_executor()
+
         # Layout
         sizer = wx.BoxSizer(wx.VERTICAL)
 
@@ -45,15 +66,40 @@ class MemberView(wx.Panel):
         form_sizer.Add(update_button, pos=(4, 2), flag=wx.CENTER | wx.ALL,  border=5)
               
         
-        # Table to display members
-        self.member_table = wx.ListCtrl(
-            self, style=wx.LC_REPORT | wx.BORDER_SUNKEN
+        # Filter chip: only members who joined on or after a date
+        self.joined_filter = wx.CheckBox(self, label="Joined since")
+        self.joined_filter.Bind(wx.EVT_CHECKBOX, lambda event: self.apply_filters())
+        self.joined_input = wx.adv.DatePickerCtrl(self, style=wx.adv.DP_DROPDOWN)
+        self.joined_input.Bind(wx.adv.EVT_DATE_CHANGED, lambda event: self.apply_filters())
+        self.joined_since = None
+
+        # Search-as-you-type over names, emails and phone numbers that copes with typos
+        self.search_input = wx.SearchCtrl(self)
+        self.search_input.ShowCancelButton(True)
+        self.search_input.SetDescriptiveText("Search name, email or phone")
+        self.search_input.Bind(wx.EVT_TEXT, self.on_search_text)
+        self.search_input.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self.on_search_cancel)
+        self.search_text = None  # text whose best matches are shown, None for all members
+        self.search_generation = 0  # moved on by changes to the members, to search again
+        self.search_results = None  # (search_key(), rows) of the last search
+        self.search_lock = threading.Lock()  # one search at a time for the page and count fetches
+        self.search_timer = wx.CallLater(250, self.apply_search)  # debounce keystrokes
+        self.search_timer.Stop()
+
+        filter_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        filter_sizer.Add(self.joined_filter, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 5)
+        filter_sizer.Add(self.joined_input, 0, wx.RIGHT, 10)
+        filter_sizer.Add(self.search_input, 1)
+
+        # Virtual table: the database sorts, filters and pages the members,
+        # and only the rows on screen are fetched; click a header to sort
+        self.member_table = PagedListCtrl(
+            self, self.fetch_members_page, self.count_members, executor=self.executor
         )
-        self.member_table.InsertColumn(0, "ID", width=50)
-        self.member_table.InsertColumn(1, "Name", width=150)
-        self.member_table.InsertColumn(2, "Email", width=200)
-        self.member_table.InsertColumn(3, "Phone", width=100)
-        self.member_table.InsertColumn(4, "Membership date", width=100)
+        self.member_table.cell_text = lambda row, col: str(format_member(row)[col])
+        for col, (title, width, _) in enumerate(COLUMNS):
+            self.member_table.InsertColumn(col, title, width=width)
+        self.member_table.make_sortable([key for _, _, key in COLUMNS], "id")
 
         # Bind double-click event
         self.member_table.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_edit_member)
@@ -64,6 +110,7 @@ class MemberView(wx.Panel):
 
         # Main layout
         sizer.Add(form_sizer, 0, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(filter_sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
         sizer.Add(self.member_table, 1, wx.EXPAND | wx.ALL, 10)
         sizer.Add(delete_button, 0, wx.CENTER | wx.ALL, 10)
 
@@ -72,8 +119,10 @@ class MemberView(wx.Panel):
         # Track selected Member ID for updates
         self.selected_member_id = None
 
-        # Load members into the table
-        self.load_members()
+        # Load members into the table once the window is on screen
+        wx.CallAfter(self.load_members)
+
+        get_bus().register(self, "update_members", self.load_members)
 
     def on_add_member(self, event):
         """Add a new member to the database."""
@@ -85,39 +134,101 @@ class MemberView(wx.Panel):
             wx.MessageBox("All fields are required.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        # Get the current date as the membership_date
-        membership_date = datetime.now().strftime("%Y-%m-%d")  # Format as YYYY-MM-DD
+        # Members join on the day they are added
+        membership_date = start_of_day()
         
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO Member (name, email, phone, membership_date)
-            VALUES (?, ?, ?, ?)
-            """,
-            (name, email, phone, membership_date),
-        )
-
-        conn.commit()
-        conn.close()
+        member_id = self.repository.add_member(name, email, phone, membership_date)
 
         wx.MessageBox("Member added successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
 
-        self.load_members()
-        pub.sendMessage("update_members")
+        notify("update_members", INSERT, [member_id])
         self.clear_form()
 
-    def load_members(self):
-        """Load members from the database into the table."""
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        self.member_table.DeleteAllItems()
-        for row in cursor.execute("SELECT * FROM Member"):
-            self.member_table.Append([str(col) for col in row])
+    def load_members(self, change=None):
+        """Reload the members table, or patch only the changed rows.
+
+        Rows are patched in place only in the default order by id without
+        a filter or search; otherwise a change may move rows, and the pages
+        on screen are fetched again.
+        """
+        table = self.member_table
+        if change is None or table.sort != "id" or table.descending or self.joined_since is not None \
+                or self.search_text:
+            self.search_generation += 1
+            table.refresh()
+        elif change.kind == INSERT:
+            table.rows_inserted(change.ids)
+        elif change.kind == UPDATE:
+            table.update_rows(change.ids, self.repository.get_members)
+        elif change.kind == DELETE:
+            table.rows_deleted(change.ids)
+
+    def fetch_members_page(self, after, offset, limit):
+        """Fetch one page of members in the table's order, or of search matches, for the virtual table."""
+        key = self.search_key()
+        if key[0]:
+            rows = self.search_members(key)
+            start = rows.index(after) + 1 if after in rows else offset or 0
+            return rows[start:start + limit]
+        table = self.member_table
+        return self.repository.get_members_page(
+            table.sort, table.descending, after, offset, limit, joined_since=self.joined_since
+        )
 
-        conn.close()
+    def count_members(self):
+        """Count the members, or the search matches, shown in the virtual table."""
+        key = self.search_key()
+        if key[0]:
+            return len(self.search_members(key))
+        return self.repository.count_members(self.joined_since)
+
+    def search_key(self):
+        return self.search_text, self.joined_since, self.search_generation
+
+    def search_members(self, key):
+        """Return the best matches for a search_key(), best first, searching once per key.
+
+        Matches stay in that order whichever column the table is sorted on.
+        The page and count fetches call this on executor threads: the lock
+        makes one wait for the other's search instead of running its own,
+        and rows are kept only while their key is still current, so a late
+        search never replaces a newer one.
+        """
+        with self.search_lock:
+            results = self.search_results
+            if results is not None and results[0] == key:
+                return results[1]
+            text, joined_since, _ = key
+            rows = self.repository.search_members(text, SEARCH_RESULTS, joined_since=joined_since)
+            if key == self.search_key():
+                self.search_results = (key, rows)
+            return rows
+
+    def on_search_text(self, event):
+        """Restart the debounce timer on every keystroke."""
+        self.search_timer.Start(250)
+
+    def on_search_cancel(self, event):
+        self.search_input.SetValue("")  # fires EVT_TEXT, which clears the search
+
+    def apply_search(self):
+        """Show the members best matching the search box, or all members when it is empty.
+
+        The trigram index needs three characters to search on.
+        """
+        text = " ".join(self.search_input.GetValue().split())
+        text = text if len(text) >= 3 else None
+        if text != self.search_text:
+            self.search_text = text
+            self.member_table.refresh()
+
+    def apply_filters(self):
+        """Show only the members the filter chips let through."""
+        if self.joined_filter.GetValue():
+            self.joined_since = start_of_day(self.joined_input.GetValue().GetTicks())
+        else:
+            self.joined_since = None
+        self.member_table.refresh()
 
     def on_delete_member(self, event):
         """Delete the selected member from the database."""
@@ -127,28 +238,25 @@ class MemberView(wx.Panel):
             wx.MessageBox("Please select a member to delete.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        member_id = self.member_table.GetItemText(selected_item)
+        row = self.member_table.get_row(selected_item)
+        if row is None:
+            return  # still loading
+        member_id = row[0]
 
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Member WHERE id = ?", (member_id,))
-        cursor.execute("DELETE FROM Borrow WHERE member_id = ?", (member_id,))
-        conn.commit()
-        conn.close()
+        borrow_ids = self.repository.delete_member(member_id)
 
         wx.MessageBox("Member deleted successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-        pub.sendMessage("update_members")
-        pub.sendMessage("update_borrow_records")  # Notify BorrowView to refresh
-        self.load_members()
+        notify("update_members", DELETE, [member_id])
+        notify("update_borrow_records", DELETE, borrow_ids)  # Notify BorrowView to refresh
 
     def on_edit_member(self, event):
         """Load selected member details into the form for editing."""
-        selected_item = event.GetIndex()
+        row = self.member_table.get_row(event.GetIndex())
+        if row is None:
+            return
 
-        self.selected_member_id = self.member_table.GetItemText(selected_item)  # Member ID
-        name = self.member_table.GetItem(selected_item, 1).GetText()
-        email = self.member_table.GetItem(selected_item, 2).GetText()
-        phone = self.member_table.GetItem(selected_item, 3).GetText()
+        self.selected_member_id = row[0]  # Member ID
+        name, email, phone = row[1], row[2], row[3]
         
         # Populate the form with selected member's details
         self.name_input.SetValue(name)
@@ -169,22 +277,10 @@ class MemberView(wx.Panel):
             wx.MessageBox("All fields are required.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        conn = sqlite3.connect("database/library.db")
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            UPDATE Member SET name = ?, email = ?, phone = ?
-            WHERE id = ?
-            """,
-            (name, email, phone, self.selected_member_id),
-        )
-        conn.commit()
-        conn.close()
+        self.repository.update_member(self.selected_member_id, name, email, phone)
 
         wx.MessageBox("Member updated successfully!", "Success", wx.OK | wx.ICON_INFORMATION)
-        self.load_members()
-        pub.sendMessage("update_members")
+        notify("update_members", UPDATE, [self.selected_member_id])
         self.clear_form()
     
     def clear_form(self):
@@ -0,0 +1,234 @@
+import wx
+from collections import OrderedDict
+
+
+class PagedListCtrl(wx.ListCtrl):
+    """A virtual report list that only fetches the pages currently on screen.
+
+    ``fetch_page(after, offset, limit)`` returns up to ``limit`` rows. When the
+    last row of the previous page is known it is passed as ``after`` so the
+    query can seek on its key (keyset paging); otherwise ``after`` is None and
+    ``offset`` gives the absolute position of the first row wanted.
+    ``count_rows()`` returns the total number of rows. Rows are expected in
+    ascending order of ``row_key(row)``, the first column by default, or
+    descending order when ``descending`` is set.
+
+    After ``make_sortable`` a click on a column header sorts on it, and a
+    second click reverses the order. The fetch functions read the order
+    from ``sort`` and ``descending``; the sorting itself is up to them.
+
+    With an ``executor`` (see views.background) the count and the pages are
+    fetched off the GUI thread and rows show as "Loading..." until they arrive.
+    """
+
+    def __init__(self, parent, fetch_page, count_rows, page_size=100, max_pages=20,
+                 style=wx.BORDER_SUNKEN, executor=None):
+        super(PagedListCtrl, self).__init__(
+            parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | style
+        )
+        self.fetch_page = fetch_page
+        self.count_rows = count_rows
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.executor = executor
+
+        # page number -> list of rows, least recently used first
+        self.pages = OrderedDict()
+
+        # Background loads: pages requested but not delivered yet, and a counter
+        # bumped whenever cached data is dropped so late deliveries are ignored
+        self.loading = set()
+        self.epoch = 0
+
+        # Optional hooks: format a cell, and pick a shared wx.ItemAttr for a row
+        self.cell_text = lambda row, col: "" if row[col] is None else str(row[col])
+        self.row_attr = None
+        self.row_key = lambda row: row[0]
+
+        self.sort = None
+        self.descending = False
+        self.sort_keys = []
+
+    def make_sortable(self, keys, sort, descending=False):
+        """Sort on a column when its header is clicked.
+
+        ``keys[column]`` is the sort name for that column, or None if it
+        cannot be sorted on. The list starts out in ``sort`` order.
+        """
+        self.sort_keys = list(keys)
+        self.sort = sort
+        self.descending = descending
+        self.Bind(wx.EVT_LIST_COL_CLICK, self.on_column_click)
+        self._show_sort()
+
+    def on_column_click(self, event):
+        key = self.sort_keys[event.GetColumn()] if event.GetColumn() < len(self.sort_keys) else None
+        if key is None:
+            return
+        if key == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort, self.descending = key, False
+        self._show_sort()
+        self.refresh()
+
+    def _show_sort(self):
+        self.ShowSortIndicator(self.sort_keys.index(self.sort), not self.descending)
+
+    def refresh(self):
+        """Drop cached pages and re-read the row count."""
+        self._forget_pages()
+        if self.executor is None:
+            self.SetItemCount(self.count_rows())
+            self.Refresh()
+            return
+
+        epoch = self.epoch
+        self.executor.submit(self, "count", self.count_rows,
+                             lambda count: self._count_loaded(epoch, count))
+
+    def _count_loaded(self, epoch, count):
+        if epoch == self.epoch:
+            self.SetItemCount(count)
+            self.Refresh()
+
+    def is_loading(self):
+        """Return True while a background refresh of the row count is in flight."""
+        return self.executor is not None and self.executor.is_pending(self, "count")
+
+    def invalidate(self):
+        """Drop cached pages but keep the row count, e.g. when shared lookup data changed."""
+        if self.is_loading():
+            self.refresh()
+            return
+        self._forget_pages()
+        self.Refresh()
+
+    def rows_inserted(self, keys):
+        """Account for new rows without reloading the pages before them."""
+        if self.is_loading():
+            self.refresh()
+            return
+        self._drop_pages_from(keys)
+        self.SetItemCount(self.GetItemCount() + len(keys))
+        self.Refresh()
+
+    def rows_deleted(self, keys):
+        """Account for removed rows without reloading the pages before them."""
+        if self.is_loading():
+            self.refresh()
+            return
+        self._drop_pages_from(keys)
+        self.SetItemCount(max(0, self.GetItemCount() - len(keys)))
+        self.Refresh()
+
+    def update_rows(self, keys, fetch_rows):
+        """Fetch fresh copies of the rows at ``keys`` with ``fetch_rows(keys)`` and swap them in.
+
+        With an executor they are fetched off the GUI thread, like the pages.
+        """
+        keys = tuple(keys)
+        if self.executor is None:
+            self.rows_updated(fetch_rows(keys))
+            return
+        self.executor.submit(self, ("rows", keys), lambda: fetch_rows(keys), self.rows_updated)
+
+    def rows_updated(self, rows):
+        """Swap fresh copies of changed rows into the cached pages."""
+        self._cancel_loading()
+        fresh = {self.row_key(row): row for row in rows}
+        for page in self.pages.values():
+            for position, row in enumerate(page):
+                key = self.row_key(row)
+                if key in fresh:
+                    page[position] = fresh[key]
+        self.Refresh()
+
+    def _forget_pages(self):
+        self.pages.clear()
+        self._cancel_loading()
+
+    def _cancel_loading(self):
+        """Ignore pages still being fetched; they are requested again when shown."""
+        self.epoch += 1
+        self.loading.clear()
+
+    def _drop_pages_from(self, keys):
+        """Forget every cached page that could be shifted by rows at ``keys``.
+
+        Rows are ordered by key, so only full pages that end before the
+        first of ``keys`` in that order are known to be unaffected.
+        """
+        self._cancel_loading()
+        first = max(keys) if self.descending else min(keys)
+        for page_no, page in list(self.pages.items()):
+            if len(page) < self.page_size:
+                del self.pages[page_no]
+                continue
+            last = self.row_key(page[-1])
+            if (last <= first) if self.descending else (last >= first):
+                del self.pages[page_no]
+
+    def get_row(self, index):
+        """Return the row shown at ``index``, or None if it is out of range or still loading."""
+        if index < 0:
+            return None
+        page_no, position = divmod(index, self.page_size)
+        page = self._get_page(page_no)
+        if page is None:
+            return None
+        return page[position] if position < len(page) else None
+
+    def _get_page(self, page_no):
+        page = self.pages.get(page_no)
+        if page is not None:
+            self.pages.move_to_end(page_no)
+            return page
+
+        previous = self.pages.get(page_no - 1)
+        if previous:
+            after, offset = previous[-1], None
+        else:
+            after, offset = None, page_no * self.page_size
+
+        if self.executor is None:
+            self._store_page(page_no, list(self.fetch_page(after, offset, self.page_size)))
+            return self.pages[page_no]
+
+        if page_no not in self.loading:
+            self.loading.add(page_no)
+            epoch = self.epoch
+            self.executor.submit(
+                self, ("page", page_no),
+                lambda: list(self.fetch_page(after, offset, self.page_size)),
+                lambda rows: self._page_loaded(epoch, page_no, rows),
+            )
+        return None
+
+    def _page_loaded(self, epoch, page_no, rows):
+        if epoch != self.epoch:
+            return
+        self.loading.discard(page_no)
+        self._store_page(page_no, rows)
+
+        first = page_no * self.page_size
+        last = min(first + len(rows), self.GetItemCount()) - 1
+        if last >= first:
+            self.RefreshItems(first, last)
+
+    def _store_page(self, page_no, rows):
+        self.pages[page_no] = rows
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+    def OnGetItemText(self, item, column):
+        row = self.get_row(item)
+        if row is None:
+            return "Loading..." if column == 0 and item < self.GetItemCount() else ""
+        return self.cell_text(row, column)
+
+    def OnGetItemAttr(self, item):
+        if self.row_attr is None:
+            return None
+        row = self.get_row(item)
+        return self.row_attr(row) if row is not None else None
@@ -0,0 +1,120 @@
+import wx
+from database.reports import (
+    busiest_members, category_utilisation, get_report_state, monthly_loan_volume, most_borrowed_books,
+    refresh_summaries,
+)
+from views.background import get_executor
+from views.date_format import format_date, format_datetime
+from views.invalidation import get_bus
+
+
+class ReportsView(wx.Panel):
+    """Circulation reports read from the summary tables of database.reports.
+
+    The tab shows the summaries as they are, then folds in only the loans
+    made since the last refresh and shows the result. New loans trigger the
+    same incremental refresh while the tab is on screen.
+    """
+
+    def __init__(self, parent, limit=20):
+        super(ReportsView, self).__init__(parent)
+
+        self.executor = get_executor()
+        self.limit = limit
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        grid = wx.FlexGridSizer(2, 2, 5, 10)
+        grid.AddGrowableCol(0)
+        grid.AddGrowableCol(1)
+        grid.AddGrowableRow(1)
+        grid.AddGrowableRow(3)
+
+        self.books_table = self.make_table(["Book ID", "Title", "Author", "Loans", "Last Borrowed"])
+        self.members_table = self.make_table(["Member ID", "Name", "Email", "Loans", "Last Borrowed"])
+        self.categories_table = self.make_table(["ID", "Category", "Loans", "Books", "On Loan", "% On Loan"])
+        self.months_table = self.make_table(["Month", "Loans"])
+
+        for label, table in (
+            ("Most borrowed books", self.books_table),
+            ("Busiest members", self.members_table),
+            ("Category utilisation", self.categories_table),
+            ("Loans per month", self.months_table),
+        ):
+            box = wx.BoxSizer(wx.VERTICAL)
+            box.Add(wx.StaticText(self, label=label), 0, wx.BOTTOM, 3)
+            box.Add(table, 1, wx.EXPAND)
+            grid.Add(box, 1, wx.EXPAND)
+
+        self.status_label = wx.StaticText(self, label="")
+        refresh_button = wx.Button(self, label="Refresh")
+        refresh_button.Bind(wx.EVT_BUTTON, lambda event: self.refresh())
+
+        bottom_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        bottom_sizer.Add(self.status_label, 1, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        bottom_sizer.Add(refresh_button, 0, wx.ALL, 5)
+
+        sizer.Add(grid, 1, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(bottom_sizer, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+        self.SetSizer(sizer)
+
+        # Show what is already summarised, then catch up with the new loans
+        wx.CallAfter(self.load_reports)
+        wx.CallAfter(self.refresh)
+
+        bus = get_bus()
+        bus.register(self, "update_borrow_records", self.refresh)
+        for topic in ("update_books", "update_members", "update_categories"):
+            bus.register(self, topic, self.load_reports)
+
+    def make_table(self, columns):
+        table = wx.ListCtrl(self, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
+        for col, title in enumerate(columns):
+            table.InsertColumn(col, title, width=150 if col in (1, 2) else 80)
+        return table
+
+    def refresh(self, change=None):
+        """Fold the loans made since the last refresh into the summaries in the background."""
+        self.executor.submit(self, "refresh", refresh_summaries, self.on_refreshed)
+
+    def on_refreshed(self, folded):
+        if folded:
+            self.load_reports()
+        else:
+            self.show_state()
+
+    def load_reports(self, change=None):
+        """Read every report from the summary tables; each is a short indexed read."""
+        limit = self.limit
+
+        def fetch():
+            return (most_borrowed_books(limit), busiest_members(limit), category_utilisation(),
+                    monthly_loan_volume(), get_report_state())
+
+        self.executor.submit(self, "reports", fetch, self.show_reports)
+
+    def show_reports(self, reports):
+        books, members, categories, months, state = reports
+        self.fill(self.books_table, [row[:4] + (format_date(row[4]),) for row in books])
+        self.fill(self.members_table, [row[:4] + (format_date(row[4]),) for row in members])
+        self.fill(self.categories_table, [
+            row + (f"{100 * row[4] / row[3]:.0f}%" if row[3] else "-",) for row in categories
+        ])
+        self.fill(self.months_table, months)
+        self.show_state(state)
+
+    def show_state(self, state=None):
+        if state is None:
+            self.executor.submit(self, "state", get_report_state, self.show_state)
+            return
+        high_water, refreshed_at = state
+        self.status_label.SetLabel(
+            f"Up to loan #{high_water}, refreshed {format_datetime(refreshed_at, 'never')}"
+        )
+
+    @staticmethod
+    def fill(table, rows):
+        table.Freeze()
+        table.DeleteAllItems()
+        for row in rows:
+            table.Append([str(col) for col in row])
+        table.Thaw()
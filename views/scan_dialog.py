@@ -0,0 +1,296 @@
+import sqlite3
+import time
+from collections import Counter, deque
+from datetime import datetime
+import wx
+from database.circulation import (
+    ALREADY_ON_LOAN, CHECKED_OUT, NO_SUCH_BOOK, NO_SUCH_MEMBER, NOT_ON_LOAN, RETURNED,
+    checkout_books, return_books,
+)
+from database.reference_data import get_reference_cache
+from database.timestamps import now
+from views.changes import INSERT, UPDATE, notify
+from views.lookup_ctrl import LookupCtrl
+
+RETURN_MODE = 0
+CHECKOUT_MODE = 1
+
+STATUS_LABELS = {
+    RETURNED: "Returned",
+    CHECKED_OUT: "Checked out",
+    NOT_ON_LOAN: "Not on loan",
+    ALREADY_ON_LOAN: "Already on loan",
+    NO_SUCH_BOOK: "Unknown book",
+    NO_SUCH_MEMBER: "Unknown member",
+    "invalid": "Not a book ID",
+    "error": "Database error",
+}
+
+# Scan log rows kept on screen, newest first
+MAX_LOG_ROWS = 1000
+
+
+class ScanDialog(wx.Dialog):
+    """Scanner mode: return or lend a pile of books by scanning or typing their ids.
+
+    Scans are queued and committed together, one transaction per group:
+    once ``batch_size`` are waiting, or ``delay`` ms after the last scan.
+    The groups are committed on the query executor, one at a time and in
+    the order they were scanned, so a busy database or library server never
+    holds up the scanning. Each book's outcome is added to the log without
+    any message boxes. The borrow list and books are patched through the
+    usual update messages, and Finish shows a summary of the whole session.
+    """
+
+    def __init__(self, parent, repository, executor, batch_size=25, delay=300):
+        super(ScanDialog, self).__init__(
+            parent, title="Scanner Mode", size=(520, 560),
+            style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER,
+        )
+        self.repository = repository
+        self.executor = executor
+        self.batch_size = batch_size
+        self.delay = delay
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        form_sizer = wx.GridBagSizer(5, 5)
+
+        self.mode_input = wx.RadioBox(self, label="Mode", choices=["Return", "Check out"])
+        self.mode_input.Bind(wx.EVT_RADIOBOX, self.on_mode_changed)
+
+        member_label = wx.StaticText(self, label="Member:")
+        self.member_input = LookupCtrl(self, repository.lookup_members, self.on_select_member, executor)
+        self.member_input.SetHint("Name, email, phone or member ID")
+        self.member_input.Disable()
+
+        scan_label = wx.StaticText(self, label="Book IDs:")
+        self.scan_input = wx.TextCtrl(self, style=wx.TE_PROCESS_ENTER)
+        self.scan_input.SetHint("Scan or type a book ID, then Enter")
+        self.scan_input.Bind(wx.EVT_TEXT_ENTER, self.on_scan)
+
+        form_sizer.Add(self.mode_input, pos=(0, 0), span=(1, 2), flag=wx.ALL, border=5)
+        form_sizer.Add(member_label, pos=(1, 0), flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        form_sizer.Add(self.member_input, pos=(1, 1), flag=wx.EXPAND | wx.ALL, border=5)
+        form_sizer.Add(scan_label, pos=(2, 0), flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        form_sizer.Add(self.scan_input, pos=(2, 1), flag=wx.EXPAND | wx.ALL, border=5)
+        form_sizer.AddGrowableCol(1)
+
+        self.log_table = wx.ListCtrl(self, style=wx.LC_REPORT | wx.BORDER_SUNKEN)
+        self.log_table.InsertColumn(0, "Book ID", width=80)
+        self.log_table.InsertColumn(1, "Title", width=180)
+        self.log_table.InsertColumn(2, "Result", width=150)
+        self.log_table.InsertColumn(3, "Member", width=120)
+        self.log_table.InsertColumn(4, "Borrow ID", width=80)
+        self.log_table.InsertColumn(5, "Time", width=80)
+
+        self.status_label = wx.StaticText(self, label="")
+
+        finish_button = wx.Button(self, label="Finish")
+        finish_button.Bind(wx.EVT_BUTTON, self.on_finish)
+        close_button = wx.Button(self, wx.ID_CLOSE, label="Close")
+        close_button.Bind(wx.EVT_BUTTON, lambda event: self.Close())
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(finish_button, 0, wx.ALL, 5)
+        button_sizer.Add(close_button, 0, wx.ALL, 5)
+
+        sizer.Add(form_sizer, 0, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(self.log_table, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+        sizer.Add(self.status_label, 0, wx.EXPAND | wx.ALL, 10)
+        sizer.Add(button_sizer, 0, wx.CENTER | wx.ALL, 5)
+        self.SetSizer(sizer)
+
+        self.member_id = None
+        self.queue = []  # scanned book ids not committed yet
+        self.groups = deque()  # (checking out, member id, book ids) waiting to be committed
+        self.committing = None  # the group on the executor
+        self.sent = 0  # groups handed to the executor, to key each one apart
+        self.finish_requested = False
+        self.closing = False
+        self.timer = wx.CallLater(delay, self.commit_queue)
+        self.timer.Stop()
+        self.reset_session()
+        self.scan_input.SetFocus()
+
+    def reset_session(self):
+        self.counts = Counter()
+        self.started = None
+
+    def on_mode_changed(self, event):
+        """Commit what was scanned in the old mode, then switch."""
+        self.commit_queue()
+        self.member_input.Enable(self.mode_input.GetSelection() == CHECKOUT_MODE)
+        self.scan_input.SetFocus()
+
+    def on_select_member(self, member_id):
+        self.commit_queue()  # books scanned so far go to the previous member
+        self.member_id = member_id
+        if member_id is not None:
+            self.scan_input.SetFocus()
+
+    def on_scan(self, event):
+        """Queue the scanned ids; several can be pasted at once, separated by spaces or commas."""
+        tokens = self.scan_input.GetValue().replace(",", " ").split()
+        self.scan_input.ChangeValue("")
+        if self.started is None:
+            self.started = time.perf_counter()
+
+        for token in tokens:
+            if token.isdigit():
+                self.queue.append(int(token))
+            else:
+                self.log(token, "invalid")
+
+        if len(self.queue) >= self.batch_size:
+            self.commit_queue()
+        elif self.queue:
+            self.timer.Start(self.delay)
+        self.show_status()
+
+    def commit_queue(self):
+        """Make the queued books a group for the mode and member chosen now, and send it to be committed."""
+        self.timer.Stop()
+        if not self.queue:
+            return
+        checking_out = self.mode_input.GetSelection() == CHECKOUT_MODE
+        if checking_out and self.member_id is None:
+            self.status_label.SetLabel(f"Choose a member to check out the {len(self.queue)} scanned books.")
+            return
+
+        self.groups.append((checking_out, self.member_id if checking_out else None, self.queue))
+        self.queue = []
+        self.send_group()
+        self.show_status()
+
+    def send_group(self):
+        """Commit the oldest waiting group on the query executor, unless one is on its way already."""
+        if self.committing is not None or not self.groups:
+            return
+        self.committing = checking_out, member_id, book_ids = self.groups.popleft()
+        self.sent += 1
+        self.executor.submit(
+            self, ("commit", self.sent), lambda: self.run_group(checking_out, member_id, book_ids),
+            self.show_group, on_error=self.show_group_error,
+        )
+
+    def run_group(self, checking_out, member_id, book_ids):
+        """Executor thread: return or lend the books in one transaction; return the outcomes for the log."""
+        if checking_out:
+            results = checkout_books(book_ids, member_id, now(), self.repository)
+        else:
+            results = return_books(book_ids, now(), self.repository)
+
+        # Titles and member names rarely change, so these seldom touch the database
+        reference = get_reference_cache()
+        try:
+            titles = reference.book_titles([result.book_id for result in results])
+            member = reference.member_names([member_id]).get(member_id, "") if checking_out else ""
+        except sqlite3.Error:
+            titles, member = {}, ""  # the scans are saved, the log just shows less
+        return results, titles, member
+
+    def show_group(self, outcome):
+        """Log the outcomes of the group just committed and patch the lists."""
+        results, titles, member = outcome
+        checking_out = self.committing[0]
+        self.committing = None
+        for result in results:
+            self.log(
+                result.book_id, result.status, result.borrow_id,
+                titles.get(result.book_id, ""), member if result.ok else "",
+            )
+
+        done = [result for result in results if result.ok]
+        notify("update_borrow_records", INSERT if checking_out else UPDATE, [r.borrow_id for r in done])
+        notify("update_books", UPDATE, [r.book_id for r in done])
+        self.show_status()
+        self.group_done()
+
+    def show_group_error(self, error):
+        # Nothing in the group was committed
+        book_ids = self.committing[2]
+        self.committing = None
+        for book_id in book_ids:
+            self.log(book_id, "error")
+        self.status_label.SetLabel(f"Database error, {len(book_ids)} scans not saved: {error}")
+        self.group_done()
+
+    def group_done(self):
+        """Send the next group; once none is left, finish or close if that was asked for meanwhile."""
+        self.send_group()
+        if self.committing is not None:
+            return
+        if self.closing and not self.IsShown():
+            self.Destroy()
+        elif self.finish_requested:
+            self.finish()
+
+    def log(self, book_id, status, borrow_id=None, title="", member=""):
+        self.counts[status] += 1
+        index = self.log_table.InsertItem(0, str(book_id))
+        self.log_table.SetItem(index, 1, title)
+        self.log_table.SetItem(index, 2, STATUS_LABELS[status])
+        self.log_table.SetItem(index, 3, member)
+        self.log_table.SetItem(index, 4, "" if borrow_id is None else str(borrow_id))
+        self.log_table.SetItem(index, 5, datetime.now().strftime("%H:%M:%S"))
+        if status not in (RETURNED, CHECKED_OUT):
+            self.log_table.SetItemTextColour(index, wx.RED)
+        if self.log_table.GetItemCount() > MAX_LOG_ROWS:
+            self.log_table.DeleteItem(MAX_LOG_ROWS)
+
+    def show_status(self):
+        done = self.counts[RETURNED] + self.counts[CHECKED_OUT]
+        failed = sum(self.counts.values()) - done
+        saving = sum(len(group[2]) for group in self.groups) + (len(self.committing[2]) if self.committing else 0)
+        queued = f", {len(self.queue)} queued" if self.queue else ""
+        queued += f", {saving} saving" if saving else ""
+        self.status_label.SetLabel(f"{done} done, {failed} failed{queued} ({self.rate():.0f} per minute)")
+
+    def rate(self):
+        """Books handled per minute since the first scan of the session."""
+        if self.started is None:
+            return 0.0
+        minutes = (time.perf_counter() - self.started) / 60
+        return sum(self.counts.values()) / minutes if minutes else 0.0
+
+    def summary(self):
+        lines = [f"{STATUS_LABELS[status]}: {count}" for status, count in self.counts.most_common()]
+        if self.started is not None:
+            elapsed = time.perf_counter() - self.started
+            lines.append(f"\n{sum(self.counts.values())} scans in {elapsed:.0f} s ({self.rate():.0f} per minute)")
+        return "\n".join(lines) or "Nothing was scanned."
+
+    def on_finish(self, event):
+        """Commit the remaining scans and show a summary of the session once they are saved."""
+        self.commit_queue()
+        if self.queue:
+            return  # still waiting for a member
+        if self.committing is not None:
+            self.finish_requested = True
+            return
+        self.finish()
+
+    def finish(self):
+        self.finish_requested = False
+        wx.MessageBox(self.summary(), "Scanner Summary", wx.OK | wx.ICON_INFORMATION)
+        self.reset_session()
+        self.log_table.DeleteAllItems()
+        self.show_status()
+        self.scan_input.SetFocus()
+
+    def on_close(self, event):
+        self.commit_queue()
+        if self.queue and event.CanVeto() and wx.MessageBox(
+            f"{len(self.queue)} scanned books have not been checked out. Close anyway?",
+            "Scanner Mode", wx.YES_NO | wx.ICON_QUESTION,
+        ) != wx.YES:
+            event.Veto()
+            return
+        self.timer.Stop()
+        if self.committing is not None:
+            # The groups still on their way patch the lists when they land
+            self.closing = True
+            self.Hide()
+            return
+        self.Destroy()
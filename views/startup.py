@@ -0,0 +1,43 @@
+import sys
+import time
+
+
+class StartupProfile:
+    """Collects the timings reported by ``app.py --profile-startup``.
+
+    All times are measured from ``start``, taken before the GUI modules are
+    imported. Panels are timed as they are built, so tabs opened later in
+    the session show up in the report when they are first opened.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.imported = None
+        self.first_paint = None
+        self.panels = []  # (label, seconds to construct)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def mark_imported(self):
+        self.imported = self.elapsed()
+
+    def mark_first_paint(self):
+        """Record the first paint of the main window and print the report."""
+        if self.first_paint is None:
+            self.first_paint = self.elapsed()
+            self.report()
+
+    def panel_built(self, label, seconds):
+        self.panels.append((label, seconds))
+        if self.first_paint is not None:
+            self.report_panel(label, seconds)
+
+    def report(self, out=sys.stderr):
+        print(f"startup: imports        {self.imported * 1000:8.1f} ms", file=out)
+        print(f"startup: first paint    {self.first_paint * 1000:8.1f} ms", file=out)
+        for label, seconds in self.panels:
+            self.report_panel(label, seconds, out)
+
+    def report_panel(self, label, seconds, out=sys.stderr):
+        print(f"startup: panel {label:<18}{seconds * 1000:6.1f} ms", file=out)